@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark for batched seller payouts
+
+Starts fake_paystack_server in-process and pays out the same number of
+transfers twice against a scratch database: once per transfer (one Paystack
+call and status writes each, the legacy path) and once through
+TransferAutomationService.submit_pending_batch (bulk requests of 100 and one
+bulk_write per chunk). Reports wall time, Paystack requests and the final
+transfer statuses of both runs.
+
+Usage: python bench_bulk_payouts.py
+Env: MONGO_URL, BENCH_DB (default stocklot_bench_payouts, dropped afterwards),
+     BENCH_TRANSFERS (default 500), FAKE_PAYSTACK_LATENCY_MS, FAKE_PAYSTACK_FAIL_EVERY
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import threading
+from collections import Counter
+from datetime import datetime
+
+os.environ.setdefault('PAYSTACK_SECRET_KEY', 'sk_test_fake')
+os.environ.setdefault('FAKE_PAYSTACK_LATENCY_MS', '50')
+
+import httpx
+import uvicorn
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import fake_paystack_server
+from services.paystack_transfer_client import PaystackTransferClient
+from services.transfer_automation_service import TransferAutomationService, BATCH_PAYOUT_MODE
+
+PORT = 8099
+TRANSFERS = int(os.environ.get('BENCH_TRANSFERS', '500'))
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+BENCH_DB = os.environ.get('BENCH_DB', 'stocklot_bench_payouts')
+
+
+def start_fake_paystack():
+    server = uvicorn.Server(uvicorn.Config(fake_paystack_server.app, port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def seed(db, run: str, batch: bool):
+    await db.transfer_recipients.update_one(
+        {"id": "bench-recipient"},
+        {"$set": {"id": "bench-recipient", "user_id": "bench-seller", "paystack_recipient_code": "RCP_bench",
+                  "recipient_type": "basa", "name": "Bench Seller", "is_active": True, "is_validated": True,
+                  "created_at": datetime.now()}},
+        upsert=True
+    )
+    docs = []
+    for i in range(TRANSFERS):
+        doc = {"id": str(uuid.uuid4()), "reference": f"BENCH_{run}_{i}_{uuid.uuid4().hex[:6]}",
+               "sender_id": "bench-buyer", "recipient_id": "bench-recipient", "amount": 10000 + i,
+               "currency": "ZAR", "reason": "Bench payout", "status": "pending", "retry_count": 0,
+               "max_retries": 3, "initiated_at": datetime.now(), "created_at": datetime.now(), "run": run}
+        if batch:
+            doc["payout_mode"] = BATCH_PAYOUT_MODE
+        docs.append(doc)
+    await db.transfers.insert_many(docs)
+    return [doc["id"] for doc in docs]
+
+
+async def paystack_requests() -> int:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"http://localhost:{PORT}/_stats")).json()["requests"]
+
+
+async def statuses(db, run: str) -> dict:
+    return dict(Counter([doc["status"] async for doc in db.transfers.find({"run": run}, {"status": 1})]))
+
+
+async def main():
+    start_fake_paystack()
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[BENCH_DB]
+    paystack = PaystackTransferClient(base_url=f"http://localhost:{PORT}")
+    # No scheduler: retries of the legacy path are not exercised here
+    service = TransferAutomationService(db, paystack, batch_payouts=False)
+    service._schedule_transfer = lambda *args, **kwargs: asyncio.sleep(0)
+
+    print(f"⏱️  {TRANSFERS} payouts, {fake_paystack_server.LATENCY_MS:.0f}ms fake Paystack latency")
+    try:
+        ids = await seed(db, "single", batch=False)
+        before = await paystack_requests()
+        started = time.perf_counter()
+        for transfer_id in ids:
+            await service._process_single_transfer(transfer_id)
+        single_s = time.perf_counter() - started
+        single_requests = await paystack_requests() - before
+        print(f"per-transfer | {single_s:7.2f}s | {single_requests:5d} Paystack requests | "
+              f"{await statuses(db, 'single')}")
+
+        await seed(db, "batch", batch=True)
+        before = await paystack_requests()
+        started = time.perf_counter()
+        summary = await service.submit_pending_batch()
+        batch_s = time.perf_counter() - started
+        batch_requests = await paystack_requests() - before
+        print(f"batched      | {batch_s:7.2f}s | {batch_requests:5d} Paystack requests | "
+              f"{await statuses(db, 'batch')}")
+        print(f"speedup {single_s / batch_s:.1f}x; batch summary: {summary}")
+    finally:
+        await client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark for FAQ semantic search
+
+Compares the legacy search (one sklearn ``cosine_similarity`` call per FAQ
+entry, then a full sort) against FAQVectorIndex (one matrix-vector product and
+an ``argpartition`` top-k) at 1k and 50k entries. Reports index build time,
+per-query latency and whether both return the same top results.
+
+No database is needed; embeddings are random unit vectors.
+
+Usage: python bench_faq_vector_index.py
+Env: BENCH_DIMS (default 1536), BENCH_QUERIES (default 20)
+"""
+
+import os
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from services.faq_vector_index import FAQVectorIndex
+
+ENTRY_COUNTS = [1000, 50000]
+DIMS = int(os.environ.get('BENCH_DIMS', '1536'))
+QUERIES = int(os.environ.get('BENCH_QUERIES', '20'))
+LIMIT = 5
+# Legacy search is slow at 50k; time it on a few queries only
+LEGACY_QUERIES = 3
+
+
+def make_entries(n: int, rng: np.random.Generator):
+    vectors = rng.standard_normal((n, DIMS), dtype=np.float32)
+    return [
+        {"id": f"faq-{i}", "title": f"FAQ {i}", "answer": "...", "category": "general",
+         "keywords": [], "embedding": vectors[i]}
+        for i in range(n)
+    ]
+
+
+def legacy_search(entries, query_vector, limit):
+    results = []
+    for entry in entries:
+        similarity = cosine_similarity([query_vector], [entry["embedding"]])[0][0]
+        results.append({"entry": entry, "similarity": float(similarity)})
+    results.sort(key=lambda x: x["similarity"], reverse=True)
+    return results[:limit]
+
+
+def bench(n: int):
+    rng = np.random.default_rng(n)
+    entries = make_entries(n, rng)
+    queries = rng.standard_normal((QUERIES, DIMS), dtype=np.float32)
+
+    index = FAQVectorIndex(db=None, storage_path="")
+    started = time.perf_counter()
+    index.build(entries)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    indexed = [index.search(q, limit=LIMIT) for q in queries]
+    index_ms = (time.perf_counter() - started) * 1000 / QUERIES
+
+    started = time.perf_counter()
+    legacy = [legacy_search(entries, q, LIMIT) for q in queries[:LEGACY_QUERIES]]
+    legacy_ms = (time.perf_counter() - started) * 1000 / LEGACY_QUERIES
+
+    same = all(
+        [r["entry"]["id"] for r in indexed[i]] == [r["entry"]["id"] for r in legacy[i]]
+        for i in range(LEGACY_QUERIES)
+    )
+    matrix_mb = index.matrix.nbytes / 1024 / 1024
+    print(f"{n:>6} entries | build {build_ms:8.1f}ms ({matrix_mb:6.1f}MB) | "
+          f"legacy {legacy_ms:9.2f}ms/query | index {index_ms:7.3f}ms/query | "
+          f"speedup {legacy_ms / index_ms:8.1f}x | same top-{LIMIT}: {same}")
+
+
+def main():
+    print(f"⏱️  FAQ semantic search, {DIMS}-dim embeddings, top-{LIMIT}")
+    for n in ENTRY_COUNTS:
+        bench(n)
+
+
+if __name__ == "__main__":
+    main()
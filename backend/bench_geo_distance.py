@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark for geo distance calculations
+
+Compares the legacy per-pair haversine loop (what the buy-request list and
+ranking code ran once per request) against services.geo for two shapes of
+work: one buyer against every open request, and a batch of sellers each
+ranking every request. Also times within_radius (bounding-box prefilter then
+haversine) for a radius search. Checks that all paths return the same
+distances and the same set of matches.
+
+No database is needed; coordinates are random points around South Africa.
+
+Usage: python bench_geo_distance.py
+Env: BENCH_REQUESTS (default 10000), BENCH_SELLERS (default 100), BENCH_RADIUS_KM (default 100)
+"""
+
+import os
+import math
+import time
+
+import numpy as np
+
+from services.geo import distances_from, distance_matrix, within_radius
+
+REQUESTS = int(os.environ.get('BENCH_REQUESTS', '10000'))
+SELLERS = int(os.environ.get('BENCH_SELLERS', '100'))
+RADIUS_KM = float(os.environ.get('BENCH_RADIUS_KM', '100'))
+# Roughly the bounding box of South Africa
+LAT_RANGE = (-34.8, -22.1)
+LNG_RANGE = (16.5, 32.9)
+
+
+def legacy_haversine(lat1, lon1, lat2, lon2):
+    """The per-pair function that was copied across server.py and the services"""
+    R = 6371
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+    a = (math.sin(delta_lat / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2)
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def random_points(n: int, rng: np.random.Generator):
+    return rng.uniform(*LAT_RANGE, n), rng.uniform(*LNG_RANGE, n)
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def report(label: str, legacy_ms: float, new_ms: float, same: bool):
+    print(f"{label:<32} | legacy {legacy_ms:9.2f}ms | geo {new_ms:8.2f}ms | "
+          f"speedup {legacy_ms / new_ms:7.1f}x | same: {same}")
+
+
+def main():
+    rng = np.random.default_rng(44)
+    req_lats, req_lngs = random_points(REQUESTS, rng)
+    seller_lats, seller_lngs = random_points(SELLERS, rng)
+    lat_list, lng_list = req_lats.tolist(), req_lngs.tolist()
+    buyer_lat, buyer_lng = float(seller_lats[0]), float(seller_lngs[0])
+
+    print(f"⏱️  {REQUESTS} requests, {SELLERS} sellers, {RADIUS_KM:.0f}km radius")
+
+    # 1 buyer x all requests
+    legacy, legacy_ms = timed(lambda: [legacy_haversine(buyer_lat, buyer_lng, la, ln)
+                                       for la, ln in zip(lat_list, lng_list)])
+    vectorised, new_ms = timed(lambda: distances_from(buyer_lat, buyer_lng, lat_list, lng_list))
+    report(f"1 x {REQUESTS} distances", legacy_ms, new_ms, np.allclose(legacy, vectorised, atol=1e-6))
+
+    # Every seller x all requests
+    seller_pairs = list(zip(seller_lats.tolist(), seller_lngs.tolist()))
+    legacy, legacy_ms = timed(lambda: [[legacy_haversine(sl, sg, la, ln) for la, ln in zip(lat_list, lng_list)]
+                                       for sl, sg in seller_pairs])
+    matrix, new_ms = timed(lambda: distance_matrix(seller_lats, seller_lngs, req_lats, req_lngs))
+    report(f"{SELLERS} x {REQUESTS} distance matrix", legacy_ms, new_ms, np.allclose(legacy, matrix, atol=1e-6))
+
+    # Radius search: full scan versus bounding-box prefilter
+    legacy, legacy_ms = timed(lambda: sorted(
+        (d, i) for i, (la, ln) in enumerate(zip(lat_list, lng_list))
+        if (d := legacy_haversine(buyer_lat, buyer_lng, la, ln)) <= RADIUS_KM
+    ))
+    (indices, distances), new_ms = timed(lambda: within_radius(buyer_lat, buyer_lng, RADIUS_KM, req_lats, req_lngs))
+    same = sorted(i for _, i in legacy) == sorted(indices.tolist())
+    report(f"within {RADIUS_KM:.0f}km ({len(indices)} matches)", legacy_ms, new_ms, same)
+
+    # Radius search for every seller
+    def legacy_radius_all():
+        return [[i for i, (la, ln) in enumerate(zip(lat_list, lng_list))
+                 if legacy_haversine(sl, sg, la, ln) <= RADIUS_KM] for sl, sg in seller_pairs]
+
+    legacy, legacy_ms = timed(legacy_radius_all)
+    results, new_ms = timed(lambda: [within_radius(sl, sg, RADIUS_KM, req_lats, req_lngs)[0]
+                                     for sl, sg in seller_pairs])
+    same = all(sorted(r.tolist()) == l for r, l in zip(results, legacy))
+    report(f"{SELLERS} sellers within {RADIUS_KM:.0f}km", legacy_ms, new_ms, same)
+
+
+if __name__ == "__main__":
+    main()
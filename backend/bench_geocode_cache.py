@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark for geocoding through MapboxService
+
+Starts fake_mapbox_server in-process and resolves the same stream of
+addresses (a few dozen towns written in different ways, as buyers type them)
+several ways against a scratch database:
+
+- legacy: a new httpx client and one Mapbox request per lookup, no cache
+- cached: MapboxService.geocode_location on a fresh worker (memory + Mongo)
+- restart: a second MapboxService instance over the same database, as a newly
+  started worker would see it
+- bulk: MapboxService.geocode_many over the whole stream with an empty cache
+
+Reports wall time and Mapbox requests per run, and checks that every run
+returns the same coordinates.
+
+Usage: python bench_geocode_cache.py
+Env: MONGO_URL, BENCH_DB (default stocklot_bench_geocode, dropped afterwards),
+     BENCH_LOOKUPS (default 500), FAKE_MAPBOX_LATENCY_MS
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+
+os.environ.setdefault('MAPBOX_ACCESS_TOKEN', 'pk.fake')
+os.environ.setdefault('FAKE_MAPBOX_LATENCY_MS', '80')
+
+import httpx
+import uvicorn
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import fake_mapbox_server
+from services.mapbox_service import MapboxService
+
+PORT = 8098
+BASE_URL = f"http://localhost:{PORT}"
+LOOKUPS = int(os.environ.get('BENCH_LOOKUPS', '500'))
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+BENCH_DB = os.environ.get('BENCH_DB', 'stocklot_bench_geocode')
+
+
+def start_fake_mapbox():
+    server = uvicorn.Server(uvicorn.Config(fake_mapbox_server.app, port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def address_stream(n: int):
+    """Town and province names with the casing, spacing and suffixes people actually type"""
+    rng = random.Random(45)
+    variants = [
+        lambda name: name.title(),
+        lambda name: name.upper(),
+        lambda name: f"  {name}  ",
+        lambda name: f"{name.title()}, South Africa",
+        lambda name: f"{name.title()}, ZA",
+    ]
+    names = list(fake_mapbox_server.GAZETTEER)
+    return [rng.choice(variants)(rng.choice(names)) for _ in range(n)]
+
+
+async def legacy_geocode(location: str):
+    async with httpx.AsyncClient() as client:
+        response = await client.get(
+            f"{BASE_URL}/geocoding/v5/mapbox.places/{location}.json",
+            params={"access_token": "pk.fake", "country": "ZA",
+                    "types": "place,locality,neighborhood,address", "limit": 1}
+        )
+        feature = response.json()["features"][0]
+        return {"longitude": feature["geometry"]["coordinates"][0], "latitude": feature["geometry"]["coordinates"][1]}
+
+
+async def mapbox_requests() -> int:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"{BASE_URL}/_stats")).json().get("geocoding", 0)
+
+
+async def _sequential(geocode, addresses):
+    return [await geocode(address) for address in addresses]
+
+
+async def run(label: str, func, addresses):
+    before = await mapbox_requests()
+    started = time.perf_counter()
+    results = await func(addresses)
+    elapsed = time.perf_counter() - started
+    requests = await mapbox_requests() - before
+    print(f"{label:<8} | {elapsed:7.2f}s | {elapsed / len(addresses) * 1000:7.2f}ms/lookup | "
+          f"{requests:5d} Mapbox requests")
+    return [(round(r["longitude"], 6), round(r["latitude"], 6)) for r in results], elapsed
+
+
+async def main():
+    start_fake_mapbox()
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[BENCH_DB]
+    addresses = address_stream(LOOKUPS)
+    distinct = len({MapboxService._geocode_key(a, "ZA") for a in addresses})
+
+    print(f"⏱️  {LOOKUPS} lookups of {distinct} distinct addresses, "
+          f"{fake_mapbox_server.LATENCY_MS:.0f}ms fake Mapbox latency")
+    try:
+        legacy, legacy_s = await run("legacy", lambda items: _sequential(legacy_geocode, items), addresses)
+
+        service = MapboxService(db, base_url=BASE_URL)
+        await service.ensure_indexes()
+        cached, cached_s = await run("cached", lambda items: _sequential(service.geocode_location, items), addresses)
+        await service.close()
+
+        restarted = MapboxService(db, base_url=BASE_URL)
+        restart, restart_s = await run("restart", lambda items: _sequential(restarted.geocode_location, items),
+                                       addresses)
+        await restarted.close()
+
+        await db.geocode_cache.delete_many({})
+        bulk_service = MapboxService(db, base_url=BASE_URL)
+        bulk, bulk_s = await run("bulk", bulk_service.geocode_many, addresses)
+        await bulk_service.close()
+
+        print(f"speedup cached {legacy_s / cached_s:.1f}x, restart {legacy_s / restart_s:.1f}x, "
+              f"bulk {legacy_s / bulk_s:.1f}x; same coordinates: {legacy == cached == restart == bulk}")
+        print(f"memory cache after restart run: {restarted.get_geocode_cache_metrics()}")
+    finally:
+        await client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
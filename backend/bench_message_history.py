@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark for conversation message history
+
+Seeds a scratch database with one long inbox conversation and one long chat
+conversation (BENCH_MESSAGES messages each, plus other conversations' traffic
+around them). Messages carry legacy read_by/delivered_to arrays like
+production data. It then reads each history end to end, page by page:
+
+- inbox legacy: skip/limit pages over full documents with no
+  (conversation_id, created_at) index, as get_messages did before
+- inbox keyset: UnifiedInboxService.get_messages following next_cursor
+- chat legacy: before_timestamp pages over full documents with no index
+- chat keyset: RealTimeMessagingService.get_messages following next_cursor
+
+It also times marking a conversation read both ways: pushing a receipt onto
+every message, and moving the last-read pointer.
+
+Reports wall time, the deepest page's latency, and bytes returned.
+
+Usage: MONGO_URL=mongodb://localhost:27017 python bench_message_history.py
+Env: BENCH_DB (default stocklot_bench_messages, dropped afterwards),
+     BENCH_MESSAGES (default 10000), BENCH_PAGE_SIZE (default 50)
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import bson
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.unified_inbox_service import UnifiedInboxService
+from services.realtime_messaging_service import RealTimeMessagingService
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+BENCH_DB = os.environ.get('BENCH_DB', 'stocklot_bench_messages')
+MESSAGES = int(os.environ.get('BENCH_MESSAGES', '10000'))
+PAGE_SIZE = int(os.environ.get('BENCH_PAGE_SIZE', '50'))
+OTHER_CONVERSATIONS = 20
+BUYER, SELLER = "bench-buyer", "bench-seller"
+
+
+def receipts(at: datetime):
+    return [{"user_id": BUYER, "at": at}, {"user_id": SELLER, "at": at + timedelta(seconds=30)}]
+
+
+async def seed(db):
+    """One inbox and one chat conversation of MESSAGES each, plus neighbours sharing the collection"""
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    inbox_id, chat_id = "bench-inbox", "bench-chat"
+    await db.conversations.insert_many([
+        {"id": inbox_id, "type": "ORDER", "subject": "Order: Bench", "created_at": start,
+         "per_user": [{"user_id": user_id, "unread_count": 0, "deleted": False} for user_id in (BUYER, SELLER)]},
+        {"_id": chat_id, "type": "direct", "participants": [BUYER, SELLER], "status": "active",
+         "unread_counts": {BUYER: 0, SELLER: 0}, "created_at": start, "updated_at": start},
+    ])
+
+    batch = []
+    for i in range(MESSAGES):
+        at = start + timedelta(seconds=i * 7)
+        sender = BUYER if i % 2 else SELLER
+        batch.append({
+            "id": str(uuid.uuid4()), "conversation_id": inbox_id, "sender_id": sender,
+            "body": f"Inbox message {i} about the heifers and the delivery window",
+            "attachments": [], "visibility": "VISIBLE", "read_by": receipts(at), "delivered_to": receipts(at),
+            "created_at": at, "updated_at": at,
+        })
+        batch.append({
+            "_id": str(uuid.uuid4()), "conversation_id": chat_id, "sender_id": sender, "type": "text",
+            "content": {"text": f"Chat message {i}", "formatted": f"Chat message {i}"},
+            "timestamp": at, "delivery_status": "sent", "read_by": [BUYER, SELLER], "reactions": {},
+        })
+        # Other conversations' traffic interleaved in the same collection
+        neighbour = f"other-{i % OTHER_CONVERSATIONS}"
+        batch.append({
+            "id": str(uuid.uuid4()), "conversation_id": neighbour, "sender_id": sender, "body": "...",
+            "visibility": "VISIBLE", "read_by": receipts(at), "delivered_to": [], "created_at": at,
+        })
+        if len(batch) >= 3000:
+            await db.messages.insert_many(batch)
+            batch = []
+    if batch:
+        await db.messages.insert_many(batch)
+    return inbox_id, chat_id
+
+
+async def legacy_inbox_walk(db, conversation_id: str):
+    pages, page = [], 1
+    while True:
+        started = time.perf_counter()
+        messages = await db.messages.find({
+            "conversation_id": conversation_id, "visibility": {"$ne": "HIDDEN"}
+        }).sort("created_at", 1).skip((page - 1) * PAGE_SIZE).limit(PAGE_SIZE).to_list(length=None)
+        pages.append((time.perf_counter() - started, messages))
+        if len(messages) < PAGE_SIZE:
+            return pages
+        page += 1
+
+
+async def keyset_inbox_walk(service: UnifiedInboxService, conversation_id: str):
+    pages, cursor = [], None
+    while True:
+        started = time.perf_counter()
+        result = await service.get_messages(conversation_id, BUYER, page_size=PAGE_SIZE, cursor=cursor)
+        pages.append((time.perf_counter() - started, result["messages"]))
+        cursor = result["next_cursor"]
+        if not cursor:
+            return pages
+
+
+async def legacy_chat_walk(db, conversation_id: str):
+    pages, before = [], None
+    while True:
+        started = time.perf_counter()
+        query = {"conversation_id": conversation_id}
+        if before:
+            query["timestamp"] = {"$lt": before}
+        messages = await db.messages.find(query).sort("timestamp", -1).limit(PAGE_SIZE).to_list(PAGE_SIZE)
+        pages.append((time.perf_counter() - started, messages))
+        if len(messages) < PAGE_SIZE:
+            return pages
+        before = messages[-1]["timestamp"]
+
+
+async def keyset_chat_walk(service: RealTimeMessagingService, conversation_id: str):
+    pages, cursor = [], None
+    while True:
+        started = time.perf_counter()
+        result = await service.get_messages(conversation_id, BUYER, limit=PAGE_SIZE, cursor=cursor)
+        pages.append((time.perf_counter() - started, result["messages"]))
+        cursor = result["next_cursor"]
+        if not cursor:
+            return pages
+
+
+def report(label: str, pages):
+    total_s = sum(elapsed for elapsed, _ in pages)
+    count = sum(len(messages) for _, messages in pages)
+    size = sum(len(bson.encode(message)) for _, messages in pages for message in messages)
+    print(f"   {label:<14} {total_s * 1000:9.1f} ms total | first page {pages[0][0] * 1000:6.1f} ms | "
+          f"last page {pages[-1][0] * 1000:6.1f} ms | {count} messages, {size / 1024:8.0f} KiB")
+    return total_s
+
+
+async def timed(label: str, coro):
+    started = time.perf_counter()
+    await coro
+    print(f"   {label:<14} {(time.perf_counter() - started) * 1000:9.1f} ms")
+
+
+async def main():
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[BENCH_DB]
+    inbox = UnifiedInboxService(db)
+    chat = RealTimeMessagingService(db)
+
+    try:
+        await client.drop_database(BENCH_DB)
+        inbox_id, chat_id = await seed(db)
+        print(f"⏱️  {MESSAGES} messages per conversation, {PAGE_SIZE} per page, "
+              f"{await db.messages.count_documents({})} messages in the collection")
+
+        # Legacy reads run before the history indexes exist, as they did in production
+        print("\n📥 Inbox history (oldest first)")
+        legacy_inbox = report("legacy", await legacy_inbox_walk(db, inbox_id))
+        print("\n💬 Chat history (newest first)")
+        legacy_chat = report("legacy", await legacy_chat_walk(db, chat_id))
+
+        await inbox.ensure_indexes()
+        await chat.ensure_indexes()
+
+        print("\n📥 Inbox history (oldest first)")
+        keyset_inbox = report("keyset", await keyset_inbox_walk(inbox, inbox_id))
+        print("\n💬 Chat history (newest first)")
+        keyset_chat = report("keyset", await keyset_chat_walk(chat, chat_id))
+
+        print("\n✅ Mark conversation read")
+        await timed("legacy", db.messages.update_many(
+            {"conversation_id": inbox_id, "read_by.user_id": {"$ne": "bench-admin"}},
+            {"$push": {"read_by": {"user_id": "bench-admin", "at": datetime.now(timezone.utc)}}}
+        ))
+        await timed("pointer", inbox.mark_conversation_read(inbox_id, SELLER))
+
+        print(f"\nspeedup inbox {legacy_inbox / keyset_inbox:.1f}x, chat {legacy_chat / keyset_chat:.1f}x")
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
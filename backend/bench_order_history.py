@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark for /orders/user order history
+
+Seeds a scratch database with a buyer (and a seller) holding 10, 100 and 1000
+order groups, then compares the legacy per-group/per-order lookups against
+OrderHistoryService. Reports wall time and the number of MongoDB commands.
+
+Usage: MONGO_URL=mongodb://localhost:27017 python bench_order_history.py
+The scratch database (BENCH_DB_NAME, default stocklot_bench_orders) is dropped afterwards.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from services.order_history_service import OrderHistoryService
+
+mongo_url = os.environ.get('MONGO_URL') or 'mongodb://localhost:27017'
+db_name = os.environ.get('BENCH_DB_NAME', 'stocklot_bench_orders')
+ORDER_COUNTS = [10, 100, 1000]
+SELLERS_PER_GROUP = 2
+ITEMS_PER_ORDER = 2
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name in ("find", "aggregate", "count", "getMore"):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def seed(db, buyer_id: str, seller_id: str, n_groups: int):
+    now = datetime.now(timezone.utc)
+    users = [{"id": buyer_id, "full_name": "Bench Buyer"}, {"id": seller_id, "full_name": "Bench Seller"}]
+    groups, seller_orders, items = [], [], []
+    for i in range(n_groups):
+        group_id = str(uuid.uuid4())
+        created = now - timedelta(minutes=i)
+        groups.append({"id": group_id, "buyer_user_id": buyer_id, "status": "paid", "created_at": created})
+        for s in range(SELLERS_PER_GROUP):
+            so_seller = seller_id if s == 0 else f"other-seller-{i % 20}"
+            so_id = str(uuid.uuid4())
+            seller_orders.append({
+                "id": so_id, "order_group_id": group_id, "seller_id": so_seller,
+                "status": "PENDING", "total": 150.0, "created_at": created
+            })
+            for _ in range(ITEMS_PER_ORDER):
+                items.append({"id": str(uuid.uuid4()), "seller_order_id": so_id, "qty": 1, "unit_price": 75.0})
+    users += [{"id": f"other-seller-{k}", "full_name": f"Seller {k}"} for k in range(20)]
+
+    await db.users.insert_many(users)
+    await db.order_groups.insert_many(groups)
+    await db.seller_orders.insert_many(seller_orders)
+    await db.order_items.insert_many(items)
+
+
+async def legacy_buyer_history(db, user_id: str):
+    """The pre-batching buyer loop: one seller_orders query per group, one user and items query per order"""
+    groups = []
+    async for group in db.order_groups.find({"buyer_user_id": user_id}).sort("created_at", -1):
+        orders = []
+        for so in await db.seller_orders.find({"order_group_id": group["id"]}).to_list(length=None):
+            seller = await db.users.find_one({"id": so["seller_id"]})
+            order_items = await db.order_items.find({"seller_order_id": so["id"]}).to_list(length=None)
+            orders.append({"id": so["id"], "seller": seller.get("full_name") if seller else None, "items": order_items})
+        group["orders"] = orders
+        groups.append(group)
+    return groups
+
+
+async def timed(counter, label, coro):
+    counter.count = 0
+    started = time.perf_counter()
+    await coro
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"   {label:<36} {elapsed_ms:>9.1f} ms  {counter.count:>6} queries")
+
+
+async def main():
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(mongo_url, event_listeners=[counter])
+    db = client[db_name]
+    service = OrderHistoryService(db)
+
+    try:
+        await client.drop_database(db_name)
+        await service.ensure_indexes()
+
+        for n_groups in ORDER_COUNTS:
+            buyer_id, seller_id = f"bench-buyer-{n_groups}", f"bench-seller-{n_groups}"
+            await seed(db, buyer_id, seller_id, n_groups)
+
+            print(f"\n📦 {n_groups} order groups")
+            await timed(counter, "legacy buyer history (all groups)", legacy_buyer_history(db, buyer_id))
+            await timed(counter, "batched buyer history (page 1/20)", service.get_buyer_history(buyer_id, 1, 20))
+            await timed(counter, "batched buyer history (page 1/100)", service.get_buyer_history(buyer_id, 1, 100))
+            await timed(counter, "batched seller history (page 1/20)", service.get_seller_history(seller_id, 1, 20))
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
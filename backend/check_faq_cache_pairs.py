@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+🧪 Regression check for the FAQ response cache
+
+Stores an answer for one question and looks up another through
+SemanticResponseCache with the configured embedder and threshold:
+
+- DISTINCT pairs differ in a word that changes the answer (species, buyer vs
+  seller side, a negation) and must miss
+- SAME pairs are rephrasings of one question and should hit; a miss here only
+  costs a model call, so it is reported but does not fail the check
+
+Prints the cosine score of each pair under the local embedder for reference.
+
+Usage: python check_faq_cache_pairs.py
+Env: FAQ_CACHE_EMBEDDER (default local), FAQ_CACHE_SIMILARITY
+"""
+
+import os
+import sys
+import asyncio
+
+os.environ.setdefault('FAQ_CACHE_EMBEDDER', 'local')
+
+from services.semantic_response_cache import SemanticResponseCache, local_embedding
+
+DISTINCT = [
+    ("How do I buy goats?", "How do I buy sheep?"),
+    ("What are the fees for buyers?", "What are the fees for sellers?"),
+    ("Is there a fee?", "Is there no fee?"),
+    ("Is there any fee for listing?", "Is there no fee for listing?"),
+    ("How do I buy cattle?", "How do I sell cattle?"),
+    ("Can I cancel my order?", "Can I not cancel my order?"),
+]
+
+SAME = [
+    ("How do I pay?", "how can I pay"),
+    ("Hi, how do I buy goats?", "how do i buy goats please"),
+    ("What are the delivery fees?", "Tell me, what are the delivery fees"),
+]
+
+
+async def served(cache: SemanticResponseCache, stored: str, asked: str) -> bool:
+    cache.invalidate()
+    await cache.store(stored, {"answer": stored})
+    response, _ = await cache.lookup(asked)
+    return response is not None
+
+
+async def main() -> bool:
+    cache = SemanticResponseCache()
+    print(f"🧪 embedder {cache.embedder}, similarity threshold {cache.similarity_threshold}")
+    ok = True
+
+    for stored, asked in DISTINCT:
+        hit = await served(cache, stored, asked)
+        ok = ok and not hit
+        score = float(local_embedding(stored) @ local_embedding(asked))
+        print(f"{'❌ served' if hit else '✅ missed'} {score:.3f}  {stored!r} -> {asked!r}")
+
+    for stored, asked in SAME:
+        hit = await served(cache, stored, asked)
+        score = float(local_embedding(stored) @ local_embedding(asked))
+        print(f"{'✅ served' if hit else '⚠️  missed'} {score:.3f}  {stored!r} -> {asked!r}")
+
+    print("✅ No wrong answers served" if ok else "❌ Cache served another question's answer")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+🧪 Concurrency check for UnifiedInboxService.send_message
+
+Creates an order conversation between a buyer, a seller and an admin in a
+scratch database and fires BENCH_SENDS sends from random participants at
+once. Every participant's per_user.unread_count must then equal the number
+of messages the others sent, and so must their inbox_unread_counters total.
+
+For contrast, the same burst is replayed with the old read-modify-write
+update (read per_user, bump it in Python, $set it back) to show how many
+increments that loses.
+
+Usage: python check_inbox_send_concurrency.py
+Env: MONGO_URL, BENCH_DB (default stocklot_check_inbox, dropped afterwards),
+     BENCH_SENDS (default 1000)
+"""
+
+import os
+import sys
+import random
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from inbox_models.inbox_models import ConversationType
+from services.unified_inbox_service import UnifiedInboxService
+
+SENDS = int(os.environ.get('BENCH_SENDS', '1000'))
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+BENCH_DB = os.environ.get('BENCH_DB', 'stocklot_check_inbox')
+PARTICIPANTS = ["buyer-1", "seller-1", "admin-1"]
+
+
+async def legacy_send(db, conversation_id: str, sender_id: str):
+    """The pre-arrayFilters update: read the conversation, bump per_user in Python, write it back"""
+    conversation = await db.conversations.find_one({"id": conversation_id})
+    for pu in conversation["per_user"]:
+        if pu["user_id"] != sender_id:
+            pu["unread_count"] = pu.get("unread_count", 0) + 1
+    await db.conversations.update_one(
+        {"id": conversation_id},
+        {"$set": {"per_user": conversation["per_user"], "last_sender_id": sender_id,
+                  "updated_at": datetime.now(timezone.utc)}}
+    )
+
+
+def expected_unread(senders):
+    sent = Counter(senders)
+    return {user_id: len(senders) - sent[user_id] for user_id in PARTICIPANTS}
+
+
+async def unread_counts(db, conversation_id: str):
+    conversation = await db.conversations.find_one({"id": conversation_id}, {"_id": 0, "per_user": 1})
+    return {pu["user_id"]: pu.get("unread_count", 0) for pu in conversation["per_user"]}
+
+
+async def main() -> bool:
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[BENCH_DB]
+    service = UnifiedInboxService(db)
+    rng = random.Random(49)
+    ok = True
+
+    try:
+        await service.ensure_indexes()
+        conversation_id = await service.ensure_conversation(
+            type=ConversationType.ORDER,
+            subject="Order: Concurrency check",
+            participants=[{"user_id": user_id, "role": role}
+                          for user_id, role in zip(PARTICIPANTS, ["BUYER", "SELLER", "ADMIN"])],
+            order_group_id="og-concurrency"
+        )
+        # Build the counter documents first so sends have something to increment
+        for user_id in PARTICIPANTS:
+            await service.get_inbox_summary(user_id)
+
+        senders = [rng.choice(PARTICIPANTS) for _ in range(SENDS)]
+        expected = expected_unread(senders)
+
+        print(f"🧪 {SENDS} parallel sends from {dict(Counter(senders))}")
+        await asyncio.gather(*(
+            service.send_message(conversation_id, sender_id, f"message {i}")
+            for i, sender_id in enumerate(senders)
+        ))
+
+        stored = await db.messages.count_documents({"conversation_id": conversation_id})
+        per_user = await unread_counts(db, conversation_id)
+        for user_id in PARTICIPANTS:
+            summary = await service.get_inbox_summary(user_id)
+            matches = per_user[user_id] == expected[user_id] == summary.total_unread
+            ok = ok and matches
+            print(f"{'✅' if matches else '❌'} {user_id:<9} expected {expected[user_id]:5d} | "
+                  f"per_user {per_user[user_id]:5d} | counter {summary.total_unread:5d}")
+        ok = ok and stored == SENDS
+        print(f"{'✅' if stored == SENDS else '❌'} {stored} messages stored")
+
+        # Same burst through the old read-modify-write update
+        await db.conversations.update_one({"id": conversation_id}, {"$set": {"per_user.$[].unread_count": 0}})
+        await asyncio.gather(*(legacy_send(db, conversation_id, sender_id) for sender_id in senders))
+        legacy = await unread_counts(db, conversation_id)
+        lost = sum(expected[user_id] - legacy[user_id] for user_id in PARTICIPANTS)
+        print(f"legacy read-modify-write lost {lost} of {sum(expected.values())} increments")
+    finally:
+        await client.drop_database(BENCH_DB)
+
+    print("✅ No lost updates" if ok else "❌ Unread counts diverged")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
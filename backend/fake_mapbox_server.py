@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+🧪 Local fake Mapbox server for mapping tests
+
+Implements the endpoints MapboxService uses - forward geocoding, driving
+directions, the directions matrix and optimized trips - against a small
+gazetteer of South African towns. Road distances are the great-circle
+distance times ROAD_FACTOR at AVERAGE_SPEED_KMH. Every request needs an
+access_token, and /_stats counts requests per endpoint so tests can assert
+how often the real API would have been called.
+
+Usage: uvicorn fake_mapbox_server:app --port 8098
+       MAPBOX_BASE_URL=http://localhost:8098 MAPBOX_ACCESS_TOKEN=pk.fake ...
+Env: FAKE_MAPBOX_LATENCY_MS (default 80)
+"""
+
+import os
+import re
+import asyncio
+from collections import Counter
+from typing import List, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from services.geo import haversine_km
+
+LATENCY_MS = float(os.environ.get('FAKE_MAPBOX_LATENCY_MS', '80'))
+ROAD_FACTOR = 1.25
+AVERAGE_SPEED_KMH = 80
+
+# name -> (longitude, latitude, province)
+GAZETTEER = {
+    "johannesburg": (28.0473, -26.2041, "Gauteng"),
+    "pretoria": (28.1881, -25.7479, "Gauteng"),
+    "soweto": (27.8546, -26.2485, "Gauteng"),
+    "cape town": (18.4241, -33.9249, "Western Cape"),
+    "stellenbosch": (18.8602, -33.9321, "Western Cape"),
+    "george": (22.4617, -33.9630, "Western Cape"),
+    "durban": (31.0218, -29.8587, "KwaZulu-Natal"),
+    "pietermaritzburg": (30.3794, -29.6006, "KwaZulu-Natal"),
+    "newcastle": (29.9318, -27.7575, "KwaZulu-Natal"),
+    "port elizabeth": (25.6022, -33.9608, "Eastern Cape"),
+    "east london": (27.9116, -33.0153, "Eastern Cape"),
+    "mthatha": (28.7842, -31.5889, "Eastern Cape"),
+    "bloemfontein": (26.1596, -29.0852, "Free State"),
+    "kroonstad": (27.2345, -27.6504, "Free State"),
+    "polokwane": (29.4486, -23.9045, "Limpopo"),
+    "thohoyandou": (30.4797, -22.9456, "Limpopo"),
+    "mbombela": (30.9694, -25.4753, "Mpumalanga"),
+    "ermelo": (29.9833, -26.5333, "Mpumalanga"),
+    "mahikeng": (25.6441, -25.8652, "North West"),
+    "rustenburg": (27.2420, -25.6676, "North West"),
+    "kimberley": (24.7499, -28.7282, "Northern Cape"),
+    "upington": (21.2561, -28.4478, "Northern Cape"),
+    # Provinces resolve to their capitals, like a region-level Mapbox result
+    "gauteng": (28.0473, -26.2041, "Gauteng"),
+    "western cape": (18.4241, -33.9249, "Western Cape"),
+    "kwazulu natal": (30.3794, -29.6006, "KwaZulu-Natal"),
+    "eastern cape": (27.3981, -32.2968, "Eastern Cape"),
+    "free state": (26.1596, -29.0852, "Free State"),
+    "limpopo": (29.4486, -23.9045, "Limpopo"),
+    "mpumalanga": (30.9694, -25.4753, "Mpumalanga"),
+    "north west": (25.6441, -25.8652, "North West"),
+    "northern cape": (24.7499, -28.7282, "Northern Cape"),
+}
+
+app = FastAPI(title="Fake Mapbox")
+stats = Counter()
+
+
+def _error(status_code: int, message: str):
+    return JSONResponse(status_code=status_code, content={"message": message})
+
+
+def _parse_coordinates(coordinates: str) -> List[Tuple[float, float]]:
+    """``"lng,lat;lng,lat"`` -> ``[(lng, lat), ...]``"""
+    return [tuple(float(value) for value in pair.split(",")) for pair in coordinates.split(";")]
+
+
+def _leg(start: Tuple[float, float], end: Tuple[float, float]) -> Tuple[float, float]:
+    """``(distance_m, duration_s)`` of a fake road between two points"""
+    km = haversine_km(start[1], start[0], end[1], end[0]) * ROAD_FACTOR
+    return km * 1000, km / AVERAGE_SPEED_KMH * 3600
+
+
+def _line(points: List[Tuple[float, float]]) -> dict:
+    return {"type": "LineString", "coordinates": [list(point) for point in points]}
+
+
+@app.middleware("http")
+async def authenticate_count_and_delay(request: Request, call_next):
+    stats["requests"] += 1
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    if request.url.path.startswith("/_"):
+        return await call_next(request)
+    if not request.query_params.get("access_token"):
+        return _error(401, "Not Authorized - No Token")
+    return await call_next(request)
+
+
+@app.get("/geocoding/v5/mapbox.places/{query}.json")
+async def forward_geocode(query: str, country: str = None, limit: int = 5):
+    stats["geocoding"] += 1
+    text = " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+    features = []
+    for name, (lng, lat, province) in GAZETTEER.items():
+        if re.search(rf"\b{name}\b", text):
+            features.append({
+                "id": f"place.{abs(hash(name)) % 10 ** 8}",
+                "type": "Feature",
+                "place_type": ["region" if name == province.lower().replace("-", " ") else "place"],
+                "text": name.title(),
+                "place_name": f"{name.title()}, {province}, South Africa",
+                "center": [lng, lat],
+                "geometry": {"type": "Point", "coordinates": [lng, lat]},
+                "bbox": [lng - 0.3, lat - 0.3, lng + 0.3, lat + 0.3],
+                "context": [{"id": "region", "text": province}, {"id": "country", "short_code": "za",
+                                                                   "text": "South Africa"}],
+            })
+    # Towns before provinces, longest (most specific) name first
+    features.sort(key=lambda f: (f["place_type"] == ["region"], -len(f["text"])))
+    return {"type": "FeatureCollection", "query": text.split(), "features": features[:limit]}
+
+
+@app.get("/directions/v5/mapbox/driving/{coordinates}")
+async def directions(coordinates: str):
+    stats["directions"] += 1
+    points = _parse_coordinates(coordinates)
+    legs = [_leg(a, b) for a, b in zip(points, points[1:])]
+    return {
+        "code": "Ok",
+        "routes": [{
+            "distance": sum(distance for distance, _ in legs),
+            "duration": sum(duration for _, duration in legs),
+            "geometry": _line(points),
+            "legs": [{"distance": distance, "duration": duration} for distance, duration in legs],
+        }],
+    }
+
+
+@app.get("/directions-matrix/v1/mapbox/driving/{coordinates}")
+async def directions_matrix(coordinates: str, sources: str = None, destinations: str = None):
+    stats["matrix"] += 1
+    points = _parse_coordinates(coordinates)
+    all_indexes = ";".join(str(i) for i in range(len(points)))
+    source_indexes = [int(i) for i in (sources or all_indexes).split(";")]
+    destination_indexes = [int(i) for i in (destinations or all_indexes).split(";")]
+    legs = [[_leg(points[s], points[d]) for d in destination_indexes] for s in source_indexes]
+    return {
+        "code": "Ok",
+        "distances": [[distance for distance, _ in row] for row in legs],
+        "durations": [[duration for _, duration in row] for row in legs],
+        "sources": [{"location": list(points[i])} for i in source_indexes],
+        "destinations": [{"location": list(points[i])} for i in destination_indexes],
+    }
+
+
+@app.get("/optimized-trips/v1/mapbox/driving/{coordinates}")
+async def optimized_trips(coordinates: str):
+    stats["optimization"] += 1
+    points = _parse_coordinates(coordinates)
+    # Stops are visited in the order given; good enough for exercising the client
+    legs = [_leg(a, b) for a, b in zip(points, points[1:])]
+    return {
+        "code": "Ok",
+        "trips": [{
+            "distance": sum(distance for distance, _ in legs),
+            "duration": sum(duration for _, duration in legs),
+            "geometry": _line(points),
+            "legs": [{"distance": distance, "duration": duration, "waypoint_index": i + 1}
+                     for i, (distance, duration) in enumerate(legs)],
+        }],
+        "waypoints": [{"waypoint_index": i, "trips_index": 0, "location": list(point)}
+                      for i, point in enumerate(points)],
+    }
+
+
+@app.get("/_stats")
+async def get_stats():
+    return stats
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+🧪 Local fake Paystack server for transfer testing
+
+Implements the transfer endpoints PaystackTransferClient uses - single and
+bulk initiate, verify by reference, fetch by code - and keeps transfers in
+memory. References are unique like on Paystack, so resubmitting one is
+rejected. Set FAKE_PAYSTACK_FAIL_EVERY=n to fail every n-th transfer, and
+FAKE_PAYSTACK_LATENCY_MS to add latency per request.
+
+Usage: uvicorn fake_paystack_server:app --port 8099
+       PAYSTACK_BASE_URL=http://localhost:8099 PAYSTACK_SECRET_KEY=sk_test_fake ...
+Env: FAKE_PAYSTACK_LATENCY_MS (default 50), FAKE_PAYSTACK_FAIL_EVERY (default 0, never)
+"""
+
+import os
+import uuid
+import asyncio
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.environ.get('FAKE_PAYSTACK_LATENCY_MS', '50'))
+FAIL_EVERY = int(os.environ.get('FAKE_PAYSTACK_FAIL_EVERY', '0'))
+BULK_LIMIT = 100
+
+app = FastAPI(title="Fake Paystack")
+transfers_by_reference = {}
+stats = {"requests": 0, "single_requests": 0, "bulk_requests": 0, "transfers": 0}
+
+
+def _error(status_code: int, message: str):
+    return JSONResponse(status_code=status_code, content={"status": False, "message": message})
+
+
+def _create_transfer(item: dict, currency: str) -> dict:
+    stats["transfers"] += 1
+    failed = FAIL_EVERY and stats["transfers"] % FAIL_EVERY == 0
+    transfer = {
+        "id": stats["transfers"],
+        "reference": item["reference"],
+        "recipient": item["recipient"],
+        "amount": item["amount"],
+        "currency": currency,
+        "reason": item.get("reason"),
+        "transfer_code": f"TRF_{uuid.uuid4().hex[:12]}",
+        "status": "failed" if failed else "pending",
+        "message": "Recipient account could not be credited" if failed else None,
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+    }
+    transfers_by_reference[item["reference"]] = transfer
+    return transfer
+
+
+@app.middleware("http")
+async def count_and_delay(request: Request, call_next):
+    stats["requests"] += 1
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    return await call_next(request)
+
+
+@app.post("/transfer")
+async def initiate_transfer(request: Request):
+    body = await request.json()
+    stats["single_requests"] += 1
+    if body["reference"] in transfers_by_reference:
+        return _error(400, "Duplicate Transfer Reference")
+    return {"status": True, "message": "Transfer has been queued",
+            "data": _create_transfer(body, body.get("currency", "ZAR"))}
+
+
+@app.post("/transfer/bulk")
+async def initiate_bulk_transfer(request: Request):
+    body = await request.json()
+    stats["bulk_requests"] += 1
+    items = body.get("transfers", [])
+    if len(items) > BULK_LIMIT:
+        return _error(400, f"Bulk transfers are limited to {BULK_LIMIT} items")
+    duplicates = [item["reference"] for item in items if item["reference"] in transfers_by_reference]
+    if duplicates:
+        return _error(400, f"Duplicate Transfer Reference: {duplicates[0]}")
+    currency = body.get("currency", "ZAR")
+    data = [_create_transfer(item, currency) for item in items]
+    return {"status": True, "message": f"{len(data)} transfers queued.", "data": data}
+
+
+@app.get("/transfer/verify/{reference}")
+async def verify_transfer(reference: str):
+    transfer = transfers_by_reference.get(reference)
+    if not transfer:
+        return _error(404, "Transfer not found")
+    return {"status": True, "message": "Transfer retrieved", "data": transfer}
+
+
+@app.get("/transfer/{code}")
+async def fetch_transfer(code: str):
+    transfer = next((t for t in transfers_by_reference.values() if t["transfer_code"] == code), None)
+    if not transfer:
+        return _error(404, "Transfer not found")
+    return {"status": True, "message": "Transfer retrieved", "data": transfer}
+
+
+@app.get("/_stats")
+async def get_stats():
+    return stats
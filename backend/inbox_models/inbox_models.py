@@ -54,6 +54,7 @@ class PerUser(BaseModel):
     muted: bool = False
     archived: bool = False
     deleted: bool = False
+    last_read_at: Optional[datetime] = None  # messages up to here count as read
 
 class Attachment(BaseModel):
     url: str
@@ -108,7 +109,7 @@ class Message(BaseModel):
     visibility: MessageVisibility = MessageVisibility.VISIBLE
     redaction_reason: Optional[str] = None
     
-    # Read receipts
+    # Read receipts (legacy; read state now comes from PerUser.last_read_at)
     read_by: List[ReadMark] = []
     delivered_to: List[ReadMark] = []
     
@@ -84,6 +84,7 @@ class SellerRatingStats(BaseModel):
     avg_rating_bayes: float = 0.0
     avg_rating_raw: float = 0.0
     ratings_count: int = 0
+    rating_sum: int = 0
     star_1: int = 0
     star_2: int = 0
     star_3: int = 0
@@ -97,6 +98,7 @@ class BuyerRatingStats(BaseModel):
     avg_rating_bayes: float = 0.0
     avg_rating_raw: float = 0.0
     ratings_count: int = 0
+    rating_sum: int = 0
     reliability_score: float = 0.0
     last_review_at: Optional[datetime] = None
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
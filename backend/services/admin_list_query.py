@@ -0,0 +1,191 @@
+"""
+Paginated admin list queries.
+
+Admin tables (listings, orders, payments, organizations) share one pipeline
+shape:
+
+1. ``$match`` the filters, plus the keyset condition when a cursor is given;
+2. ``$sort`` on ``(sort_field, _id)``, which the compound indexes created in
+   ``ensure_indexes`` serve, then ``$skip``/``$limit`` to one page;
+3. only then run the page stages (``$lookup`` joins, computed fields) and the
+   final ``$project``, so joins touch ``limit`` documents, not every match.
+
+Totals come from ``count_documents`` cached per collection and filter for a
+short TTL and run concurrently with the page query. Deep pages should use the
+opaque ``next_cursor`` (keyset pagination) instead of ``page``, which costs a
+``$skip`` over every earlier row. Keyset pagination assumes the sort field has
+one BSON type across the collection.
+"""
+import os
+import json
+import base64
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Compound indexes behind each admin list: filter field (if any), then the sort key
+ADMIN_LIST_INDEXES = {
+    "listings": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="admin_listings_created"),
+        IndexModel([("moderation_status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="admin_listings_moderation_created"),
+        IndexModel([("org_id", ASCENDING)], name="listings_org_id"),
+    ],
+    "orders": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="admin_orders_created"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="admin_orders_status_created"),
+    ],
+    "payments": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="admin_payments_created"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="admin_payments_status_created"),
+    ],
+    "organizations": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="admin_organizations_created"),
+    ],
+    "org_memberships": [IndexModel([("org_id", ASCENDING)], name="org_memberships_org_id")],
+    "org_kyc": [IndexModel([("org_id", ASCENDING)], name="org_kyc_org_id")],
+}
+
+
+def encode_cursor(sort_value: Any, document_id: ObjectId) -> str:
+    if isinstance(sort_value, datetime):
+        value = {"date": sort_value.isoformat()}
+    else:
+        value = {"value": sort_value}
+    payload = json.dumps({**value, "id": str(document_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """``(sort_value, _id)`` of an ``encode_cursor`` string; raises ValueError when malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        sort_value = datetime.fromisoformat(payload["date"]) if "date" in payload else payload["value"]
+        return sort_value, ObjectId(payload["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def lookup_one(from_collection: str, local_field: str, foreign_field: str, as_field: str,
+               fields: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Stages joining the first related document (or nothing) as ``as_field``, projected to ``fields``"""
+    pipeline = [{"$match": {"$expr": {"$eq": [f"${foreign_field}", "$$key"]}}}, {"$limit": 1}]
+    if fields:
+        pipeline.append({"$project": fields})
+    return [
+        {"$lookup": {"from": from_collection, "let": {"key": f"${local_field}"},
+                     "pipeline": pipeline, "as": as_field}},
+        {"$unwind": {"path": f"${as_field}", "preserveNullAndEmptyArrays": True}},
+    ]
+
+
+def lookup_count(from_collection: str, foreign_field: str, as_field: str, local_field: str = "id") -> List[Dict[str, Any]]:
+    """Stages counting related documents into ``as_field`` without loading them"""
+    return [
+        {"$lookup": {
+            "from": from_collection,
+            "let": {"key": f"${local_field}"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": [f"${foreign_field}", "$$key"]}}},
+                {"$count": "n"}
+            ],
+            "as": as_field
+        }},
+        {"$addFields": {as_field: {"$ifNull": [{"$arrayElemAt": [f"${as_field}.n", 0]}, 0]}}},
+    ]
+
+
+class AdminListQuery:
+    def __init__(self, db, count_ttl_seconds: float = None):
+        self.db = db
+        ttl = count_ttl_seconds if count_ttl_seconds is not None else float(os.getenv("ADMIN_COUNT_CACHE_SECONDS", "30"))
+        self._counts = TTLCache(ttl_seconds=ttl, max_entries=512)
+
+    async def ensure_indexes(self):
+        for collection, indexes in ADMIN_LIST_INDEXES.items():
+            try:
+                await self.db[collection].create_indexes(indexes)
+            except Exception as e:
+                logger.warning(f"Could not create admin list indexes on {collection}: {e}")
+
+    async def count(self, collection: str, match: Dict[str, Any]) -> int:
+        """``count_documents`` for a filter, cached for a short TTL"""
+        key = (collection, json.dumps(match, sort_keys=True, default=str))
+        total = self._counts.get(key)
+        if total is None:
+            total = await self.db[collection].count_documents(match)
+            self._counts.set(key, total)
+        return total
+
+    async def page(
+        self,
+        collection: str,
+        match: Dict[str, Any],
+        projection: Dict[str, Any],
+        page: int = 1,
+        limit: Optional[int] = 20,
+        cursor: Optional[str] = None,
+        sort_field: str = "created_at",
+        page_stages: Optional[List[Dict[str, Any]]] = None,
+        with_total: bool = True
+    ) -> Dict[str, Any]:
+        """
+        One page of ``collection`` newest first: ``{"items", "total",
+        "next_cursor", "has_more"}``. ``projection`` (inclusion or exclusion)
+        is applied after ``page_stages``, so it may reference joined fields.
+        ``total`` is ``None`` when ``with_total`` is off. ``limit=None``
+        returns every matching row (for legacy callers that expect the full list).
+        """
+        page_match = dict(match)
+        if cursor:
+            sort_value, last_id = decode_cursor(cursor)
+            keyset = {"$or": [
+                {sort_field: {"$lt": sort_value}},
+                {sort_field: sort_value, "_id": {"$lt": last_id}},
+            ]}
+            page_match = {"$and": [match, keyset]} if match else keyset
+
+        # Carry what the next cursor needs through the caller's projection; dropped below
+        project = dict(projection)
+        if any(value != 0 for value in project.values()):
+            project.update({"_sort_key": 1, "_cursor_id": 1})
+
+        pipeline = [
+            {"$match": page_match},
+            {"$sort": {sort_field: -1, "_id": -1}},
+        ]
+        if limit is not None:
+            if not cursor:
+                pipeline.append({"$skip": (page - 1) * limit})
+            # One extra row tells us whether another page exists
+            pipeline.append({"$limit": limit + 1})
+        pipeline.extend(page_stages or [])
+        pipeline.append({"$addFields": {"_sort_key": f"${sort_field}", "_cursor_id": "$_id"}})
+        pipeline.append({"$project": project})
+
+        rows_task = self.db[collection].aggregate(pipeline).to_list(length=limit + 1 if limit is not None else None)
+        if with_total:
+            rows, total = await asyncio.gather(rows_task, self.count(collection, match))
+        else:
+            rows, total = await rows_task, None
+
+        has_more = limit is not None and len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].get("_sort_key"), rows[-1]["_cursor_id"]) if has_more else None
+
+        for row in rows:
+            row.pop("_sort_key", None)
+            row.pop("_cursor_id", None)
+
+        return {"items": rows, "total": total, "next_cursor": next_cursor, "has_more": has_more}
@@ -1,12 +1,12 @@
-import os
 import logging
-import openai
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timezone
 import json
 import re
 from enum import Enum
 
+from services.llm_gateway import llm_gateway
+
 logger = logging.getLogger(__name__)
 
 class ModerationCategory(str, Enum):
@@ -24,9 +24,7 @@ class MatchingScore(str, Enum):
 
 class AIEnhancedService:
     def __init__(self):
-        self.openai_client = openai.OpenAI(
-            api_key=os.environ.get('OPENAI_API_KEY')
-        )
+        self.llm = llm_gateway
         
     async def enhanced_content_moderation(
         self,
@@ -59,7 +57,7 @@ class AIEnhancedService:
             - suggestions: array of improvements if needed
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {
@@ -138,7 +136,7 @@ class AIEnhancedService:
             - recommendation: detailed explanation
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {
@@ -225,7 +223,7 @@ class AIEnhancedService:
             - confidence: number 0-100 for price accuracy
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {
@@ -305,7 +303,7 @@ class AIEnhancedService:
             - requirements: structured list of key requirements
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {
@@ -376,7 +374,7 @@ class AIEnhancedService:
             - special_requirements: array of any special needs detected
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {
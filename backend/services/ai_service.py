@@ -1,18 +1,18 @@
 """
 AI Service using OpenAI for intelligent responses
 """
-import os
+import time
 import logging
 from typing import Optional, Dict, Any
-from openai import AsyncOpenAI
+
+from services.llm_gateway import llm_gateway
+from services.semantic_response_cache import faq_response_cache
 
 logger = logging.getLogger(__name__)
 
 class AIService:
     def __init__(self):
-        self.client = AsyncOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+        self.llm = llm_gateway
         
         # System prompt for StockLot livestock marketplace - COMPREHENSIVE & ACCURATE
         self.system_prompt = """You are StockLot, the livestock & game marketplace assistant for South Africa and global exporters.
@@ -64,6 +64,18 @@ For support: Direct users to use "in-app messaging" or "platform support system"
         Get an AI-powered response to user questions about StockLot
         """
         try:
+            # Near-duplicate questions are answered from the semantic cache, per prompt context
+            # (user type and location both go into the prompt below)
+            started = time.perf_counter()
+            namespace = "ai_faq"
+            if user_context:
+                namespace += (f":{user_context.get('user_type', 'visitor')}"
+                              f":{str(user_context.get('location', 'South Africa')).strip().lower()}")
+            cached, embedding = await faq_response_cache.lookup(question, namespace)
+            if cached is not None:
+                faq_response_cache.record_latency(True, (time.perf_counter() - started) * 1000)
+                return cached
+            
             # Prepare the conversation with enhanced training examples
             messages = [
                 {"role": "system", "content": self.system_prompt},
@@ -82,7 +94,7 @@ For support: Direct users to use "in-app messaging" or "platform support system"
                 messages.insert(1, {"role": "system", "content": context_info})
 
             # Get response from OpenAI
-            response = await self.client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4o-mini",  # Fast and cost-effective
                 messages=messages,
                 max_tokens=300,
@@ -96,6 +108,9 @@ For support: Direct users to use "in-app messaging" or "platform support system"
             # Filter out any contact information that might slip through
             ai_response = self._remove_contact_details(ai_response)
             
+            await faq_response_cache.store(question, ai_response, namespace, embedding)
+            faq_response_cache.record_latency(False, (time.perf_counter() - started) * 1000)
+            
             return ai_response
             
         except Exception as e:
@@ -153,7 +168,7 @@ Write a 2-3 sentence description that highlights the animal's qualities and valu
 Be professional, factual, and appealing to livestock buyers.
 """
 
-            response = await self.client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are a livestock expert writing compelling but accurate descriptions for South African livestock marketplace listings."},
@@ -174,7 +189,7 @@ Be professional, factual, and appealing to livestock buyers.
         Analyze livestock image using OpenAI Vision
         """
         try:
-            response = await self.client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {
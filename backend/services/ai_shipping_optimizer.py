@@ -1,15 +1,14 @@
 # AI-Powered Shipping Rate Optimization Service
 # Uses OpenAI to provide intelligent shipping rate suggestions and analytics
 
-import os
 import json
 import logging
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
-import openai
-from openai import AsyncOpenAI
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from services.llm_gateway import llm_gateway
+
 logger = logging.getLogger(__name__)
 
 class AIShippingOptimizer:
@@ -17,19 +16,11 @@ class AIShippingOptimizer:
     
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
-        self.openai_client = None
-        self.enabled = False
+        self.llm = llm_gateway
+        self.enabled = llm_gateway.available
         
-        # Initialize OpenAI client
-        api_key = os.environ.get('OPENAI_API_KEY') or os.environ.get('EMERGENT_LLM_KEY')
-        if api_key:
-            try:
-                self.openai_client = AsyncOpenAI(api_key=api_key)
-                self.enabled = True
-                logger.info("✅ AI Shipping Optimizer initialized with OpenAI integration")
-            except Exception as e:
-                logger.error(f"❌ Failed to initialize OpenAI client: {e}")
-                self.enabled = False
+        if self.enabled:
+            logger.info("✅ AI Shipping Optimizer initialized with LLM gateway")
         else:
             logger.warning("⚠️ No OpenAI API key found - AI shipping features disabled")
     
@@ -360,7 +351,7 @@ class AIShippingOptimizer:
     async def _get_openai_suggestions(self, prompt: str) -> str:
         """Get AI suggestions from OpenAI"""
         try:
-            response = await self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are an expert shipping and logistics consultant specializing in agricultural markets in South Africa. Provide data-driven, practical recommendations."},
@@ -0,0 +1,189 @@
+"""
+Write-behind buffer for analytics ingestion.
+
+Tracking endpoints enqueue raw events and counter increments in memory and
+return immediately. A background task flushes the buffer every
+``flush_interval`` seconds (or as soon as ``flush_size`` events are waiting):
+events go out in one ``insert_many(ordered=False)`` and counter increments are
+coalesced per document into a single ``bulk_write`` of ``$inc`` updates. The
+buffer is bounded; events arriving while it is full are dropped and counted.
+Increments from a batch that failed outright are merged back and retried on
+the next flush; ones the server rejected are counted as dropped.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsEventBuffer:
+    def __init__(
+        self,
+        db,
+        flush_size: int = None,
+        flush_interval: float = None,
+        max_buffered: int = None
+    ):
+        self.db = db
+        self.flush_size = flush_size or int(os.getenv("ANALYTICS_FLUSH_SIZE", "500"))
+        self.flush_interval = flush_interval or float(os.getenv("ANALYTICS_FLUSH_INTERVAL_SECONDS", "2"))
+        self.max_buffered = max_buffered or int(os.getenv("ANALYTICS_MAX_BUFFERED", "20000"))
+
+        self._events: List[Dict[str, Any]] = []
+        # (collection, document id) -> {"inc": {field: n}, "set": {field: latest value}}
+        self._increments: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.counters = {
+            "buffered": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "increments_flushed": 0,
+            "increments_requeued": 0,
+            "increments_dropped": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+        }
+        self.last_flush_at: Optional[datetime] = None
+
+    def enqueue(self, event: Dict[str, Any]) -> bool:
+        """Buffer a raw analytics event. Returns False if it was dropped."""
+        if len(self._events) >= self.max_buffered:
+            self.counters["dropped"] += 1
+            return False
+        self._events.append(event)
+        self.counters["buffered"] += 1
+        if len(self._events) >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    def increment(self, collection: str, document_id: str, field: str, amount: int = 1,
+                  set_fields: Optional[Dict[str, Any]] = None):
+        """Coalesce a counter increment on ``collection`` document ``{"id": document_id}``"""
+        if not document_id:
+            return
+        pending = self._increments.setdefault((collection, document_id), {"inc": {}, "set": {}})
+        pending["inc"][field] = pending["inc"].get(field, 0) + amount
+        if set_fields:
+            pending["set"].update(set_fields)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("Analytics event buffer started")
+
+    async def stop(self):
+        """Stop the background flusher and write out everything still buffered"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info("Analytics event buffer stopped")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analytics buffer flush error: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            events, self._events = self._events, []
+            increments, self._increments = self._increments, {}
+            if not events and not increments:
+                return
+
+            await self._flush_events(events)
+            await self._flush_increments(increments)
+
+            self.counters["flushes"] += 1
+            self.last_flush_at = datetime.now(timezone.utc)
+
+    async def _flush_events(self, events: List[Dict[str, Any]]):
+        if not events:
+            return
+        try:
+            await self.db.analytics_events.insert_many(events, ordered=False)
+            self.counters["flushed"] += len(events)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            self.counters["flushed"] += len(events) - len(failed)
+            self.counters["dropped"] += len(failed)
+            self.counters["flush_errors"] += 1
+            logger.error(f"Analytics flush: {len(failed)} of {len(events)} events rejected")
+        except Exception as e:
+            # Transient failure: put the batch back if there is room for it
+            self.counters["flush_errors"] += 1
+            room = max(0, self.max_buffered - len(self._events))
+            self._events[:0] = events[:room]
+            self.counters["dropped"] += len(events) - min(room, len(events))
+            logger.error(f"Analytics flush failed, requeued {min(room, len(events))} events: {e}")
+
+    async def _flush_increments(self, increments: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]]):
+        by_collection: Dict[str, List[Tuple[str, str]]] = {}
+        for key in increments:
+            by_collection.setdefault(key[0], []).append(key)
+
+        for collection, keys in by_collection.items():
+            operations = []
+            for key in keys:
+                pending = increments[key]
+                update = {"$inc": pending["inc"]}
+                if pending["set"]:
+                    update["$set"] = pending["set"]
+                operations.append(UpdateOne({"id": key[1]}, update))
+            try:
+                await self.db[collection].bulk_write(operations, ordered=False)
+                self.counters["increments_flushed"] += len(operations)
+            except BulkWriteError as e:
+                # Rejected updates would fail again; count them so the loss shows in the metrics
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                self.counters["increments_flushed"] += len(operations) - len(failed)
+                self.counters["increments_dropped"] += len(failed)
+                self.counters["flush_errors"] += 1
+                logger.error(f"Analytics counter flush: {len(failed)} of {len(operations)} updates "
+                             f"rejected for {collection}")
+            except Exception as e:
+                # Transient failure: merge the batch back for the next flush
+                for key in keys:
+                    self._requeue_increment(key, increments[key])
+                self.counters["increments_requeued"] += len(keys)
+                self.counters["flush_errors"] += 1
+                logger.error(f"Analytics counter flush failed for {collection}, requeued {len(keys)}: {e}")
+
+    def _requeue_increment(self, key: Tuple[str, str], pending: Dict[str, Dict[str, Any]]):
+        current = self._increments.setdefault(key, {"inc": {}, "set": {}})
+        for field, amount in pending["inc"].items():
+            current["inc"][field] = current["inc"].get(field, 0) + amount
+        # Values set since the failed flush are newer and win
+        current["set"] = {**pending["set"], **current["set"]}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "pending_events": len(self._events),
+            "pending_increments": len(self._increments),
+            "flush_size": self.flush_size,
+            "flush_interval_seconds": self.flush_interval,
+            "last_flush_at": self.last_flush_at.isoformat() if self.last_flush_at else None
+        }
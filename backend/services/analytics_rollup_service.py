@@ -0,0 +1,336 @@
+"""
+Hourly and daily analytics rollups.
+
+An incremental job folds raw ``analytics_events`` into pre-aggregated
+documents so admin and seller dashboards read O(days) rollup rows instead of
+scanning every event in the reporting window.
+
+Each rollup document covers one bucket (hour or UTC day) for one scope:
+
+* ``listing`` - per listing (also carries the listing's ``seller_id``)
+* ``seller``  - per seller, across all their listings plus profile views
+* ``platform`` - marketplace totals (``scope_id`` is ``"all"``)
+
+Documents hold ``views``, ``unique_viewers``, ``cart_adds``,
+``profile_views``, per event-type ``event_counts`` and ``last_event_at``.
+Event types come from clients, so only ``ROLLUP_EVENT_TYPES`` get their own
+``event_counts`` key; anything else is counted under ``"other"``.
+Daily documents also carry ``viewers_hll``, a serialised HyperLogLog sketch
+of the bucket's viewers; sketches are merged to count unique viewers over
+arbitrary windows without materialising viewer ids.
+
+The job keeps a watermark and on each run recomputes only the days touched
+since it, so reruns are idempotent and late events within the current day
+are picked up.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne
+
+from services.hyperloglog import HyperLogLog
+from services.job_scheduler import every
+
+logger = logging.getLogger(__name__)
+
+HOURLY_COLLECTION = "analytics_rollups_hourly"
+DAILY_COLLECTION = "analytics_rollups_daily"
+STATE_COLLECTION = "analytics_rollup_state"
+
+PLATFORM_ID = "all"
+VIEW_EVENT = "pdp_view"
+CART_ADD_EVENT = "add_to_cart"
+PROFILE_VIEW_EVENT = "seller_profile_view"
+OTHER_EVENT = "other"
+# Event types counted individually; they become field names in event_counts
+ROLLUP_EVENT_TYPES = frozenset({
+    VIEW_EVENT, CART_ADD_EVENT, PROFILE_VIEW_EVENT,
+    "buy_now_click", "contact_seller", "delivery_quote_request", "offer_made", "listing_interaction",
+})
+
+# Events written by the buffered tracker may land a few seconds late
+SETTLE_DELAY = timedelta(minutes=5)
+WRITE_BATCH_SIZE = 1000
+# Buckets keep exact viewer sets until they grow past this, then switch to a sketch
+SKETCH_THRESHOLD = 2048
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Mongo returns naive UTC datetimes; normalise to aware UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def rollup_event_type(event_type: Any) -> str:
+    """``event_type`` if it is a known type, otherwise ``OTHER_EVENT``"""
+    return event_type if isinstance(event_type, str) and event_type in ROLLUP_EVENT_TYPES else OTHER_EVENT
+
+
+def floor_day(value: datetime) -> datetime:
+    return _as_utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def floor_hour(value: datetime) -> datetime:
+    return _as_utc(value).replace(minute=0, second=0, microsecond=0)
+
+
+class _Bucket:
+    """Accumulator for one (scope, scope_id, bucket) rollup row"""
+
+    __slots__ = ("seller_id", "event_counts", "viewers", "last_event_at")
+
+    def __init__(self):
+        self.seller_id: Optional[str] = None
+        self.event_counts: Dict[str, int] = {}
+        self.viewers: Union[Set[str], HyperLogLog] = set()
+        self.last_event_at: Optional[datetime] = None
+
+    def add(self, event_type: Optional[str], count: int, viewers: List[str], last_event_at: datetime):
+        event_type = rollup_event_type(event_type)
+        self.event_counts[event_type] = self.event_counts.get(event_type, 0) + count
+        if event_type == VIEW_EVENT:
+            self.viewers.update(v for v in viewers if v)
+            if isinstance(self.viewers, set) and len(self.viewers) > SKETCH_THRESHOLD:
+                self.viewers = HyperLogLog().update(self.viewers)
+        if self.last_event_at is None or last_event_at > self.last_event_at:
+            self.last_event_at = last_event_at
+
+    def sketch(self) -> HyperLogLog:
+        if isinstance(self.viewers, HyperLogLog):
+            return self.viewers
+        return HyperLogLog().update(self.viewers)
+
+    def to_document(self, scope: str, scope_id: str, bucket: datetime, granularity: str) -> Dict[str, Any]:
+        unique_viewers = len(self.viewers) if isinstance(self.viewers, set) else self.viewers.count()
+        doc = {
+            "_id": f"{scope}:{scope_id}:{bucket.strftime('%Y%m%d%H' if granularity == 'hour' else '%Y%m%d')}",
+            "scope": scope,
+            "scope_id": scope_id,
+            "bucket": bucket,
+            "views": self.event_counts.get(VIEW_EVENT, 0),
+            "unique_viewers": unique_viewers,
+            "cart_adds": self.event_counts.get(CART_ADD_EVENT, 0),
+            "profile_views": self.event_counts.get(PROFILE_VIEW_EVENT, 0),
+            "event_counts": self.event_counts,
+            "last_event_at": self.last_event_at,
+            "updated_at": datetime.now(timezone.utc)
+        }
+        if self.seller_id:
+            doc["seller_id"] = self.seller_id
+        if granularity == "day":
+            doc["viewers_hll"] = self.sketch().to_bytes()
+        return doc
+
+
+class AnalyticsRollupService:
+    def __init__(self, db, interval_seconds: int = 3600):
+        self.db = db
+        self.interval_seconds = interval_seconds
+        self._checked_sketches = False
+        self._lock = asyncio.Lock()
+
+    async def ensure_indexes(self):
+        try:
+            for name in (HOURLY_COLLECTION, DAILY_COLLECTION):
+                await self.db[name].create_indexes([
+                    IndexModel([("scope", ASCENDING), ("bucket", DESCENDING)], name="rollup_scope_bucket"),
+                    IndexModel([("scope", ASCENDING), ("scope_id", ASCENDING), ("bucket", DESCENDING)],
+                               name="rollup_scope_id_bucket"),
+                    IndexModel([("scope", ASCENDING), ("seller_id", ASCENDING), ("bucket", DESCENDING)],
+                               name="rollup_scope_seller_bucket", sparse=True),
+                ])
+            await self.db.analytics_events.create_indexes([
+                IndexModel([("timestamp", ASCENDING)], name="analytics_events_timestamp")
+            ])
+        except Exception as e:
+            logger.warning(f"Could not create analytics rollup indexes: {e}")
+
+    def register_jobs(self, scheduler):
+        scheduler.register_periodic("analytics.rollup", self._scheduled_rollup, every(self.interval_seconds),
+                                    run_on_start=True)
+
+    async def _scheduled_rollup(self):
+        """Roll up new events; the first run in a process also rebuilds days stored without viewer sketches"""
+        rebuild_since = None
+        if not self._checked_sketches:
+            rebuild_since = await self._oldest_unsketched_day()
+            self._checked_sketches = True
+        await self.run_rollup(rebuild_since=rebuild_since)
+
+    async def _oldest_unsketched_day(self) -> Optional[datetime]:
+        """First daily row stored before viewer sketches existed, so it can be rebuilt"""
+        try:
+            row = await self.db[DAILY_COLLECTION].find_one(
+                {"viewers_hll": {"$exists": False}}, {"bucket": 1}, sort=[("bucket", ASCENDING)]
+            )
+            return _as_utc(row["bucket"]) if row else None
+        except Exception as e:
+            logger.warning(f"Could not check rollups for missing sketches: {e}")
+            return None
+
+    async def get_watermark(self) -> Optional[datetime]:
+        state = await self.db[STATE_COLLECTION].find_one({"_id": "events"})
+        return _as_utc(state["watermark"]) if state and state.get("watermark") else None
+
+    async def run_rollup(self, now: Optional[datetime] = None,
+                         rebuild_since: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Fold events up to ``now - SETTLE_DELAY`` into the rollup collections.
+
+        Every UTC day between the stored watermark and the new one is
+        recomputed from its own raw events, so each run costs O(events in the
+        touched days) regardless of the reporting window dashboards ask for.
+        ``rebuild_since`` moves the starting point back, e.g. to backfill
+        rows written before a rollup field existed.
+        """
+        async with self._lock:
+            end = _as_utc(now or datetime.now(timezone.utc)) - SETTLE_DELAY
+            watermark = await self.get_watermark()
+            if rebuild_since is not None:
+                watermark = min(watermark, _as_utc(rebuild_since)) if watermark else _as_utc(rebuild_since)
+            if watermark is None:
+                first = await self.db.analytics_events.find_one(
+                    {"timestamp": {"$ne": None}}, {"timestamp": 1}, sort=[("timestamp", ASCENDING)]
+                )
+                if not first:
+                    return {"days": 0, "watermark": None}
+                watermark = _as_utc(first["timestamp"])
+
+            day = floor_day(watermark)
+            days = 0
+            while day < end:
+                await self._rollup_day(day, min(day + timedelta(days=1), end))
+                day += timedelta(days=1)
+                days += 1
+
+            await self.db[STATE_COLLECTION].update_one(
+                {"_id": "events"},
+                {"$set": {"watermark": end, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+            logger.info(f"Analytics rollup processed {days} day(s) through {end.isoformat()}")
+            return {"days": days, "watermark": end}
+
+    async def _rollup_day(self, day_start: datetime, window_end: datetime):
+        pipeline = [
+            {"$match": {"timestamp": {"$gte": day_start, "$lt": window_end}}},
+            {"$group": {
+                "_id": {
+                    "hour": {"$hour": "$timestamp"},
+                    "event_type": "$event_type",
+                    "listing_id": "$listing_id",
+                    "seller_id": "$seller_id"
+                },
+                "count": {"$sum": 1},
+                # Bounded: one listing's viewers within a single hour
+                "viewers": {"$addToSet": {"$ifNull": ["$user_id", "$session_id"]}},
+                "last_event_at": {"$max": "$timestamp"}
+            }}
+        ]
+        rows = await self.db.analytics_events.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+        listing_ids = list({row["_id"].get("listing_id") for row in rows if row["_id"].get("listing_id")})
+        sellers_by_listing = {}
+        if listing_ids:
+            async for listing in self.db.listings.find({"id": {"$in": listing_ids}}, {"_id": 0, "id": 1, "seller_id": 1}):
+                sellers_by_listing[listing["id"]] = listing.get("seller_id")
+
+        hourly: Dict[Tuple[str, str, int], _Bucket] = {}
+        daily: Dict[Tuple[str, str], _Bucket] = {}
+
+        def accumulate(scope: str, scope_id: str, hour: int, row, seller_id: Optional[str] = None):
+            for bucket in (hourly.setdefault((scope, scope_id, hour), _Bucket()),
+                           daily.setdefault((scope, scope_id), _Bucket())):
+                bucket.add(row["_id"].get("event_type"), row["count"], row["viewers"], _as_utc(row["last_event_at"]))
+                if seller_id:
+                    bucket.seller_id = seller_id
+
+        for row in rows:
+            key = row["_id"]
+            hour = key["hour"]
+            listing_id = key.get("listing_id")
+            seller_id = key.get("seller_id") or sellers_by_listing.get(listing_id)
+
+            accumulate("platform", PLATFORM_ID, hour, row)
+            if listing_id:
+                accumulate("listing", listing_id, hour, row, seller_id=seller_id)
+            if seller_id:
+                accumulate("seller", seller_id, hour, row)
+
+        hourly_docs = [
+            bucket.to_document(scope, scope_id, day_start + timedelta(hours=hour), "hour")
+            for (scope, scope_id, hour), bucket in hourly.items()
+        ]
+        daily_docs = [
+            bucket.to_document(scope, scope_id, day_start, "day")
+            for (scope, scope_id), bucket in daily.items()
+        ]
+        await self._replace_all(HOURLY_COLLECTION, hourly_docs)
+        await self._replace_all(DAILY_COLLECTION, daily_docs)
+
+    async def _replace_all(self, collection: str, docs: List[Dict[str, Any]]):
+        for i in range(0, len(docs), WRITE_BATCH_SIZE):
+            operations = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs[i:i + WRITE_BATCH_SIZE]]
+            await self.db[collection].bulk_write(operations, ordered=False)
+
+    async def daily_rows(self, scope: str, since: datetime, scope_id: Optional[str] = None,
+                         seller_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Daily rollup documents for a scope from ``since`` (inclusive day) onwards"""
+        query: Dict[str, Any] = {"scope": scope, "bucket": {"$gte": floor_day(since)}}
+        if scope_id:
+            query["scope_id"] = scope_id
+        if seller_id:
+            query["seller_id"] = seller_id
+        return await self.db[DAILY_COLLECTION].find(
+            query, {"_id": 0, "viewers_hll": 0}
+        ).sort("bucket", ASCENDING).to_list(length=None)
+
+    async def unique_viewers(self, scope: str, since: datetime, scope_ids: Iterable[str]) -> Dict[str, int]:
+        """
+        Unique viewers per scope id over the window, merged from the daily
+        HyperLogLog sketches (~1% error, a few KB read per day and id)
+        """
+        ids = list(scope_ids)
+        sketches: Dict[str, HyperLogLog] = {scope_id: HyperLogLog() for scope_id in ids}
+        cursor = self.db[DAILY_COLLECTION].find(
+            {"scope": scope, "scope_id": {"$in": ids}, "bucket": {"$gte": floor_day(since)}},
+            {"_id": 0, "scope_id": 1, "viewers_hll": 1}
+        )
+        async for row in cursor:
+            if row.get("viewers_hll"):
+                sketches[row["scope_id"]].merge(HyperLogLog.from_bytes(row["viewers_hll"]))
+        return {scope_id: sketch.count() for scope_id, sketch in sketches.items()}
+
+    async def top_listings(self, since: datetime, limit: int = 20, seller_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Listings ordered by views in the window, summed over daily rollups"""
+        match: Dict[str, Any] = {"scope": "listing", "bucket": {"$gte": floor_day(since)}}
+        if seller_id:
+            match["seller_id"] = seller_id
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": "$scope_id",
+                "views": {"$sum": "$views"},
+                "cart_adds": {"$sum": "$cart_adds"},
+                "last_viewed": {"$max": "$last_event_at"}
+            }},
+            {"$match": {"views": {"$gt": 0}}},
+            {"$sort": {"views": -1}},
+            {"$limit": limit},
+            {"$project": {
+                "_id": 0,
+                "listing_id": "$_id",
+                "views": 1,
+                "cart_adds": 1,
+                "last_viewed": 1
+            }}
+        ]
+        top = await self.db[DAILY_COLLECTION].aggregate(pipeline).to_list(length=limit)
+
+        uniques = await self.unique_viewers("listing", since, [row["listing_id"] for row in top])
+        for row in top:
+            row["unique_viewers"] = uniques.get(row["listing_id"], 0)
+        return top
@@ -8,12 +8,41 @@ from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Optional
 import uuid
 from pymongo.errors import PyMongoError
+from services.analytics_rollup_service import AnalyticsRollupService, PLATFORM_ID
 
 logger = logging.getLogger(__name__)
 
 class AnalyticsService:
-    def __init__(self, db):
+    def __init__(self, db, event_buffer=None, rollup_service=None):
         self.db = db
+        # Optional AnalyticsEventBuffer; when set, tracking writes are batched
+        self.event_buffer = event_buffer
+        # Dashboards read pre-aggregated rollups instead of raw events
+        self.rollups = rollup_service or AnalyticsRollupService(db)
+    
+    async def _record_event(self, event: Dict, counter: Optional[tuple] = None):
+        """
+        Persist an event and bump its counter (collection, id, field, last-seen field),
+        through the write-behind buffer when one is configured
+        """
+        now = event["timestamp"]
+        if self.event_buffer:
+            self.event_buffer.enqueue(event)
+            if counter:
+                collection, document_id, field, last_field = counter
+                self.event_buffer.increment(collection, document_id, field, set_fields={last_field: now})
+            return
+        
+        await self.db.analytics_events.insert_one(event)
+        if counter:
+            collection, document_id, field, last_field = counter
+            await self.db[collection].update_one(
+                {"id": document_id},
+                {
+                    "$inc": {field: 1},
+                    "$set": {last_field: now}
+                }
+            )
         
     async def track_pdp_view(self, listing_id: str, user_id: Optional[str] = None, 
                            ip_address: str = None, user_agent: str = None,
@@ -36,18 +65,10 @@ class AnalyticsService:
                 }
             }
             
-            await self.db.analytics_events.insert_one(view_event)
-            
-            # Update listing view count
-            await self.db.listings.update_one(
-                {"id": listing_id},
-                {
-                    "$inc": {"view_count": 1},
-                    "$set": {"last_viewed_at": datetime.now(timezone.utc)}
-                }
-            )
+            # Store event and update listing view count
+            await self._record_event(view_event, ("listings", listing_id, "view_count", "last_viewed_at"))
             
-            logger.info(f"Tracked PDP view for listing {listing_id}")
+            logger.debug(f"Tracked PDP view for listing {listing_id}")
             return True
             
         except Exception as e:
@@ -67,15 +88,9 @@ class AnalyticsService:
                 "timestamp": datetime.now(timezone.utc)
             }
             
-            await self.db.analytics_events.insert_one(view_event)
-            
-            # Update seller profile view count
-            await self.db.users.update_one(
-                {"id": seller_id},
-                {
-                    "$inc": {"profile_view_count": 1},
-                    "$set": {"last_profile_viewed_at": datetime.now(timezone.utc)}
-                }
+            # Store event and update seller profile view count
+            await self._record_event(
+                view_event, ("users", seller_id, "profile_view_count", "last_profile_viewed_at")
             )
             
             return True
@@ -96,79 +111,55 @@ class AnalyticsService:
                 "metadata": metadata or {}
             }
             
-            await self.db.analytics_events.insert_one(interaction_event)
+            await self._record_event(interaction_event)
             return True
         except Exception as e:
             logger.error(f"Error tracking interaction: {e}")
             return False
     
     async def get_pdp_analytics(self, days: int = 30) -> Dict:
-        """Get PDP analytics for admin dashboard"""
+        """Get PDP analytics for admin dashboard (read from daily rollups)"""
         try:
             start_date = datetime.now(timezone.utc) - timedelta(days=days)
             
             # PDP Views by listing
-            views_pipeline = [
-                {"$match": {
-                    "event_type": "pdp_view",
-                    "timestamp": {"$gte": start_date}
-                }},
-                {"$group": {
-                    "_id": "$listing_id",
-                    "views": {"$sum": 1},
-                    "unique_users": {"$addToSet": "$user_id"},
-                    "last_viewed": {"$max": "$timestamp"}
-                }},
-                {"$project": {
-                    "listing_id": "$_id",
-                    "views": 1,
-                    "unique_viewers": {"$size": "$unique_users"},
-                    "last_viewed": 1
-                }},
-                {"$sort": {"views": -1}},
-                {"$limit": 20}
-            ]
-            
-            top_listings = await self.db.analytics_events.aggregate(views_pipeline).to_list(length=20)
-            
-            # Get listing details for top viewed listings
+            top_listings = await self.rollups.top_listings(start_date, limit=20)
+            
+            # Get listing details for top viewed listings in one query
+            listing_ids = [listing["listing_id"] for listing in top_listings]
+            listing_docs = {
+                doc["id"]: doc
+                async for doc in self.db.listings.find(
+                    {"id": {"$in": listing_ids}},
+                    {"_id": 0, "id": 1, "title": 1, "price_per_unit": 1, "seller_id": 1}
+                )
+            }
             for listing in top_listings:
-                listing_doc = await self.db.listings.find_one({"id": listing["listing_id"]})
+                listing_doc = listing_docs.get(listing["listing_id"])
                 if listing_doc:
                     listing["title"] = listing_doc.get("title", "Unknown")
                     listing["price"] = float(listing_doc.get("price_per_unit", 0))
                     listing["seller_id"] = listing_doc.get("seller_id")
             
             # Overall metrics
-            total_views = await self.db.analytics_events.count_documents({
-                "event_type": "pdp_view",
-                "timestamp": {"$gte": start_date}
-            })
-            
-            unique_viewers = await self.db.analytics_events.aggregate([
-                {"$match": {
-                    "event_type": "pdp_view",
-                    "timestamp": {"$gte": start_date}
-                }},
-                {"$group": {"_id": "$user_id"}},
-                {"$count": "unique_users"}
-            ]).to_list(length=1)
+            platform_days = await self.rollups.daily_rows("platform", start_date)
+            total_views = sum(day["views"] for day in platform_days)
+            unique_viewers = (await self.rollups.unique_viewers("platform", start_date, [PLATFORM_ID]))[PLATFORM_ID]
             
             # Conversion metrics (views to cart adds)
-            cart_adds = await self.db.analytics_events.count_documents({
-                "event_type": "add_to_cart",
-                "timestamp": {"$gte": start_date}
-            })
+            cart_adds = sum(day["cart_adds"] for day in platform_days)
             
             conversion_rate = (cart_adds / total_views * 100) if total_views > 0 else 0
+            watermark = await self.rollups.get_watermark()
             
             return {
                 "period_days": days,
                 "total_views": total_views,
-                "unique_viewers": unique_viewers[0]["unique_users"] if unique_viewers else 0,
+                "unique_viewers": unique_viewers,
                 "cart_adds": cart_adds,
                 "conversion_rate": round(conversion_rate, 2),
                 "top_listings": top_listings,
+                "data_through": watermark.isoformat() if watermark else None,
                 "generated_at": datetime.now(timezone.utc).isoformat()
             }
             
@@ -182,38 +173,27 @@ class AnalyticsService:
             }
     
     async def get_seller_analytics(self, seller_id: str, days: int = 30) -> Dict:
-        """Get analytics for a specific seller"""
+        """Get analytics for a specific seller (read from daily rollups)"""
         try:
             start_date = datetime.now(timezone.utc) - timedelta(days=days)
             
             # Seller's listing views
-            listing_views = await self.db.analytics_events.aggregate([
-                {"$match": {
-                    "event_type": "pdp_view",
-                    "timestamp": {"$gte": start_date}
-                }},
-                {"$lookup": {
-                    "from": "listings",
-                    "localField": "listing_id",
-                    "foreignField": "id",
-                    "as": "listing"
-                }},
-                {"$unwind": "$listing"},
-                {"$match": {"listing.seller_id": seller_id}},
-                {"$group": {
-                    "_id": "$listing_id",
-                    "views": {"$sum": 1},
-                    "title": {"$first": "$listing.title"}
-                }},
-                {"$sort": {"views": -1}}
-            ]).to_list(length=50)
+            listing_views = await self.rollups.top_listings(start_date, limit=50, seller_id=seller_id)
+            titles = {
+                doc["id"]: doc.get("title")
+                async for doc in self.db.listings.find(
+                    {"id": {"$in": [item["listing_id"] for item in listing_views]}},
+                    {"_id": 0, "id": 1, "title": 1}
+                )
+            }
+            listing_views = [
+                {"_id": item["listing_id"], "views": item["views"], "title": titles.get(item["listing_id"])}
+                for item in listing_views
+            ]
             
             # Profile views
-            profile_views = await self.db.analytics_events.count_documents({
-                "event_type": "seller_profile_view",
-                "seller_id": seller_id,
-                "timestamp": {"$gte": start_date}
-            })
+            seller_days = await self.rollups.daily_rows("seller", start_date, scope_id=seller_id)
+            profile_views = sum(day["profile_views"] for day in seller_days)
             
             return {
                 "seller_id": seller_id,
@@ -228,45 +208,21 @@ class AnalyticsService:
             return {"error": "Failed to fetch seller analytics"}
     
     async def get_daily_metrics(self, days: int = 7) -> List[Dict]:
-        """Get daily metrics for charts"""
+        """Get daily metrics for charts (read from daily rollups)"""
         try:
             start_date = datetime.now(timezone.utc) - timedelta(days=days)
             
-            daily_pipeline = [
-                {"$match": {
-                    "timestamp": {"$gte": start_date}
-                }},
-                {"$group": {
-                    "_id": {
-                        "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
-                        "event_type": "$event_type"
-                    },
-                    "count": {"$sum": 1}
-                }},
-                {"$group": {
-                    "_id": "$_id.date",
-                    "events": {
-                        "$push": {
-                            "type": "$_id.event_type",
-                            "count": "$count"
-                        }
-                    }
-                }},
-                {"$sort": {"_id": 1}}
-            ]
-            
-            daily_data = await self.db.analytics_events.aggregate(daily_pipeline).to_list(length=days)
+            platform_days = await self.rollups.daily_rows("platform", start_date)
             
             # Format data for charts
             formatted_data = []
-            for day in daily_data:
-                day_data = {"date": day["_id"]}
-                for event in day["events"]:
-                    day_data[event["type"]] = event["count"]
+            for day in platform_days:
+                day_data = {"date": day["bucket"].strftime("%Y-%m-%d")}
+                day_data.update(day.get("event_counts", {}))
                 formatted_data.append(day_data)
             
             return formatted_data
             
         except Exception as e:
             logger.error(f"Error getting daily metrics: {e}")
-            return []
\ No newline at end of file
+            return []
@@ -6,6 +6,8 @@ import statistics
 from collections import defaultdict
 import json
 from bson import ObjectId
+from services.kpi_snapshot_service import KPISnapshotService
+from services.analytics_rollup_service import DAILY_COLLECTION as ANALYTICS_DAILY_COLLECTION
 
 class BusinessIntelligenceService:
     """
@@ -19,10 +21,12 @@ class BusinessIntelligenceService:
     - Market intelligence
     """
     
-    def __init__(self, db):
+    def __init__(self, db, kpi_snapshots: Optional[KPISnapshotService] = None):
         self.db = db
         self.cache_ttl = 300  # 5 minutes cache
         self.analytics_cache = {}
+        # Dashboard counts and totals come from materialised daily KPI snapshots
+        self.kpi_snapshots = kpi_snapshots or KPISnapshotService(db)
         
     async def get_platform_overview(self, date_range: int = 30) -> Dict[str, Any]:
         """
@@ -289,66 +293,25 @@ class BusinessIntelligenceService:
     
     # Helper Methods for Data Collection
     async def _get_user_metrics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
-        """Collect user-related metrics"""
+        """Collect user-related metrics from KPI snapshots"""
         try:
+            days = await self.kpi_snapshots.get_days(start_date, end_date)
+            gauges = await self.kpi_snapshots.get_gauges()
+            
             # User registration metrics
-            new_users = await self.db.users.count_documents({
-                'created_at': {'$gte': start_date, '$lte': end_date}
-            })
-            
-            total_users = await self.db.users.count_documents({})
-            
-            # Active users metrics
-            active_users = await self.db.users.count_documents({
-                'last_login': {'$gte': start_date}
-            })
-            
-            # User role distribution
-            role_distribution = await self.db.users.aggregate([
-                {'$unwind': '$roles'},
-                {'$group': {'_id': '$roles', 'count': {'$sum': 1}}},
-                {'$sort': {'count': -1}}
-            ]).to_list(10)
-            
-            # User engagement scores
-            engagement_pipeline = [
-                {
-                    '$match': {
-                        'last_login': {'$gte': start_date}
-                    }
-                },
-                {
-                    '$addFields': {
-                        'engagement_score': {
-                            '$add': [
-                                {'$cond': [{'$gte': ['$last_login', start_date]}, 20, 0]},
-                                {'$multiply': [{'$size': {'$ifNull': ['$created_listings', []]}}, 10]},
-                                {'$multiply': [{'$size': {'$ifNull': ['$purchases', []]}}, 15]}
-                            ]
-                        }
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': None,
-                        'avg_engagement': {'$avg': '$engagement_score'},
-                        'high_engagement_users': {
-                            '$sum': {'$cond': [{'$gte': ['$engagement_score', 50]}, 1, 0]}
-                        }
-                    }
-                }
-            ]
+            new_users = self.kpi_snapshots.sum_days(days, 'new_users')
+            total_users = gauges.get('total_users', 0)
             
-            engagement_result = await self.db.users.aggregate(engagement_pipeline).to_list(1)
-            engagement_data = engagement_result[0] if engagement_result else {}
+            # Active users metrics (smallest snapshot window covering the range)
+            active_users = self.kpi_snapshots.active_users_for(gauges, (end_date - start_date).days)
             
             return {
                 'new_users': new_users,
                 'total_users': total_users,
                 'active_users': active_users,
                 'activation_rate': (active_users / total_users * 100) if total_users > 0 else 0,
-                'role_distribution': role_distribution,
-                'engagement': engagement_data
+                'role_distribution': gauges.get('role_distribution', []),
+                'engagement': gauges.get('engagement', {})
             }
             
         except Exception as e:
@@ -356,49 +319,24 @@ class BusinessIntelligenceService:
             return {}
     
     async def _get_listing_metrics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
-        """Collect listing-related metrics"""
+        """Collect listing-related metrics from KPI snapshots"""
         try:
-            # New listings
-            new_listings = await self.db.listings.count_documents({
-                'created_at': {'$gte': start_date, '$lte': end_date}
-            })
-            
-            # Active listings
-            active_listings = await self.db.listings.count_documents({
-                'status': 'active'
-            })
-            
-            # Listings by species
-            species_distribution = await self.db.listings.aggregate([
-                {'$match': {'status': 'active'}},
-                {'$group': {'_id': '$species_name', 'count': {'$sum': 1}}},
-                {'$sort': {'count': -1}}
-            ]).to_list(10)
+            days = await self.kpi_snapshots.get_days(start_date, end_date)
+            gauges = await self.kpi_snapshots.get_gauges()
             
-            # Average listing performance
-            performance_pipeline = [
-                {
-                    '$match': {
-                        'created_at': {'$gte': start_date, '$lte': end_date}
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': None,
-                        'avg_price': {'$avg': '$price_per_unit'},
-                        'avg_quantity': {'$avg': '$quantity'},
-                        'total_value': {'$sum': {'$multiply': ['$price_per_unit', '$quantity']}}
-                    }
-                }
-            ]
+            new_listings = self.kpi_snapshots.sum_days(days, 'new_listings')
             
-            performance_result = await self.db.listings.aggregate(performance_pipeline).to_list(1)
-            performance_data = performance_result[0] if performance_result else {}
+            # Average listing performance
+            performance_data = {
+                'avg_price': self.kpi_snapshots.sum_days(days, 'listing_price_sum') / new_listings if new_listings else None,
+                'avg_quantity': self.kpi_snapshots.sum_days(days, 'listing_quantity_sum') / new_listings if new_listings else None,
+                'total_value': self.kpi_snapshots.sum_days(days, 'listing_value_sum')
+            }
             
             return {
                 'new_listings': new_listings,
-                'active_listings': active_listings,
-                'species_distribution': species_distribution,
+                'active_listings': gauges.get('active_listings', 0),
+                'species_distribution': gauges.get('species_distribution', []),
                 'performance': performance_data,
                 'listing_rate': new_listings / max((end_date - start_date).days, 1)
             }
@@ -408,70 +346,53 @@ class BusinessIntelligenceService:
             return {}
     
     async def _get_transaction_metrics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
-        """Collect transaction and revenue metrics"""
+        """Collect transaction and revenue metrics (live, since they depend on order status)"""
         try:
-            # Transaction volume
-            transaction_pipeline = [
-                {
-                    '$match': {
-                        'created_at': {'$gte': start_date, '$lte': end_date},
-                        'status': {'$in': ['completed', 'paid']}
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': None,
-                        'total_transactions': {'$sum': 1},
-                        'total_revenue': {'$sum': '$total_amount'},
-                        'avg_transaction_value': {'$avg': '$total_amount'},
-                        'total_platform_fees': {'$sum': '$platform_fee'}
-                    }
-                }
-            ]
+            days = await self.kpi_snapshots.get_transaction_days(start_date, end_date)
             
-            transaction_result = await self.db.orders.aggregate(transaction_pipeline).to_list(1)
-            transaction_data = transaction_result[0] if transaction_result else {
-                'total_transactions': 0,
-                'total_revenue': 0,
-                'avg_transaction_value': 0,
-                'total_platform_fees': 0
+            # Transaction volume
+            total_transactions = self.kpi_snapshots.sum_days(days, 'transactions')
+            total_revenue = self.kpi_snapshots.sum_days(days, 'revenue')
+            transaction_data = {
+                'total_transactions': total_transactions,
+                'total_revenue': total_revenue,
+                'avg_transaction_value': total_revenue / total_transactions if total_transactions else 0,
+                'total_platform_fees': self.kpi_snapshots.sum_days(days, 'platform_fees')
             }
             
             # Daily transaction trend
-            daily_trend_pipeline = [
+            daily_trend = [
                 {
-                    '$match': {
-                        'created_at': {'$gte': start_date, '$lte': end_date},
-                        'status': {'$in': ['completed', 'paid']}
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': {
-                            '$dateToString': {
-                                'format': '%Y-%m-%d',
-                                'date': '$created_at'
-                            }
-                        },
-                        'daily_revenue': {'$sum': '$total_amount'},
-                        'daily_transactions': {'$sum': 1}
-                    }
-                },
-                {'$sort': {'_id': 1}}
+                    '_id': day['date'].strftime('%Y-%m-%d'),
+                    'daily_revenue': day.get('revenue', 0),
+                    'daily_transactions': day.get('transactions', 0)
+                }
+                for day in days
             ]
             
-            daily_trend = await self.db.orders.aggregate(daily_trend_pipeline).to_list(100)
-            
             return {
                 'summary': transaction_data,
                 'daily_trend': daily_trend,
-                'conversion_rate': await self._calculate_conversion_rate(start_date, end_date)
+                'conversion_rate': await self._calculate_conversion_rate(start_date, end_date, total_transactions)
             }
             
         except Exception as e:
             print(f"Error collecting transaction metrics: {str(e)}")
             return {}
     
+    async def _calculate_conversion_rate(self, start_date: datetime, end_date: datetime, transactions: float) -> float:
+        """Transactions per 100 listing views, using the daily analytics rollups"""
+        try:
+            rows = await self.db[ANALYTICS_DAILY_COLLECTION].find(
+                {'scope': 'platform', 'bucket': {'$gte': start_date, '$lte': end_date}},
+                {'_id': 0, 'views': 1}
+            ).to_list(None)
+            views = sum(row.get('views', 0) for row in rows)
+            return (transactions / views * 100) if views > 0 else 0
+        except Exception as e:
+            print(f"Error calculating conversion rate: {str(e)}")
+            return 0
+    
     async def _calculate_platform_kpis(self, user_metrics: Dict, listing_metrics: Dict, 
                                      transaction_metrics: Dict, engagement_metrics: Dict) -> Dict[str, Any]:
         """Calculate key performance indicators"""
@@ -1127,54 +1048,37 @@ class BusinessIntelligenceService:
             return {}
     
     async def _get_active_users_count(self) -> int:
-        """Get current active users count"""
+        """Get current active users count (last 24 hours, from the KPI gauges)"""
         try:
-            # Users active in last 24 hours
-            yesterday = datetime.utcnow() - timedelta(days=1)
-            count = await self.db.users.count_documents({
-                'last_login': {'$gte': yesterday}
-            })
-            return count
+            gauges = await self.kpi_snapshots.get_gauges()
+            return self.kpi_snapshots.active_users_for(gauges, 1)
         except Exception as e:
             print(f"Error getting active users: {str(e)}")
             return 0
     
     async def _get_active_listings_count(self) -> int:
-        """Get current active listings count"""
+        """Get current active listings count (from the KPI gauges)"""
         try:
-            count = await self.db.listings.count_documents({
-                'status': 'active'
-            })
-            return count
+            gauges = await self.kpi_snapshots.get_gauges()
+            return gauges.get('active_listings', 0)
         except Exception as e:
             print(f"Error getting active listings: {str(e)}")
             return 0
     
     async def _get_todays_transactions(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
-        """Get today's transaction metrics"""
+        """Get today's completed/paid transactions (live) and the "today so far" counters"""
         try:
-            pipeline = [
-                {
-                    '$match': {
-                        'created_at': {'$gte': start_date, '$lte': end_date},
-                        'status': {'$in': ['completed', 'paid']}
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': None,
-                        'transaction_count': {'$sum': 1},
-                        'total_value': {'$sum': '$total_amount'},
-                        'avg_value': {'$avg': '$total_amount'}
-                    }
-                }
-            ]
-            
-            result = await self.db.orders.aggregate(pipeline).to_list(1)
-            return result[0] if result else {
-                'transaction_count': 0,
-                'total_value': 0,
-                'avg_value': 0
+            today = await self.kpi_snapshots.get_today()
+            paid = await self.kpi_snapshots.get_transaction_days(start_date, end_date)
+            count = self.kpi_snapshots.sum_days(paid, 'transactions')
+            total_value = self.kpi_snapshots.sum_days(paid, 'revenue')
+            return {
+                'transaction_count': count,
+                'total_value': total_value,
+                'avg_value': total_value / count if count else 0,
+                'orders_created': today.get('orders_created', 0),
+                'new_users': today.get('new_users', 0),
+                'new_listings': today.get('new_listings', 0)
             }
         except Exception as e:
             print(f"Error getting today's transactions: {str(e)}")
@@ -1227,4 +1131,49 @@ class BusinessIntelligenceService:
             }
         except Exception as e:
             print(f"Error getting performance metrics: {str(e)}")
-            return {}
\ No newline at end of file
+            return {}
+    
+    # Custom report sections (read from KPI snapshots; platform-wide, filters are not applied)
+    async def _get_revenue_analysis(self, start_date: datetime, end_date: datetime, filters: Dict) -> Dict[str, Any]:
+        transaction_metrics = await self._get_transaction_metrics(start_date, end_date)
+        return {
+            'summary': transaction_metrics.get('summary', {}),
+            'daily_trend': transaction_metrics.get('daily_trend', [])
+        }
+    
+    async def _get_user_growth_analysis(self, start_date: datetime, end_date: datetime, filters: Dict) -> Dict[str, Any]:
+        days = await self.kpi_snapshots.get_days(start_date, end_date)
+        return {
+            'new_users': self.kpi_snapshots.sum_days(days, 'new_users'),
+            'daily_signups': [
+                {'date': day['date'].strftime('%Y-%m-%d'), 'new_users': day.get('new_users', 0)}
+                for day in days
+            ]
+        }
+    
+    async def _get_listing_performance_analysis(self, start_date: datetime, end_date: datetime, filters: Dict) -> Dict[str, Any]:
+        return await self._get_listing_metrics(start_date, end_date)
+    
+    async def _get_geographic_analysis(self, start_date: datetime, end_date: datetime, filters: Dict) -> Dict[str, Any]:
+        gauges = await self.kpi_snapshots.get_gauges()
+        return {'active_listings_by_region': gauges.get('region_distribution', [])}
+    
+    async def _get_species_analysis(self, start_date: datetime, end_date: datetime, filters: Dict) -> Dict[str, Any]:
+        gauges = await self.kpi_snapshots.get_gauges()
+        return {'active_listings_by_species': gauges.get('species_distribution', [])}
+    
+    async def _generate_report_insights(self, report_data: Dict[str, Any], report_config: Dict[str, Any]) -> List[str]:
+        """Short textual highlights for a custom report"""
+        insights = []
+        revenue = report_data.get('revenue', {}).get('summary', {})
+        if revenue:
+            insights.append(
+                f"{revenue.get('total_transactions', 0)} transactions totalling R{revenue.get('total_revenue', 0):,.2f}"
+            )
+        user_growth = report_data.get('user_growth')
+        if user_growth:
+            insights.append(f"{user_growth.get('new_users', 0)} new users in the period")
+        listings = report_data.get('listings')
+        if listings:
+            insights.append(f"{listings.get('new_listings', 0)} new listings, {listings.get('active_listings', 0)} active")
+        return insights
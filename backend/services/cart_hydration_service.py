@@ -0,0 +1,153 @@
+"""
+Cart hydration for the shopping cart and checkout.
+
+Loads every listing referenced by a cart with one ``$in`` query, projected to
+the fields the cart and checkout actually use, and keeps the hydrated cart per
+user for a short TTL. Cart writes invalidate the user's entry; listing
+price/stock/status changes invalidate every cached cart holding that listing.
+"""
+import os
+import logging
+from typing import Any, Dict, Iterable, Set
+
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Listing fields needed by the cart UI, checkout session creation and the quote
+CART_LISTING_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "title": 1,
+    "status": 1,
+    "seller_id": 1,
+    "org_id": 1,
+    "seller_name": 1,
+    "user_name": 1,
+    "price_per_unit": 1,
+    "price": 1,
+    "unit": 1,
+    "quantity": 1,
+    "species": 1,
+    "species_id": 1,
+    "product_type": 1,
+    "product_type_id": 1,
+    "location": 1,
+    "images": {"$slice": 1},
+    "media": {"$slice": 1},
+    "standard_shipping_cost": 1,
+    "express_shipping_cost": 1,
+}
+
+
+class CartHydrationService:
+    def __init__(self, db, ttl_seconds: float = None, max_entries: int = 5000):
+        self.db = db
+        ttl = ttl_seconds if ttl_seconds is not None else float(os.getenv("CART_CACHE_TTL_SECONDS", "30"))
+        self._cache = TTLCache(ttl_seconds=ttl, max_entries=max_entries)
+        # listing_id -> user ids whose cached cart contains the listing; pruned back to carts
+        # still cached whenever it doubles (carts hold several listings, so it can outgrow the cache)
+        self._users_by_listing: Dict[str, Set[str]] = {}
+        self._indexed = 0
+        self._prune_at = 2 * max_entries
+
+    async def load_listings(self, listing_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch the cart projection of all given listings in one query, keyed by id"""
+        ids = list({listing_id for listing_id in listing_ids if listing_id})
+        if not ids:
+            return {}
+        listings = await self.db.listings.find(
+            {"id": {"$in": ids}}, CART_LISTING_PROJECTION
+        ).to_list(length=len(ids))
+        return {listing["id"]: listing for listing in listings}
+
+    async def get_cart(self, user_id: str, use_cache: bool = True) -> Dict[str, Any]:
+        """Hydrated cart (items, totals, raw cart_items and listings by id); ``use_cache=False`` reads it fresh"""
+        if use_cache:
+            cached = self._cache.get(user_id)
+            if cached is not None:
+                return cached
+
+        cart = await self.db.carts.find_one({"user_id": user_id}, {"_id": 0})
+        cart_items = cart.get("items", []) if cart else []
+        listings = await self.load_listings(item["listing_id"] for item in cart_items)
+
+        items = []
+        total = 0
+        for item in cart_items:
+            listing = listings.get(item["listing_id"])
+            if not listing:
+                continue
+            item_total = item["quantity"] * item["price"]
+            items.append({
+                "id": item["id"],
+                "listing": listing,
+                "quantity": item["quantity"],
+                "price": item["price"],
+                "item_total": item_total,
+                "shipping_cost": item.get("shipping_cost", 0)
+            })
+            total += item_total + item.get("shipping_cost", 0)
+
+        hydrated = {
+            "cart_items": cart_items,
+            "items": items,
+            "total": total,
+            "item_count": len(items),
+            "listings": listings
+        }
+        self._store(user_id, hydrated)
+        return hydrated
+
+    def invalidate_user(self, user_id: str):
+        self._cache.invalidate(user_id)
+
+    def invalidate_listing(self, listing_id: str):
+        """Drop cached carts holding a listing whose price, stock or status changed"""
+        user_ids = self._users_by_listing.pop(listing_id, set())
+        self._indexed -= len(user_ids)
+        for user_id in user_ids:
+            self._cache.invalidate(user_id)
+
+    def invalidate_listings(self, listing_ids: Iterable[str]):
+        for listing_id in listing_ids:
+            self.invalidate_listing(listing_id)
+
+    def clear(self):
+        self._cache.clear()
+        self._users_by_listing.clear()
+        self._indexed = 0
+        self._prune_at = 2 * self._cache.max_entries
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return self._cache.get_metrics()
+
+    def _store(self, user_id: str, hydrated: Dict[str, Any]):
+        self._cache.set(user_id, hydrated)
+        for listing_id in hydrated["listings"]:
+            user_ids = self._users_by_listing.setdefault(listing_id, set())
+            if user_id not in user_ids:
+                user_ids.add(user_id)
+                self._indexed += 1
+        if self._indexed > self._prune_at:
+            self._prune_index()
+
+    def _prune_index(self):
+        """Forget carts that expired, were evicted or invalidated since they were indexed"""
+        pruned: Dict[str, Set[str]] = {}
+        for listing_id, user_ids in self._users_by_listing.items():
+            cached = {user_id for user_id in user_ids if user_id in self._cache}
+            if cached:
+                pruned[listing_id] = cached
+        self._users_by_listing = pruned
+        self._indexed = sum(len(user_ids) for user_ids in pruned.values())
+        self._prune_at = max(2 * self._cache.max_entries, 2 * self._indexed)
+
+
+def cart_response(hydrated: Dict[str, Any]) -> Dict[str, Any]:
+    """Public /cart response shape for a hydrated cart"""
+    return {
+        "items": hydrated["items"],
+        "total": hydrated["total"],
+        "item_count": hydrated["item_count"]
+    }
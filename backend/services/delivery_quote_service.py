@@ -0,0 +1,117 @@
+"""
+Delivery quotes for one or many sellers against a single ship-to point.
+
+Every seller's active ``seller_delivery_rates`` document and location are
+loaded with one ``$in`` query each, and all seller-to-buyer distances are
+computed in one vectorised pass, so a checkout with N sellers costs two
+queries instead of 2N. Fees follow the seller's rate card: a base fee plus a
+per-km fee for the distance beyond ``min_km``, with nothing offered beyond
+``max_km``.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from services.geo import distances_from
+
+logger = logging.getLogger(__name__)
+
+RATE_PROJECTION = {"_id": 0, "seller_id": 1, "base_fee_cents": 1, "per_km_cents": 1, "min_km": 1, "max_km": 1}
+SELLER_PROJECTION = {"_id": 0, "id": 1, "location": 1}
+MAX_DELIVERY_QUOTE_SELLERS = 50
+
+
+def _unavailable(seller_id: str, message: str, distance_km: Optional[float] = None) -> Dict[str, Any]:
+    return {
+        "seller_id": seller_id,
+        "distance_km": distance_km,
+        "delivery_fee_cents": None,
+        "out_of_range": True,
+        "base_fee_cents": 0,
+        "per_km_fee_cents": 0,
+        "message": message
+    }
+
+
+def price_delivery(seller_id: str, rate: Dict[str, Any], distance_km: float) -> Dict[str, Any]:
+    """Apply a seller's rate card to a distance"""
+    max_km = rate.get("max_km")
+    if max_km and distance_km > max_km:
+        return _unavailable(seller_id, f"Delivery not available beyond {max_km}km", distance_km)
+
+    base_fee = rate.get("base_fee_cents", 0)
+    per_km_rate = rate.get("per_km_cents", 0)
+    min_km = rate.get("min_km", 0)
+
+    # Only the distance beyond min_km is charged per km
+    chargeable_km = max(0, distance_km - min_km)
+    per_km_fee = int(chargeable_km * per_km_rate)
+
+    return {
+        "seller_id": seller_id,
+        "distance_km": distance_km,
+        "delivery_fee_cents": base_fee + per_km_fee,
+        "out_of_range": False,
+        "base_fee_cents": base_fee,
+        "per_km_fee_cents": per_km_fee,
+        "message": f"Delivery available: {distance_km:.1f}km from seller"
+    }
+
+
+class DeliveryQuoteService:
+    def __init__(self, db):
+        self.db = db
+
+    async def quote_sellers(
+        self,
+        seller_ids: Iterable[str],
+        buyer_lat: float,
+        buyer_lng: float
+    ) -> Dict[str, Dict[str, Any]]:
+        """Delivery quote per seller id (``DeliveryQuote`` fields), in two queries"""
+        ids = list(dict.fromkeys(seller_id for seller_id in seller_ids if seller_id))
+        if not ids:
+            return {}
+
+        rates = await self.db.seller_delivery_rates.find(
+            {"seller_id": {"$in": ids}, "is_active": True}, RATE_PROJECTION
+        ).to_list(length=None)
+        rates_by_seller = {}
+        for rate in rates:
+            rates_by_seller.setdefault(rate["seller_id"], rate)
+
+        sellers_by_id = {}
+        if rates_by_seller:
+            sellers = await self.db.users.find(
+                {"id": {"$in": list(rates_by_seller)}}, SELLER_PROJECTION
+            ).to_list(length=len(rates_by_seller))
+            sellers_by_id = {seller["id"]: seller for seller in sellers}
+
+        quotes: Dict[str, Dict[str, Any]] = {}
+        located: List[str] = []
+        lats: List[float] = []
+        lngs: List[float] = []
+
+        for seller_id in ids:
+            if seller_id not in rates_by_seller:
+                quotes[seller_id] = _unavailable(seller_id, "Seller has not configured delivery rates")
+                continue
+
+            location = (sellers_by_id.get(seller_id) or {}).get("location")
+            if not location:
+                quotes[seller_id] = _unavailable(seller_id, "Seller location not available")
+                continue
+
+            if location.get("lat") is None or location.get("lng") is None:
+                quotes[seller_id] = _unavailable(seller_id, "Seller coordinates not available")
+                continue
+
+            located.append(seller_id)
+            lats.append(location["lat"])
+            lngs.append(location["lng"])
+
+        if located:
+            distances = distances_from(buyer_lat, buyer_lng, lats, lngs).tolist()
+            for seller_id, distance_km in zip(located, distances):
+                quotes[seller_id] = price_delivery(seller_id, rates_by_seller[seller_id], distance_km)
+
+        return {seller_id: quotes[seller_id] for seller_id in ids}
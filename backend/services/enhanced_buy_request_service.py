@@ -13,10 +13,11 @@ from buy_request_service import BuyRequestService, BuyRequestStatus, ModerationS
 logger = logging.getLogger(__name__)
 
 class EnhancedBuyRequestService(BuyRequestService):
-    def __init__(self, db):
+    def __init__(self, db, mapbox_service: MapboxService = None):
         super().__init__(db)
         self.ai_service = AIEnhancedService()
-        self.mapbox_service = MapboxService()
+        # Share the server's instance so geocodes use one HTTP pool and one cache
+        self.mapbox_service = mapbox_service or MapboxService(db)
         
     async def create_enhanced_buy_request(
         self,
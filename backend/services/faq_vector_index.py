@@ -0,0 +1,185 @@
+"""
+In-memory vector index over published FAQ entry embeddings.
+
+Embeddings are held as one contiguous, L2-normalised float32 matrix, so a
+query is a single matrix-vector product followed by an ``argpartition`` top-k
+instead of a cosine-similarity call per entry. Entry metadata (without the
+embeddings) is kept alongside in row order.
+
+The index reloads itself when published FAQ entries change: at most every
+``check_interval_seconds`` it compares a cheap fingerprint of the collection
+(count and latest ``updated_at``/``created_at``) with the one it was built
+from. With ``FAQ_VECTOR_INDEX_PATH`` set the matrix is also written to disk
+and memory-mapped, so workers share the pages and a restart with an unchanged
+fingerprint skips reading embeddings from MongoDB.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PUBLISHED_QUERY = {"status": "published"}
+METADATA_PROJECTION = {"_id": 0, "id": 1, "title": 1, "answer": 1, "category": 1, "keywords": 1}
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class FAQVectorIndex:
+    def __init__(self, db, check_interval_seconds: float = 60, storage_path: Optional[str] = None):
+        self.db = db
+        self.check_interval_seconds = check_interval_seconds
+        self.storage_path = storage_path if storage_path is not None else os.getenv("FAQ_VECTOR_INDEX_PATH")
+
+        self.matrix: Optional[np.ndarray] = None
+        self.entries: List[Dict[str, Any]] = []
+        self.fingerprint: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+        self.counters = {"queries": 0, "refreshes": 0, "skipped_entries": 0}
+        self.last_refresh_ms: Optional[float] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.entries)
+
+    def build(self, entries: List[Dict[str, Any]]):
+        """Build the matrix from entries carrying an ``embedding``; mismatched dimensions are skipped"""
+        dims = None
+        rows, metadata = [], []
+        for entry in entries:
+            embedding = entry.get("embedding")
+            if embedding is None or len(embedding) == 0:
+                continue
+            if dims is None:
+                dims = len(embedding)
+            if len(embedding) != dims:
+                self.counters["skipped_entries"] += 1
+                continue
+            rows.append(embedding)
+            metadata.append({k: v for k, v in entry.items() if k not in ("embedding", "_id")})
+
+        self.matrix = normalize_rows(np.asarray(rows, dtype=np.float32)) if rows else None
+        self.entries = metadata
+
+    def search(self, query_vector, limit: int = 5, min_similarity: float = 0.0) -> List[Dict[str, Any]]:
+        """Top ``limit`` entries by cosine similarity, best first"""
+        self.counters["queries"] += 1
+        if self.matrix is None or limit <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        if query.shape[0] != self.matrix.shape[1]:
+            logger.warning(f"FAQ query has {query.shape[0]} dims, index has {self.matrix.shape[1]}")
+            return []
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        scores = self.matrix @ (query / norm)
+        k = min(limit, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"entry": self.entries[i], "similarity": float(scores[i])}
+            for i in top
+            if scores[i] > min_similarity
+        ]
+
+    async def ensure_fresh(self):
+        """Reload if published entries changed since the index was built (checked at most once per interval)"""
+        if self.fingerprint is not None and time.monotonic() - self._checked_at < self.check_interval_seconds:
+            return
+        async with self._lock:
+            if self.fingerprint is not None and time.monotonic() - self._checked_at < self.check_interval_seconds:
+                return
+            self._checked_at = time.monotonic()
+            fingerprint = await self._fingerprint()
+            if fingerprint == self.fingerprint:
+                return
+            await self.refresh(fingerprint)
+
+    async def refresh(self, fingerprint: Optional[Dict[str, Any]] = None):
+        started = time.perf_counter()
+        fingerprint = fingerprint or await self._fingerprint()
+        if not self._load_from_disk(fingerprint):
+            entries = await self.db.faq_entries.find(
+                PUBLISHED_QUERY, {**METADATA_PROJECTION, "embedding": 1}
+            ).to_list(length=None)
+            self.build(entries)
+            self._save_to_disk(fingerprint)
+        self.fingerprint = fingerprint
+        self.counters["refreshes"] += 1
+        self.last_refresh_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"FAQ vector index refreshed: {self.size} entries in {self.last_refresh_ms}ms")
+
+    async def _fingerprint(self) -> Dict[str, Any]:
+        result = await self.db.faq_entries.aggregate([
+            {"$match": PUBLISHED_QUERY},
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "updated": {"$max": {"$ifNull": ["$updated_at", "$created_at"]}}
+            }}
+        ]).to_list(length=1)
+        if not result:
+            return {"count": 0, "updated": None}
+        updated = result[0].get("updated")
+        return {"count": result[0]["count"], "updated": updated.isoformat() if hasattr(updated, "isoformat") else updated}
+
+    # Disk persistence (optional)
+
+    def _paths(self):
+        return f"{self.storage_path}.npy", f"{self.storage_path}.json"
+
+    def _save_to_disk(self, fingerprint: Dict[str, Any]):
+        if not self.storage_path or self.matrix is None:
+            return
+        matrix_path, meta_path = self._paths()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(matrix_path)), exist_ok=True)
+            np.save(f"{matrix_path}.tmp.npy", self.matrix)
+            os.replace(f"{matrix_path}.tmp.npy", matrix_path)
+            with open(f"{meta_path}.tmp", "w") as f:
+                json.dump({"fingerprint": fingerprint, "entries": self.entries}, f, default=str)
+            os.replace(f"{meta_path}.tmp", meta_path)
+            # Serve from the mapped file so every worker shares the same pages
+            self.matrix = np.load(matrix_path, mmap_mode="r")
+        except Exception as e:
+            logger.warning(f"Could not persist FAQ vector index: {e}")
+
+    def _load_from_disk(self, fingerprint: Dict[str, Any]) -> bool:
+        if not self.storage_path:
+            return False
+        matrix_path, meta_path = self._paths()
+        try:
+            with open(meta_path) as f:
+                stored = json.load(f)
+            if stored.get("fingerprint") != fingerprint:
+                return False
+            self.matrix = np.load(matrix_path, mmap_mode="r")
+            self.entries = stored["entries"]
+            return len(self.entries) == self.matrix.shape[0]
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Could not load FAQ vector index from disk: {e}")
+            return False
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "entries": self.size,
+            "dimensions": int(self.matrix.shape[1]) if self.matrix is not None else None,
+            "memory_mapped": isinstance(self.matrix, np.memmap),
+            "last_refresh_ms": self.last_refresh_ms,
+        }
@@ -4,9 +4,13 @@
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timezone, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
+import os
+import asyncio
 import logging
 import math
 
+import numpy as np
+
 from models_fees import (
     FeeModel, FeeConfig, FeeConfigCreate, CartItem, SellerFeeCalculation,
     CheckoutPreviewResponse, CartTotals, FeeLineItems, FeeTotals, FeeDeductions,
@@ -15,10 +19,18 @@ from models_fees import (
 
 logger = logging.getLogger(__name__)
 
+# system_settings key bumped whenever fee configs change, so every worker reloads its cache
+FEE_CONFIG_VERSION_KEY = "fee_config_version"
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
 class FeeService:
     """Comprehensive fee calculation and management service"""
     
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, config_check_seconds: float = None):
         self.db = db
         
         # Default fee rates (can be overridden by active config)
@@ -28,6 +40,20 @@ class FeeService:
             'buyer_processing_fee_pct': 1.5,
             'escrow_service_fee_minor': 2500  # R25.00
         }
+        
+        # In-memory fee config cache. Active configs are loaded once and rule matches are
+        # memoised per (species, export) until the next effective_from/effective_to boundary;
+        # a background check of the shared version reloads them after changes on any worker.
+        self.config_check_seconds = config_check_seconds or float(os.getenv("FEE_CONFIG_CHECK_SECONDS", "30"))
+        self._active_configs: Optional[List[FeeConfig]] = None
+        self._configs_by_id: Dict[str, FeeConfig] = {}
+        self._resolved: Dict[Tuple[Optional[str], bool], FeeConfig] = {}
+        self._resolved_until: Optional[datetime] = None
+        self._config_version = None
+        self._default_config: Optional[FeeConfig] = None
+        self._load_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.config_cache_stats = {"hits": 0, "misses": 0, "reloads": 0}
     
     # CORE CALCULATION LOGIC
     def calculate_percentage_fee(self, base_amount_minor: int, rate_pct: float) -> int:
@@ -116,6 +142,7 @@ class FeeService:
             
             # Insert into database
             await self.db.fee_configs.insert_one(config.dict())
+            await self._publish_config_change()
             
             logger.info(f"Created fee config: {config.id} ({config.name})")
             return config
@@ -129,43 +156,148 @@ class FeeService:
         species: Optional[str] = None, 
         export: bool = False
     ) -> Optional[FeeConfig]:
-        """Get currently active fee configuration with rule matching"""
+        """Get currently active fee configuration with rule matching (served from the config cache)"""
         try:
-            # Find active config
-            config_doc = await self.db.fee_configs.find_one({
-                "is_active": True,
-                "effective_from": {"$lte": datetime.now(timezone.utc)},
-                "$or": [
-                    {"effective_to": {"$gt": datetime.now(timezone.utc)}},
-                    {"effective_to": None}
-                ]
-            })
-            
-            if not config_doc:
-                logger.warning("No active fee config found, using defaults")
-                return self._create_default_config()
-            
-            config = FeeConfig(**config_doc)
-            
-            # Check if applies_to rules match
-            if config.applies_to:
-                if species and "species" in config.applies_to:
-                    if species not in config.applies_to["species"]:
-                        return self._create_default_config()
-                
-                if "export_only" in config.applies_to:
-                    if config.applies_to["export_only"] and not export:
-                        return self._create_default_config()
-            
-            return config
+            await self._ensure_configs_loaded()
+            return self._cached_fee_config(species, export)
             
         except Exception as e:
             logger.error(f"Error getting active fee config: {e}")
             return self._create_default_config()
     
+    def _cached_fee_config(self, species: Optional[str], export: bool) -> FeeConfig:
+        now = datetime.now(timezone.utc)
+        if self._resolved_until is not None and now >= self._resolved_until:
+            # A config started or stopped being effective since the matches were memoised
+            self._resolved.clear()
+            self._resolved_until = self._next_boundary(now)
+        
+        key = (species, bool(export))
+        config = self._resolved.get(key)
+        if config is not None:
+            self.config_cache_stats["hits"] += 1
+            return config
+        
+        self.config_cache_stats["misses"] += 1
+        config = self._match_config(now, species, export)
+        self._resolved[key] = config
+        return config
+    
+    def _match_config(self, now: datetime, species: Optional[str], export: bool) -> FeeConfig:
+        effective = [
+            config for config in self._active_configs or []
+            if _as_utc(config.effective_from) <= now
+            and (config.effective_to is None or _as_utc(config.effective_to) > now)
+        ]
+        if not effective:
+            logger.warning("No active fee config found, using defaults")
+            return self._create_default_config()
+        
+        config = effective[0]
+        
+        # Check if applies_to rules match
+        if config.applies_to:
+            if species and "species" in config.applies_to:
+                if species not in config.applies_to["species"]:
+                    return self._create_default_config()
+            
+            if "export_only" in config.applies_to:
+                if config.applies_to["export_only"] and not export:
+                    return self._create_default_config()
+        
+        return config
+    
+    def _next_boundary(self, now: datetime) -> Optional[datetime]:
+        boundaries = [
+            _as_utc(moment)
+            for config in self._active_configs or []
+            for moment in (config.effective_from, config.effective_to)
+            if moment is not None and _as_utc(moment) > now
+        ]
+        return min(boundaries) if boundaries else None
+    
+    async def _ensure_configs_loaded(self):
+        if self._active_configs is None:
+            async with self._load_lock:
+                if self._active_configs is None:
+                    await self._load_configs()
+    
+    async def _load_configs(self):
+        """Load active configs and the shared version; drops memoised rule matches"""
+        version_doc = await self.db.system_settings.find_one({"key": FEE_CONFIG_VERSION_KEY}, {"_id": 0, "value": 1})
+        docs = await self.db.fee_configs.find({"is_active": True}).sort("effective_from", -1).to_list(length=None)
+        
+        configs = [FeeConfig(**doc) for doc in docs]
+        self._active_configs = configs
+        self._configs_by_id = {config.id: config for config in configs}
+        self._resolved = {}
+        self._resolved_until = self._next_boundary(datetime.now(timezone.utc))
+        self._config_version = version_doc.get("value") if version_doc else None
+        self.config_cache_stats["reloads"] += 1
+        logger.info(f"Loaded {len(configs)} active fee config(s), version {self._config_version}")
+    
+    async def _publish_config_change(self):
+        """Bump the shared version so other workers reload, and reload this worker now"""
+        await self.db.system_settings.update_one(
+            {"key": FEE_CONFIG_VERSION_KEY},
+            {"$inc": {"value": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        async with self._load_lock:
+            await self._load_configs()
+    
+    async def _check_config_version(self):
+        version_doc = await self.db.system_settings.find_one({"key": FEE_CONFIG_VERSION_KEY}, {"_id": 0, "value": 1})
+        version = version_doc.get("value") if version_doc else None
+        if version != self._config_version or self._active_configs is None:
+            async with self._load_lock:
+                await self._load_configs()
+    
+    def start(self):
+        """Start the per-worker loop that picks up fee config changes made on other workers"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+    
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+    
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self._check_config_version()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Fee config version check failed: {e}")
+            await asyncio.sleep(self.config_check_seconds)
+    
+    async def get_fee_config_by_id(self, config_id: str) -> Optional[FeeConfig]:
+        """Active configs come from the cache; older ones (e.g. an order previewed before a change) from the DB"""
+        config = self._configs_by_id.get(config_id)
+        if config is not None:
+            return config
+        config_doc = await self.db.fee_configs.find_one({"id": config_id})
+        return FeeConfig(**config_doc) if config_doc else None
+    
+    def get_config_cache_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.config_cache_stats,
+            "active_configs": len(self._active_configs or []),
+            "memoised_rules": len(self._resolved),
+            "version": self._config_version,
+        }
+    
     def _create_default_config(self) -> FeeConfig:
-        """Create default fee configuration"""
-        return FeeConfig(
+        """Default fee configuration (one instance per worker, so repeated lookups share it)"""
+        if self._default_config is not None:
+            return self._default_config
+        self._default_config = FeeConfig(
             name="default-fallback",
             platform_commission_pct=self.default_rates['platform_commission_pct'],
             seller_payout_fee_pct=self.default_rates['seller_payout_fee_pct'],
@@ -175,6 +307,7 @@ class FeeService:
             is_active=True,
             effective_from=datetime.now(timezone.utc)
         )
+        return self._default_config
     
     async def activate_fee_config(self, config_id: str) -> bool:
         """Activate a fee configuration (deactivating others)"""
@@ -190,6 +323,7 @@ class FeeService:
                 {"id": config_id},
                 {"$set": {"is_active": True, "updated_at": datetime.now(timezone.utc)}}
             )
+            await self._publish_config_change()
             
             if result.modified_count > 0:
                 logger.info(f"Activated fee config: {config_id}")
@@ -202,55 +336,90 @@ class FeeService:
             logger.error(f"Error activating fee config: {e}")
             return False
     
+    def calculate_cart_fees(
+        self,
+        cart: List[CartItem],
+        configs: List[FeeConfig]
+    ) -> List[SellerFeeCalculation]:
+        """
+        Fees for every seller in a cart at once (``configs[i]`` applies to
+        ``cart[i]``). Items sharing a config are computed as arrays, with the
+        same banker's rounding as ``calculate_seller_order_fees``.
+        """
+        groups: Dict[str, Tuple[FeeConfig, List[int]]] = {}
+        for index, config in enumerate(configs):
+            groups.setdefault(config.id, (config, []))[1].append(index)
+        
+        calculations: List[Optional[SellerFeeCalculation]] = [None] * len(cart)
+        for config, indices in groups.values():
+            merch = np.array([cart[i].merch_subtotal_minor for i in indices], dtype=np.int64)
+            delivery = np.array([cart[i].delivery_minor for i in indices], dtype=np.int64)
+            abattoir = np.array([cart[i].abattoir_minor for i in indices], dtype=np.int64)
+            
+            # np.rint rounds half to even, like round()
+            processing = np.rint(merch * (config.buyer_processing_fee_pct / 100.0)).astype(np.int64)
+            payout_fee = np.rint(merch * (config.seller_payout_fee_pct / 100.0)).astype(np.int64)
+            commission = np.rint(merch * (config.platform_commission_pct / 100.0)).astype(np.int64)
+            zeros = np.zeros_like(merch)
+            if config.model == FeeModel.BUYER_PAYS_COMMISSION:
+                buyer_commission, platform_commission = commission, zeros
+            else:  # SELLER_PAYS
+                buyer_commission, platform_commission = zeros, commission
+            escrow = config.escrow_service_fee_minor
+            
+            buyer_total = merch + delivery + abattoir + processing + escrow + buyer_commission
+            seller_net = merch - platform_commission - payout_fee
+            
+            for row, i in enumerate(indices):
+                calculations[i] = SellerFeeCalculation(
+                    seller_id=cart[i].seller_id,
+                    fee_model=config.model,
+                    lines=FeeLineItems(
+                        merch_subtotal_minor=int(merch[row]),
+                        delivery_minor=int(delivery[row]),
+                        abattoir_minor=int(abattoir[row]),
+                        buyer_processing_fee_minor=int(processing[row]),
+                        escrow_service_fee_minor=escrow,
+                        buyer_commission_minor=int(buyer_commission[row])
+                    ),
+                    totals=FeeTotals(
+                        buyer_total_minor=int(buyer_total[row]),
+                        seller_net_payout_minor=int(seller_net[row])
+                    ),
+                    deductions=FeeDeductions(
+                        platform_commission_minor=int(platform_commission[row]),
+                        seller_payout_fee_minor=int(payout_fee[row])
+                    )
+                )
+        return calculations
+    
     # CHECKOUT PREVIEW
     async def calculate_checkout_preview(self, cart: List[CartItem]) -> CheckoutPreviewResponse:
         """Calculate comprehensive checkout preview for multi-seller cart"""
         try:
-            per_seller_calculations = []
-            cart_totals = CartTotals(
-                buyer_grand_total_minor=0,
-                seller_total_net_payout_minor=0,
-                platform_revenue_estimate_minor=0
-            )
+            # Fee configs come from the in-memory cache: no DB reads once it is loaded
+            await self._ensure_configs_loaded()
             
             # Get fee config (use first item's attributes for rule matching)
             first_item = cart[0] if cart else CartItem(seller_id="", merch_subtotal_minor=0)
-            active_config = await self.get_active_fee_config(
-                species=first_item.species,
-                export=first_item.export
-            )
+            active_config = self._cached_fee_config(first_item.species, first_item.export)
             
-            # Calculate fees per seller
-            for item in cart:
-                # Get seller-specific config if needed
-                seller_config = await self.get_active_fee_config(
-                    species=item.species,
-                    export=item.export
-                )
-                
-                # Calculate fees for this seller
-                calculation = self.calculate_seller_order_fees(
-                    seller_config,
-                    item.merch_subtotal_minor,
-                    item.delivery_minor,
-                    item.abattoir_minor
-                )
-                calculation.seller_id = item.seller_id
-                
-                per_seller_calculations.append(calculation)
-                
-                # Add to cart totals
-                cart_totals.buyer_grand_total_minor += calculation.totals.buyer_total_minor
-                cart_totals.seller_total_net_payout_minor += calculation.totals.seller_net_payout_minor
-                
-                # Calculate platform revenue
-                platform_revenue = (
-                    calculation.deductions.platform_commission_minor +
-                    calculation.lines.buyer_commission_minor +
-                    calculation.lines.buyer_processing_fee_minor +
-                    calculation.lines.escrow_service_fee_minor
+            # Seller-specific configs, then all seller fees in one pass
+            seller_configs = [self._cached_fee_config(item.species, item.export) for item in cart]
+            per_seller_calculations = self.calculate_cart_fees(cart, seller_configs)
+            
+            cart_totals = CartTotals(
+                buyer_grand_total_minor=sum(c.totals.buyer_total_minor for c in per_seller_calculations),
+                seller_total_net_payout_minor=sum(c.totals.seller_net_payout_minor for c in per_seller_calculations),
+                # Platform revenue: commission either side, processing and escrow fees
+                platform_revenue_estimate_minor=sum(
+                    c.deductions.platform_commission_minor +
+                    c.lines.buyer_commission_minor +
+                    c.lines.buyer_processing_fee_minor +
+                    c.lines.escrow_service_fee_minor
+                    for c in per_seller_calculations
                 )
-                cart_totals.platform_revenue_estimate_minor += platform_revenue
+            )
             
             return CheckoutPreviewResponse(
                 per_seller=per_seller_calculations,
@@ -273,23 +442,15 @@ class FeeService:
         """Finalize and store immutable fee snapshots for an order"""
         try:
             # Get fee config
-            config_doc = await self.db.fee_configs.find_one({"id": fee_config_id})
-            if not config_doc:
+            config = await self.get_fee_config_by_id(fee_config_id)
+            if not config:
                 raise ValueError(f"Fee config not found: {fee_config_id}")
             
-            config = FeeConfig(**config_doc)
+            # Recalculate fees (never trust client data)
+            calculations = self.calculate_cart_fees(cart, [config] * len(cart))
             finalized_fees = []
             
-            # Calculate and store fees per seller
-            for item in cart:
-                # Recalculate fees (never trust client data)
-                calculation = self.calculate_seller_order_fees(
-                    config,
-                    item.merch_subtotal_minor,
-                    item.delivery_minor,
-                    item.abattoir_minor
-                )
-                
+            for item, calculation in zip(cart, calculations):
                 # Create immutable fee snapshot
                 seller_order_fees = SellerOrderFees(
                     seller_order_id=f"{order_group_id}_{item.seller_id}",  # Composite ID
@@ -306,12 +467,13 @@ class FeeService:
                     buyer_total_minor=calculation.totals.buyer_total_minor,
                     seller_net_payout_minor=calculation.totals.seller_net_payout_minor
                 )
-                
-                # Store in database
-                await self.db.seller_order_fees.insert_one(seller_order_fees.dict())
                 finalized_fees.append(seller_order_fees)
-                
-                logger.info(f"Finalized fees for seller order: {seller_order_fees.seller_order_id}")
+            
+            # Store in database
+            if finalized_fees:
+                await self.db.seller_order_fees.insert_many([fees.dict() for fees in finalized_fees])
+            for fees in finalized_fees:
+                logger.info(f"Finalized fees for seller order: {fees.seller_order_id}")
             
             return finalized_fees
             
@@ -0,0 +1,98 @@
+"""
+Great-circle distances shared by every service that measures how far apart
+two places are.
+
+``haversine_km`` handles a single pair with ``math`` (cheapest for one
+pair). ``distances_from`` (one-to-many) and ``distance_matrix``
+(many-to-many) compute whole arrays at once with NumPy. ``within_radius``
+first drops points outside a bounding box around the centre, then measures
+only the ones that remain.
+
+Coordinates are decimal degrees. Arguments are always latitude first, even
+though GeoJSON and Mapbox store ``[lng, lat]``.
+"""
+import math
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Distance between two points in kilometres"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def _haversine(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Broadcasting haversine over radians"""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distances_from(lat: float, lng: float, lats: Sequence[float], lngs: Sequence[float]) -> np.ndarray:
+    """Distances in km from one point to each of ``(lats[i], lngs[i])``"""
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lngs = np.radians(np.asarray(lngs, dtype=np.float64))
+    return _haversine(math.radians(lat), math.radians(lng), lats, lngs)
+
+
+def distance_matrix(lats1: Sequence[float], lngs1: Sequence[float],
+                    lats2: Sequence[float], lngs2: Sequence[float]) -> np.ndarray:
+    """``(len(lats1), len(lats2))`` matrix of distances in km"""
+    lats1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    lngs1 = np.radians(np.asarray(lngs1, dtype=np.float64))[:, None]
+    lats2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    lngs2 = np.radians(np.asarray(lngs2, dtype=np.float64))[None, :]
+    return _haversine(lats1, lngs1, lats2, lngs2)
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    ``(min_lat, max_lat, min_lng, max_lng)`` enclosing every point within
+    ``radius_km``. Near a pole, or when the box would cross the antimeridian,
+    the longitude range widens to the whole globe.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return min_lat, max_lat, -180.0, 180.0
+    # Widest longitude span of the circle, at the latitude where it touches the box
+    ratio = math.sin(math.radians(dlat)) / math.cos(math.radians(lat))
+    if ratio >= 1.0:
+        return min_lat, max_lat, -180.0, 180.0
+    dlng = math.degrees(math.asin(ratio))
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180.0 or max_lng > 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def bounding_box_mask(lat: float, lng: float, radius_km: float,
+                      lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Boolean mask of points inside the bounding box (a superset of the points within the radius)"""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    return (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+
+
+def within_radius(lat: float, lng: float, radius_km: float,
+                  lats: Sequence[float], lngs: Sequence[float],
+                  limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Indices of the points within ``radius_km`` and their distances, nearest
+    first. Points outside the bounding box are rejected before any
+    trigonometry. NaN coordinates never match.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    candidates = np.flatnonzero(bounding_box_mask(lat, lng, radius_km, lats, lngs))
+    distances = distances_from(lat, lng, lats[candidates], lngs[candidates])
+    inside = distances <= radius_km
+    candidates, distances = candidates[inside], distances[inside]
+    order = np.argsort(distances, kind="stable")
+    if limit is not None:
+        order = order[:limit]
+    return candidates[order], distances[order]
@@ -0,0 +1,86 @@
+"""
+HyperLogLog cardinality sketch for unique-viewer counting.
+
+A sketch is ``2**precision`` one-byte registers. At the default precision of
+14 the standard error is ~0.8%; serialised sketches are zlib-compressed, so
+sparse daily sketches take a few hundred bytes and a full one ~10KB. Sketches
+with the same precision merge losslessly (register-wise max), which lets
+rollup rows be combined into unique counts over any window of days.
+"""
+import math
+import zlib
+import hashlib
+from typing import Iterable, Optional
+
+import numpy as np
+
+DEFAULT_PRECISION = 14
+HASH_BITS = 64
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[np.ndarray] = None):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, value) -> None:
+        if value is None:
+            return
+        h = _hash64(str(value))
+        index = h >> (HASH_BITS - self.precision)
+        remainder = h & ((1 << (HASH_BITS - self.precision)) - 1)
+        # Position of the leftmost 1-bit in the remaining bits (1-based)
+        rank = (HASH_BITS - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable) -> "HyperLogLog":
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Union ``other`` into this sketch in place"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.exp2(-self.registers.astype(np.float64))))
+        if estimate <= 2.5 * m:
+            zeros = int(np.count_nonzero(self.registers == 0))
+            if zeros:
+                # Linear counting is more accurate for small cardinalities
+                estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def is_empty(self) -> bool:
+        return not self.registers.any()
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.precision]) + zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        precision = data[0]
+        registers = np.frombuffer(zlib.decompress(data[1:]), dtype=np.uint8).copy()
+        return cls(precision=precision, registers=registers)
+
+    @classmethod
+    def union(cls, sketches: Iterable[Optional[bytes]], precision: int = DEFAULT_PRECISION) -> "HyperLogLog":
+        """Merge serialised sketches, skipping missing ones"""
+        merged = cls(precision=precision)
+        for data in sketches:
+            if data:
+                merged.merge(cls.from_bytes(data))
+        return merged
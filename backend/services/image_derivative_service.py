@@ -0,0 +1,181 @@
+"""
+Image derivative pipeline for locally stored uploads.
+
+Generates thumb/card/full size variants (WebP + JPEG, EXIF stripped) next to
+the original file so browse grids and the PDP never ship the raw upload.
+"""
+import os
+import io
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional, Dict, Any, Union
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:  # pragma: no cover - Pillow is in requirements.txt
+    PIL_AVAILABLE = False
+
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> bounding box (width, height). Images are never upscaled.
+VARIANT_SIZES = {
+    "thumb": (200, 200),
+    "card": (480, 360),
+    "full": (1600, 1200),
+}
+
+DERIVATIVE_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+UPLOAD_ROOT = os.getenv("UPLOAD_ROOT", "/app/uploads")
+
+# Folders/stems known to have derivatives. Only hits are cached, so derivatives generated
+# by another worker are found on the next lookup
+_existing_derivatives = TTLCache(ttl_seconds=3600, max_entries=4096)
+
+
+class ImageDerivativeService:
+    def __init__(self, upload_root: str = UPLOAD_ROOT):
+        self.upload_root = Path(upload_root)
+        self.enabled = PIL_AVAILABLE
+        if not self.enabled:
+            logger.warning("Pillow not installed - image derivatives disabled")
+
+    async def create_derivatives(self, source_path: Union[str, Path], url_prefix: str) -> Dict[str, Any]:
+        """
+        Generate all size variants for an uploaded image off the event loop.
+
+        Returns a mapping of variant name to {"webp", "jpeg", "width", "height"}
+        where the format keys are public URLs built from ``url_prefix``.
+        """
+        if not self.enabled:
+            return {}
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                None, self._generate_derivatives, Path(source_path), url_prefix.rstrip("/")
+            )
+        except Exception as e:
+            logger.error(f"Error generating image derivatives for {source_path}: {e}")
+            return {}
+
+    async def prepare_for_upload(self, content: bytes, variant: str = "full") -> bytes:
+        """
+        Downscale and strip EXIF from raw image bytes before handing them to a
+        remote media provider. Falls back to the original bytes on failure.
+        """
+        if not self.enabled:
+            return content
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self._render_bytes, content, variant, "jpeg")
+        except Exception as e:
+            logger.warning(f"Could not prepare image for upload, sending original: {e}")
+            return content
+
+    def _generate_derivatives(self, source_path: Path, url_prefix: str) -> Dict[str, Any]:
+        stem = source_path.stem
+        derivatives: Dict[str, Any] = {}
+
+        with Image.open(source_path) as original:
+            base = self._normalise(original)
+            for variant, size in VARIANT_SIZES.items():
+                resized = self._resize(base, size)
+                entry = {"width": resized.width, "height": resized.height}
+                for ext, options in DERIVATIVE_FORMATS.items():
+                    filename = derivative_filename(stem, variant, ext)
+                    # Saving without an exif= argument drops all EXIF/GPS metadata
+                    resized.save(source_path.parent / filename, **options)
+                    entry[ext] = f"{url_prefix}/{filename}"
+                derivatives[variant] = entry
+
+        return derivatives
+
+    def _render_bytes(self, content: bytes, variant: str, ext: str) -> bytes:
+        with Image.open(io.BytesIO(content)) as original:
+            resized = self._resize(self._normalise(original), VARIANT_SIZES[variant])
+            buffer = io.BytesIO()
+            resized.save(buffer, **DERIVATIVE_FORMATS[ext])
+            return buffer.getvalue()
+
+    @staticmethod
+    def _normalise(image: "Image.Image") -> "Image.Image":
+        """Apply EXIF orientation and convert to a web-safe colour mode"""
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            rgba = image.convert("RGBA")
+            background.paste(rgba, mask=rgba.split()[-1])
+            image = background
+        return image
+
+    @staticmethod
+    def _resize(image: "Image.Image", size) -> "Image.Image":
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        return resized
+
+
+def derivative_filename(stem: str, variant: str, ext: str) -> str:
+    return f"{stem}_{variant}.{ext}"
+
+
+def _derivatives_exist(folder_path: str, stem: str) -> bool:
+    key = (folder_path, stem)
+    if _existing_derivatives.get(key):
+        return True
+    exists = os.path.isfile(os.path.join(folder_path, derivative_filename(stem, "thumb", "webp")))
+    if exists:
+        _existing_derivatives.set(key, True)
+    return exists
+
+
+def image_variants(image: Any, upload_root: str = UPLOAD_ROOT) -> Optional[Dict[str, str]]:
+    """
+    Resolve size variant URLs for a stored listing image entry.
+
+    Accepts either a URL string or an image dict (``url``/``secure_url`` plus an
+    optional ``variants`` mapping). Local ``/uploads/...`` images resolve to the
+    WebP derivatives generated at upload time; Cloudinary images reuse their
+    provider variants. Returns None when no derivatives are known.
+    """
+    if isinstance(image, dict):
+        stored = image.get("variants") or {}
+        if stored:
+            return {
+                "thumb": _variant_url(stored.get("thumb") or stored.get("thumbnail")),
+                "card": _variant_url(stored.get("card") or stored.get("medium")),
+                "full": _variant_url(stored.get("full") or stored.get("large")),
+            }
+        image = image.get("url") or image.get("secure_url")
+
+    if not isinstance(image, str) or "/uploads/" not in image:
+        return None
+
+    relative = image[image.index("/uploads/") + len("/uploads/"):]
+    folder, _, filename = relative.rpartition("/")
+    if not folder or "." not in filename:
+        return None
+
+    stem = filename.rsplit(".", 1)[0]
+    if not _derivatives_exist(os.path.join(upload_root, folder), stem):
+        return None
+
+    prefix = image[:image.index("/uploads/")] + f"/uploads/{folder}"
+    return {variant: f"{prefix}/{derivative_filename(stem, variant, 'webp')}" for variant in VARIANT_SIZES}
+
+
+def _variant_url(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        return value.get("webp") or value.get("jpeg") or value.get("url")
+    return value
+
+
+# Global image derivative service instance
+image_derivative_service = ImageDerivativeService()
@@ -0,0 +1,212 @@
+"""
+Inbox hydration shared by the unified inbox and real-time chat.
+
+``UserProfileCache`` resolves participant ids to display profiles (name,
+avatar, role) with one ``$in`` query for whatever is not already cached, so a
+page of conversations costs one users query at most. Profile edits invalidate
+the user's entry; anything else ages out after ``INBOX_PROFILE_CACHE_SECONDS``.
+
+``UnreadCounters`` keeps one document per user and scope in
+``inbox_unread_counters`` holding unread totals per conversation type. Sends
+``$inc`` the recipients' counters and reads subtract what was cleared, so
+summaries are a single ``find_one`` instead of an aggregation over every
+conversation.
+
+A user's document is built from the conversations the first time it is read.
+An empty placeholder is upserted before the aggregation runs so sends that
+land meanwhile still ``$inc`` it, and every write bumps ``version``; a rebuild
+only replaces ``by_type`` if the version it read is still current, otherwise
+it aggregates again. ``reconcile`` runs the same rebuild on a schedule for
+the least recently reconciled documents, so drift (a crashed sender, a
+conversation deleted or reopened) does not last.
+"""
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from services.job_scheduler import every
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+COUNTER_COLLECTION = "inbox_unread_counters"
+REBUILD_ATTEMPTS = 3
+PROFILE_PROJECTION = {
+    "_id": 0, "id": 1, "full_name": 1, "first_name": 1, "last_name": 1,
+    "profile_photo": 1, "profile_image": 1, "roles": 1,
+}
+
+
+def display_profile(user: Dict[str, Any]) -> Dict[str, Any]:
+    first_name = user.get("first_name")
+    last_name = user.get("last_name")
+    name = user.get("full_name") or " ".join(part for part in (first_name, last_name) if part) or "User"
+    roles = user.get("roles") or []
+    return {
+        "id": user["id"],
+        "name": name,
+        "first_name": first_name or name.split(" ")[0],
+        "last_name": last_name or " ".join(name.split(" ")[1:]),
+        "avatar": user.get("profile_photo") or user.get("profile_image"),
+        "role": roles[0] if roles else None,
+    }
+
+
+def unknown_profile(user_id: str) -> Dict[str, Any]:
+    return {"id": user_id, "name": "User", "first_name": "Unknown", "last_name": "", "avatar": None, "role": None}
+
+
+class UserProfileCache:
+    def __init__(self, db, ttl_seconds: float = None, max_entries: int = 10000):
+        self.db = db
+        ttl = ttl_seconds if ttl_seconds is not None else float(os.getenv("INBOX_PROFILE_CACHE_SECONDS", "300"))
+        self._cache = TTLCache(ttl_seconds=ttl, max_entries=max_entries)
+
+    async def get_profiles(self, user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Display profile per user id; unknown ids get a placeholder"""
+        profiles: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for user_id in dict.fromkeys(user_ids):
+            if not user_id:
+                continue
+            profile = self._cache.get(user_id)
+            if profile is None:
+                missing.append(user_id)
+            else:
+                profiles[user_id] = profile
+
+        if missing:
+            users = await self.db.users.find(
+                {"id": {"$in": missing}}, PROFILE_PROJECTION
+            ).to_list(length=len(missing))
+            for user in users:
+                profile = display_profile(user)
+                self._cache.set(user["id"], profile)
+                profiles[user["id"]] = profile
+            # Unknown ids (e.g. "system") are cached too so they are not looked up again
+            for user_id in missing:
+                if user_id not in profiles:
+                    profiles[user_id] = unknown_profile(user_id)
+                    self._cache.set(user_id, profiles[user_id])
+
+        return profiles
+
+    def invalidate(self, user_id: str):
+        self._cache.invalidate(user_id)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return self._cache.get_metrics()
+
+
+class UnreadCounters:
+    def __init__(self, db, scope: str, rebuild: Callable[[str], Awaitable[Dict[str, int]]],
+                 reconcile_batch: int = None):
+        """
+        ``rebuild(user_id)`` recomputes ``{conversation_type: unread}`` from the
+        conversations; it must count exactly what ``increment`` is called for
+        """
+        self.db = db
+        self.scope = scope
+        self.rebuild = rebuild
+        self.reconcile_batch = reconcile_batch or int(os.getenv("INBOX_UNREAD_RECONCILE_BATCH", "500"))
+        self.reconcile_interval_seconds = float(os.getenv("INBOX_UNREAD_RECONCILE_SECONDS", "900"))
+
+    @property
+    def counters(self):
+        return self.db[COUNTER_COLLECTION]
+
+    async def ensure_indexes(self):
+        try:
+            await self.counters.create_indexes([
+                IndexModel([("user_id", ASCENDING), ("scope", ASCENDING)], name="unread_user_scope", unique=True),
+                IndexModel([("scope", ASCENDING), ("reconciled_at", ASCENDING)], name="unread_scope_reconciled_at"),
+            ])
+        except Exception as e:
+            logger.warning(f"Could not create unread counter indexes: {e}")
+
+    async def get(self, user_id: str) -> Dict[str, int]:
+        """Unread count per conversation type, building the counter document on first use"""
+        doc = await self.counters.find_one(
+            {"user_id": user_id, "scope": self.scope, "initialized": True}, {"_id": 0, "by_type": 1, "rebuilding": 1}
+        )
+        if doc is not None and not doc.get("rebuilding"):
+            return {kind: max(0, count) for kind, count in (doc.get("by_type") or {}).items()}
+
+        return await self.reconcile_user(user_id)
+
+    async def reconcile_user(self, user_id: str) -> Dict[str, int]:
+        """Rebuild one user's counter from the conversations without losing concurrent increments"""
+        try:
+            # Placeholder first, so increments from here on have a document to land on
+            await self.counters.update_one(
+                {"user_id": user_id, "scope": self.scope},
+                {"$setOnInsert": {"by_type": {}, "initialized": True, "rebuilding": True, "version": 0}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass
+
+        by_type: Dict[str, int] = {}
+        for _ in range(REBUILD_ATTEMPTS):
+            doc = await self.counters.find_one({"user_id": user_id, "scope": self.scope}, {"_id": 0, "version": 1})
+            version = (doc or {}).get("version")
+            by_type = await self.rebuild(user_id)
+            now = datetime.now(timezone.utc)
+            # Only replace the counts if no increment landed since the version was read
+            result = await self.counters.update_one(
+                {"user_id": user_id, "scope": self.scope,
+                 "version": version if version is not None else {"$exists": False}},
+                {"$set": {"by_type": by_type, "initialized": True, "updated_at": now, "reconciled_at": now},
+                 "$unset": {"rebuilding": ""},
+                 "$inc": {"version": 1}}
+            )
+            if result.matched_count:
+                return by_type
+
+        # Still busy; the next read or reconcile run retries
+        logger.info(f"Unread counter for {user_id} ({self.scope}) kept changing during rebuild")
+        return by_type
+
+    async def total(self, user_id: str) -> int:
+        return sum((await self.get(user_id)).values())
+
+    async def increment(self, user_ids: Iterable[str], conversation_type: str, amount: int = 1):
+        """Add ``amount`` unread to each user's counter; never raises"""
+        ids = [user_id for user_id in user_ids if user_id]
+        if not ids or not amount:
+            return
+        try:
+            await self.counters.update_many(
+                {"user_id": {"$in": ids}, "scope": self.scope, "initialized": True},
+                {"$inc": {f"by_type.{conversation_type or 'other'}": amount, "version": 1},
+                 "$set": {"updated_at": datetime.now(timezone.utc)}}
+            )
+        except Exception as e:
+            logger.warning(f"Unread counter update failed for {ids}: {e}")
+
+    async def decrement(self, user_id: str, conversation_type: str, amount: int):
+        """Subtract unread that was just cleared; never raises"""
+        if amount and amount > 0:
+            await self.increment([user_id], conversation_type, -amount)
+
+    # Scheduled job
+
+    def register_jobs(self, scheduler):
+        scheduler.register_periodic(f"unread_counters.reconcile.{self.scope}", self.reconcile,
+                                    every(self.reconcile_interval_seconds))
+
+    async def reconcile(self) -> int:
+        """Rebuild the least recently reconciled counters of this scope; returns how many"""
+        docs = await self.counters.find(
+            {"scope": self.scope}, {"_id": 0, "user_id": 1}
+        ).sort("reconciled_at", ASCENDING).limit(self.reconcile_batch).to_list(length=self.reconcile_batch)
+        for doc in docs:
+            try:
+                await self.reconcile_user(doc["user_id"])
+            except Exception as e:
+                logger.warning(f"Unread counter reconcile failed for {doc['user_id']} ({self.scope}): {e}")
+        return len(docs)
@@ -0,0 +1,533 @@
+"""
+Durable, MongoDB-backed job scheduler shared by every worker.
+
+One-off jobs live in ``scheduled_jobs``. ``enqueue`` stores a job with a
+``run_at`` time; workers claim due jobs with a single ``find_one_and_update``
+that sets a lease (``lease_owner``/``lease_expires_at``), renew the lease while
+the handler runs and record the outcome. A failed job goes back to ``queued``
+with an exponentially backed-off ``run_at`` until ``max_attempts`` is reached,
+then it is parked as ``dead``. A job whose worker died mid-run is picked up
+again once its lease expires, so a deploy or crash no longer loses work.
+
+Periodic jobs (crons) keep one state document each in
+``periodic_job_state``. Every worker polls them, but a run is only started by
+the worker that wins the lease on a due document, so each cron runs once per
+schedule across the whole deployment instead of once per worker.
+
+Handlers are registered per job name before ``start()``:
+
+    scheduler.register_handler("transfers.process", handle_transfer)
+    await scheduler.enqueue("transfers.process", {"transfer_id": ...}, delay_seconds=300)
+    scheduler.register_periodic("reviews.unblind", unblind, every(3600))
+
+Times are naive UTC, like the rest of the stored timestamps.
+"""
+import os
+import time
+import uuid
+import random
+import socket
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "scheduled_jobs"
+PERIODIC_COLLECTION = "periodic_job_state"
+FINISHED_JOB_RETENTION_SECONDS = 7 * 86400
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    DEAD = "dead"
+
+
+Handler = Callable[[Dict[str, Any], int], Awaitable[Any]]
+Schedule = Callable[[datetime], datetime]
+
+
+# Schedules: map "now" to the next run time
+
+def every(seconds: float) -> Schedule:
+    return lambda now: now + timedelta(seconds=seconds)
+
+
+def daily_at(hour: int = 0, minute: int = 0) -> Schedule:
+    def next_run(now: datetime) -> datetime:
+        run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return run if run > now else run + timedelta(days=1)
+    return next_run
+
+
+def weekly_on(weekday: int, hour: int = 0, minute: int = 0) -> Schedule:
+    """``weekday`` as in ``datetime.weekday()`` (Monday is 0)"""
+    def next_run(now: datetime) -> datetime:
+        run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        run += timedelta(days=(weekday - now.weekday()) % 7)
+        return run if run > now else run + timedelta(days=7)
+    return next_run
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Exponential backoff with equal jitter: half fixed, half random"""
+    ceiling = min(max_seconds, base_seconds * 2 ** max(attempt - 1, 0))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class _JobMetrics:
+    def __init__(self):
+        self.enqueued = 0
+        self.claimed = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.dead = 0
+        self.reclaimed = 0
+        self.queue_latency_ms = deque(maxlen=500)
+        self.run_ms = deque(maxlen=500)
+
+    @staticmethod
+    def _percentile(values, p: float) -> Optional[float]:
+        ordered = sorted(values)
+        if not ordered:
+            return None
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enqueued": self.enqueued,
+            "claimed": self.claimed,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "dead": self.dead,
+            "reclaimed": self.reclaimed,
+            "queue_latency_p50_ms": self._percentile(self.queue_latency_ms, 0.5),
+            "queue_latency_p95_ms": self._percentile(self.queue_latency_ms, 0.95),
+            "run_p50_ms": self._percentile(self.run_ms, 0.5),
+            "run_p95_ms": self._percentile(self.run_ms, 0.95),
+        }
+
+
+class JobScheduler:
+    def __init__(
+        self,
+        db,
+        worker_id: Optional[str] = None,
+        concurrency: int = None,
+        poll_interval_seconds: float = None,
+        lease_seconds: float = None,
+        default_max_attempts: int = 5,
+        backoff_base_seconds: float = 30,
+        backoff_max_seconds: float = 3600
+    ):
+        self.db = db
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = concurrency or int(os.getenv("JOB_CONCURRENCY", "4"))
+        self.poll_interval_seconds = poll_interval_seconds or float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+        self.lease_seconds = lease_seconds or float(os.getenv("JOB_LEASE_SECONDS", "300"))
+        self.default_max_attempts = default_max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+        self._handlers: Dict[str, Dict[str, Any]] = {}
+        self._periodic: Dict[str, Dict[str, Any]] = {}
+        self._tasks = set()
+        self._periodic_running = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self.running = False
+
+        self._metrics: Dict[str, _JobMetrics] = {}
+        self._completed_at = deque(maxlen=5000)
+        self.in_flight = 0
+
+    @property
+    def jobs(self):
+        return self.db[JOBS_COLLECTION]
+
+    @property
+    def periodic_state(self):
+        return self.db[PERIODIC_COLLECTION]
+
+    async def ensure_indexes(self):
+        try:
+            await self.jobs.create_indexes([
+                IndexModel([("id", ASCENDING)], name="jobs_id", unique=True),
+                IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="jobs_status_run_at"),
+                IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="jobs_status_lease"),
+                # At most one queued job per dedupe key
+                IndexModel([("dedupe_key", ASCENDING)], name="jobs_queued_dedupe_key", unique=True,
+                           partialFilterExpression={"dedupe_key": {"$exists": True}, "status": JobStatus.QUEUED}),
+                # Dead jobs are kept for inspection; finished ones expire
+                IndexModel([("finished_at", ASCENDING)], name="jobs_finished_ttl",
+                           expireAfterSeconds=FINISHED_JOB_RETENTION_SECONDS,
+                           partialFilterExpression={"status": JobStatus.SUCCEEDED}),
+            ])
+        except Exception as e:
+            logger.warning(f"Could not create job scheduler indexes: {e}")
+
+    # Registration
+
+    def register_handler(self, name: str, handler: Handler, max_attempts: int = None):
+        """``handler(payload, attempt)`` runs each claimed job of this name; raising schedules a retry"""
+        self._handlers[name] = {"handler": handler, "max_attempts": max_attempts or self.default_max_attempts}
+
+    def register_periodic(self, name: str, func: Callable[[], Awaitable[Any]], schedule: Schedule,
+                          run_on_start: bool = False):
+        """Run ``func()`` on ``schedule`` on exactly one worker at a time"""
+        self._periodic[name] = {"func": func, "schedule": schedule, "run_on_start": run_on_start}
+
+    # Producing jobs
+
+    async def enqueue(
+        self,
+        name: str,
+        payload: Optional[Dict[str, Any]] = None,
+        run_at: Optional[datetime] = None,
+        delay_seconds: float = 0,
+        max_attempts: int = None,
+        dedupe_key: Optional[str] = None
+    ) -> str:
+        """
+        Store a job and return its id. With ``dedupe_key`` an already queued
+        job with the same key is returned instead of adding a second one.
+        """
+        now = datetime.utcnow()
+        run_at = run_at or now + timedelta(seconds=delay_seconds)
+        registered = self._handlers.get(name)
+        job = {
+            "id": str(uuid.uuid4()),
+            "name": name,
+            "payload": payload or {},
+            "status": JobStatus.QUEUED,
+            "run_at": run_at,
+            "attempts": 0,
+            "max_attempts": max_attempts or (registered or {}).get("max_attempts") or self.default_max_attempts,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if dedupe_key:
+            job["dedupe_key"] = dedupe_key
+        try:
+            await self.jobs.insert_one(job)
+        except DuplicateKeyError:
+            existing = await self.jobs.find_one(
+                {"dedupe_key": dedupe_key, "status": JobStatus.QUEUED}, {"_id": 0, "id": 1}
+            )
+            if existing:
+                return existing["id"]
+            raise
+        self._job_metrics(name).enqueued += 1
+        if run_at <= now and self._wakeup is not None:
+            self._wakeup.set()
+        return job["id"]
+
+    # Lifecycle
+
+    async def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._wakeup = asyncio.Event()
+        await self.ensure_indexes()
+        await self._sync_periodic_state()
+        for _ in range(self.concurrency):
+            self._spawn(self._worker_loop())
+        if self._periodic:
+            self._spawn(self._periodic_loop())
+        logger.info(f"Job scheduler {self.worker_id} started: {len(self._handlers)} handlers, "
+                    f"{len(self._periodic)} periodic jobs, concurrency {self.concurrency}")
+
+    async def stop(self, grace_seconds: float = 10):
+        """Stop claiming; jobs still running after the grace period are cancelled and reclaimed later"""
+        if not self.running:
+            return
+        self.running = False
+        self._wakeup.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(list(self._tasks), timeout=grace_seconds)
+            for task in pending:
+                task.cancel()
+        logger.info(f"Job scheduler {self.worker_id} stopped")
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # One-off jobs
+
+    async def _worker_loop(self):
+        while self.running:
+            try:
+                job = await self._claim()
+                if job is not None:
+                    await self._execute(job)
+                    continue
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Job worker error: {e}")
+                await asyncio.sleep(self.poll_interval_seconds)
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        if not self._handlers:
+            return None
+        now = datetime.utcnow()
+        claimed = {
+            "status": JobStatus.RUNNING,
+            "lease_owner": self.worker_id,
+            "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+            "claimed_at": now,
+            "updated_at": now,
+        }
+        previous = await self.jobs.find_one_and_update(
+            {
+                "name": {"$in": list(self._handlers)},
+                "$or": [
+                    {"status": JobStatus.QUEUED, "run_at": {"$lte": now}},
+                    # Lease expired: the worker running it died or hung
+                    {"status": JobStatus.RUNNING, "lease_expires_at": {"$lt": now}},
+                ],
+            },
+            {"$set": claimed, "$inc": {"attempts": 1}},
+            sort=[("run_at", ASCENDING)],
+            return_document=ReturnDocument.BEFORE,
+        )
+        if previous is None:
+            return None
+        # Keep the previous status so an expired lease can be told apart from a fresh claim
+        return {**previous, **claimed, "attempts": previous.get("attempts", 0) + 1,
+                "previous_status": previous["status"]}
+
+    async def _execute(self, job: Dict[str, Any]):
+        name = job["name"]
+        metrics = self._job_metrics(name)
+        metrics.claimed += 1
+        if job["previous_status"] == JobStatus.RUNNING:
+            metrics.reclaimed += 1
+            logger.warning(f"Reclaimed job {name} {job['id']} after its lease expired")
+        metrics.queue_latency_ms.append(max((job["claimed_at"] - job["run_at"]).total_seconds() * 1000, 0))
+
+        if job["attempts"] > job.get("max_attempts", self.default_max_attempts):
+            # Crashed its worker on every attempt; don't let it take down more
+            await self._finish(job, {"status": JobStatus.DEAD, "last_error": "Lease expired on final attempt"})
+            metrics.dead += 1
+            return
+
+        handler = self._handlers[name]["handler"]
+        heartbeat = asyncio.create_task(self._renew_lease(self.jobs, {"id": job["id"]}))
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            await handler(job.get("payload") or {}, job["attempts"])
+        except asyncio.CancelledError:
+            # Shutting down: leave the lease to expire so another worker retries it
+            raise
+        except Exception as e:
+            await self._record_failure(job, e, metrics)
+        else:
+            await self._finish(job, {"status": JobStatus.SUCCEEDED, "last_error": None})
+            metrics.succeeded += 1
+            self._completed_at.append(time.monotonic())
+        finally:
+            self.in_flight -= 1
+            heartbeat.cancel()
+            metrics.run_ms.append((time.perf_counter() - started) * 1000)
+
+    async def _record_failure(self, job: Dict[str, Any], error: Exception, metrics: _JobMetrics):
+        attempts = job["attempts"]
+        if attempts >= job.get("max_attempts", self.default_max_attempts):
+            logger.error(f"Job {job['name']} {job['id']} failed permanently after {attempts} attempts: {error}")
+            await self._finish(job, {"status": JobStatus.DEAD, "last_error": str(error)[:500]})
+            metrics.dead += 1
+            return
+        delay = backoff_delay(attempts, self.backoff_base_seconds, self.backoff_max_seconds)
+        logger.warning(f"Job {job['name']} {job['id']} failed ({error}); retry {attempts} in {delay:.0f}s")
+        await self.jobs.update_one(
+            {"id": job["id"], "lease_owner": self.worker_id},
+            {"$set": {
+                "status": JobStatus.QUEUED,
+                "run_at": datetime.utcnow() + timedelta(seconds=delay),
+                "last_error": str(error)[:500],
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "updated_at": datetime.utcnow(),
+            }}
+        )
+        metrics.retried += 1
+
+    async def _finish(self, job: Dict[str, Any], fields: Dict[str, Any]):
+        now = datetime.utcnow()
+        await self.jobs.update_one(
+            {"id": job["id"], "lease_owner": self.worker_id},
+            {"$set": {**fields, "finished_at": now, "updated_at": now,
+                      "lease_owner": None, "lease_expires_at": None}}
+        )
+
+    async def _renew_lease(self, collection, query: Dict[str, Any]):
+        """Push the lease forward while the job runs, so long jobs aren't reclaimed"""
+        try:
+            while True:
+                await asyncio.sleep(self.lease_seconds / 3)
+                await collection.update_one(
+                    {**query, "lease_owner": self.worker_id},
+                    {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+                )
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not renew job lease {query}: {e}")
+
+    # Periodic jobs
+
+    async def _sync_periodic_state(self):
+        now = datetime.utcnow()
+        for name, periodic in self._periodic.items():
+            first_run = now if periodic["run_on_start"] else periodic["schedule"](now)
+            try:
+                await self.periodic_state.update_one(
+                    {"_id": name},
+                    {"$setOnInsert": {"next_run_at": first_run, "runs": 0, "failures": 0,
+                                      "consecutive_failures": 0, "lease_owner": None}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                pass  # Another worker created it first
+
+    async def _periodic_loop(self):
+        while self.running:
+            try:
+                for name in self._periodic:
+                    if name not in self._periodic_running:
+                        await self._start_periodic_if_due(name)
+                await asyncio.sleep(self.poll_interval_seconds)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Periodic job loop error: {e}")
+                await asyncio.sleep(self.poll_interval_seconds)
+
+    async def _start_periodic_if_due(self, name: str):
+        now = datetime.utcnow()
+        state = await self.periodic_state.find_one_and_update(
+            {
+                "_id": name,
+                "next_run_at": {"$lte": now},
+                "$or": [{"lease_owner": None}, {"lease_expires_at": {"$lt": now}}],
+            },
+            {"$set": {
+                "lease_owner": self.worker_id,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                "started_at": now,
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
+        if state is None:
+            return  # Not due, or another worker holds the lease
+        self._periodic_running.add(name)
+        self._spawn(self._run_periodic(name, state))
+
+    async def _run_periodic(self, name: str, state: Dict[str, Any]):
+        periodic = self._periodic[name]
+        metrics = self._job_metrics(name)
+        metrics.claimed += 1
+        metrics.queue_latency_ms.append(max((state["started_at"] - state["next_run_at"]).total_seconds() * 1000, 0))
+
+        heartbeat = asyncio.create_task(self._renew_lease(self.periodic_state, {"_id": name}))
+        started = time.perf_counter()
+        self.in_flight += 1
+        error = None
+        try:
+            await periodic["func"]()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e
+        finally:
+            self.in_flight -= 1
+            heartbeat.cancel()
+            self._periodic_running.discard(name)
+        run_ms = (time.perf_counter() - started) * 1000
+        metrics.run_ms.append(run_ms)
+
+        now = datetime.utcnow()
+        next_run_at = periodic["schedule"](now)
+        fields = {"last_run_at": now, "last_duration_ms": round(run_ms, 1), "last_worker": self.worker_id,
+                  "lease_owner": None, "lease_expires_at": None}
+        if error is None:
+            metrics.succeeded += 1
+            self._completed_at.append(time.monotonic())
+            update = {"$set": {**fields, "next_run_at": next_run_at, "last_error": None,
+                               "consecutive_failures": 0},
+                      "$inc": {"runs": 1}}
+        else:
+            # Retry sooner than the next scheduled run, backing off on repeated failures
+            failures = state.get("consecutive_failures", 0) + 1
+            retry_at = now + timedelta(seconds=backoff_delay(failures, self.backoff_base_seconds,
+                                                             self.backoff_max_seconds))
+            metrics.retried += 1
+            logger.error(f"Periodic job {name} failed ({error}); next attempt at {min(retry_at, next_run_at)}")
+            update = {"$set": {**fields, "next_run_at": min(retry_at, next_run_at), "last_error": str(error)[:500],
+                               "consecutive_failures": failures},
+                      "$inc": {"runs": 1, "failures": 1}}
+        await self.periodic_state.update_one({"_id": name, "lease_owner": self.worker_id}, update)
+
+    async def trigger_periodic(self, name: str):
+        """Make a periodic job due now; whichever worker claims it first runs it"""
+        if name not in self._periodic:
+            raise KeyError(name)
+        await self.periodic_state.update_one({"_id": name}, {"$set": {"next_run_at": datetime.utcnow()}})
+
+    # Metrics
+
+    def _job_metrics(self, name: str) -> _JobMetrics:
+        return self._metrics.setdefault(name, _JobMetrics())
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """This worker's counters; see ``get_queue_stats`` for the shared queue"""
+        cutoff = time.monotonic() - 300
+        completed_recently = sum(1 for finished in self._completed_at if finished >= cutoff)
+        return {
+            "worker_id": self.worker_id,
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "throughput_per_minute": round(completed_recently / 5, 2),
+            "jobs": {name: metrics.snapshot() for name, metrics in self._metrics.items()},
+        }
+
+    async def get_queue_stats(self) -> Dict[str, Any]:
+        """Job counts by name and status, the oldest due job's lag, and periodic job state"""
+        now = datetime.utcnow()
+        counts: Dict[str, Dict[str, int]] = {}
+        async for row in self.jobs.aggregate([
+            {"$group": {"_id": {"name": "$name", "status": "$status"}, "count": {"$sum": 1}}}
+        ]):
+            counts.setdefault(row["_id"]["name"], {})[row["_id"]["status"]] = row["count"]
+
+        oldest_due = await self.jobs.find_one(
+            {"status": JobStatus.QUEUED, "run_at": {"$lte": now}}, {"_id": 0, "run_at": 1},
+            sort=[("run_at", ASCENDING)]
+        )
+        periodic = {}
+        async for state in self.periodic_state.find({}):
+            name = state.pop("_id")
+            periodic[name] = state
+        return {
+            "counts": counts,
+            "oldest_due_lag_seconds": round((now - oldest_due["run_at"]).total_seconds(), 1) if oldest_due else 0,
+            "periodic": periodic,
+        }
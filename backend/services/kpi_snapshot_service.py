@@ -0,0 +1,311 @@
+"""
+Materialised KPI snapshots for the admin dashboards and public stats.
+
+Two kinds of documents live in ``kpi_snapshots``:
+
+* ``day:YYYY-MM-DD`` - per-day flow metrics that do not change once the day
+  is over (new users, new listings, orders created and their value). Closed
+  days are computed once from the source collections; the current day is kept
+  as "today so far" counters that write paths ``$inc`` and that every refresh
+  re-syncs with an exact count.
+* ``current`` - point-in-time gauges (totals, active users per window,
+  active listings, distributions), refreshed by the background job.
+
+Dashboards read these documents instead of counting and aggregating the
+``users``, ``listings`` and ``orders`` collections on every page load.
+
+Transactions, revenue and platform fees depend on order status, which keeps
+changing after the day an order was created, so they are never snapshotted:
+``get_transaction_days`` aggregates them live over the requested window.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne
+
+from services.job_scheduler import every
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+KPI_COLLECTION = "kpi_snapshots"
+ACTIVE_USER_WINDOWS = (1, 7, 30, 90)
+TRANSACTION_STATUSES = ["completed", "paid"]
+
+# Flow fields stored on each day document
+DAY_FIELDS = (
+    "new_users", "new_listings", "listing_price_sum", "listing_quantity_sum", "listing_value_sum",
+    "orders_created", "order_value",
+)
+# Status-dependent fields, aggregated live by get_transaction_days
+TRANSACTION_FIELDS = ("transactions", "revenue", "platform_fees")
+
+
+def day_start(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def day_key(value: datetime) -> str:
+    return f"day:{value.strftime('%Y-%m-%d')}"
+
+
+class KPISnapshotService:
+    def __init__(self, db, refresh_interval_seconds: int = 900, backfill_days: int = 90):
+        self.db = db
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.backfill_days = backfill_days
+        self._cache = TTLCache(ttl_seconds=60, max_entries=16)
+
+    async def ensure_indexes(self):
+        try:
+            await self.db[KPI_COLLECTION].create_indexes([
+                IndexModel([("type", ASCENDING), ("date", DESCENDING)], name="kpi_type_date")
+            ])
+            await self.db.users.create_indexes([
+                IndexModel([("created_at", ASCENDING)], name="users_created_at"),
+                IndexModel([("last_login", DESCENDING)], name="users_last_login"),
+            ])
+            await self.db.listings.create_indexes([
+                IndexModel([("created_at", ASCENDING)], name="listings_created_at"),
+                IndexModel([("status", ASCENDING)], name="listings_status"),
+            ])
+            await self.db.orders.create_indexes([
+                IndexModel([("created_at", ASCENDING)], name="orders_created_at"),
+                IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="orders_status_created_at"),
+            ])
+        except Exception as e:
+            logger.warning(f"Could not create KPI snapshot indexes: {e}")
+
+    # Write side
+
+    async def record(self, **increments):
+        """
+        Bump today's counters, e.g. ``record(new_users=1)`` or
+        ``record(orders_created=1, order_value=250.0)``. Never raises.
+        """
+        try:
+            today = day_start(datetime.utcnow())
+            await self.db[KPI_COLLECTION].update_one(
+                {"_id": day_key(today)},
+                {"$inc": increments, "$setOnInsert": {"type": "day", "date": today}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record KPI counters {increments}: {e}")
+
+    # Scheduled job
+
+    def register_jobs(self, scheduler):
+        scheduler.register_periodic("kpi.refresh_snapshots", self.refresh, every(self.refresh_interval_seconds),
+                                    run_on_start=True)
+
+    async def refresh(self):
+        """Snapshot any missing closed days, re-sync today and refresh the gauges"""
+        today = day_start(datetime.utcnow())
+        existing = {
+            doc["_id"] async for doc in self.db[KPI_COLLECTION].find(
+                {"type": "day", "finalized": True, "date": {"$gte": today - timedelta(days=self.backfill_days)}},
+                {"_id": 1}
+            )
+        }
+        missing = [
+            today - timedelta(days=offset)
+            for offset in range(1, self.backfill_days + 1)
+            if day_key(today - timedelta(days=offset)) not in existing
+        ]
+        if missing:
+            await self.snapshot_days(min(missing), today, finalized=True)
+        await self.snapshot_days(today, today + timedelta(days=1), finalized=False)
+        await self.refresh_gauges()
+        self._cache.clear()
+
+    async def snapshot_days(self, start: datetime, end: datetime, finalized: bool):
+        """Compute flow metrics for every day in [start, end) with one aggregation per collection"""
+        days: Dict[str, Dict[str, Any]] = {}
+        current = start
+        while current < end:
+            days[current.strftime("%Y-%m-%d")] = {field: 0 for field in DAY_FIELDS}
+            current += timedelta(days=1)
+
+        window = {"created_at": {"$gte": start, "$lt": end}}
+        by_day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}
+
+        sources = [
+            (self.db.users, {"new_users": {"$sum": 1}}),
+            (self.db.listings, {
+                "new_listings": {"$sum": 1},
+                "listing_price_sum": {"$sum": "$price_per_unit"},
+                "listing_quantity_sum": {"$sum": "$quantity"},
+                "listing_value_sum": {"$sum": {"$multiply": [
+                    {"$ifNull": ["$price_per_unit", 0]}, {"$ifNull": ["$quantity", 0]}
+                ]}},
+            }),
+            (self.db.orders, {
+                "orders_created": {"$sum": 1},
+                "order_value": {"$sum": "$total_amount"},
+            }),
+        ]
+        for collection, accumulators in sources:
+            rows = await collection.aggregate([
+                {"$match": window},
+                {"$group": {"_id": by_day, **accumulators}}
+            ]).to_list(length=None)
+            for row in rows:
+                if row["_id"] in days:
+                    days[row["_id"]].update({k: v for k, v in row.items() if k != "_id" and v is not None})
+
+        now = datetime.utcnow()
+        operations = []
+        for date_str, metrics in days.items():
+            date = datetime.strptime(date_str, "%Y-%m-%d")
+            if finalized:
+                doc = {"_id": day_key(date), "type": "day", "date": date, **metrics,
+                       "finalized": True, "computed_at": now}
+                operations.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+            else:
+                # Re-sync today's counters with an exact count; writes keep $inc-ing in between
+                await self.db[KPI_COLLECTION].update_one(
+                    {"_id": day_key(date)},
+                    {"$set": {"type": "day", "date": date, **metrics, "finalized": False, "computed_at": now}},
+                    upsert=True
+                )
+        if operations:
+            await self.db[KPI_COLLECTION].bulk_write(operations, ordered=False)
+
+    async def refresh_gauges(self) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        oldest_window = now - timedelta(days=max(ACTIVE_USER_WINDOWS))
+
+        active_facets = {
+            f"{days}d": [{"$match": {"last_login": {"$gte": now - timedelta(days=days)}}}, {"$count": "count"}]
+            for days in ACTIVE_USER_WINDOWS
+        }
+        active_result = await self.db.users.aggregate([
+            {"$match": {"last_login": {"$gte": oldest_window}}},
+            {"$facet": active_facets}
+        ]).to_list(length=1)
+        active_users = {
+            window: (rows[0]["count"] if rows else 0)
+            for window, rows in (active_result[0] if active_result else {}).items()
+        }
+
+        engagement_start = now - timedelta(days=30)
+        engagement = await self.db.users.aggregate([
+            {"$match": {"last_login": {"$gte": engagement_start}}},
+            {"$addFields": {"engagement_score": {"$add": [
+                20,
+                {"$multiply": [{"$size": {"$ifNull": ["$created_listings", []]}}, 10]},
+                {"$multiply": [{"$size": {"$ifNull": ["$purchases", []]}}, 15]}
+            ]}}},
+            {"$group": {
+                "_id": None,
+                "avg_engagement": {"$avg": "$engagement_score"},
+                "high_engagement_users": {"$sum": {"$cond": [{"$gte": ["$engagement_score", 50]}, 1, 0]}}
+            }}
+        ]).to_list(length=1)
+
+        gauges = {
+            "_id": "current",
+            "type": "gauges",
+            "total_users": await self.db.users.estimated_document_count(),
+            "total_listings": await self.db.listings.estimated_document_count(),
+            "total_orders": await self.db.orders.estimated_document_count(),
+            "active_users": active_users,
+            "active_listings": await self.db.listings.count_documents({"status": "active"}),
+            "successful_orders": await self.db.orders.count_documents({"order_status": "confirmed"}),
+            "role_distribution": await self.db.users.aggregate([
+                {"$unwind": "$roles"},
+                {"$group": {"_id": "$roles", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}}
+            ]).to_list(10),
+            "species_distribution": await self.db.listings.aggregate([
+                {"$match": {"status": "active"}},
+                {"$group": {"_id": "$species_name", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}}
+            ]).to_list(10),
+            "region_distribution": await self.db.listings.aggregate([
+                {"$match": {"status": "active"}},
+                {"$group": {"_id": "$region", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}}
+            ]).to_list(20),
+            "engagement": {k: v for k, v in engagement[0].items() if k != "_id"} if engagement else {},
+            "computed_at": now
+        }
+        await self.db[KPI_COLLECTION].replace_one({"_id": "current"}, gauges, upsert=True)
+        return gauges
+
+    # Read side
+
+    async def get_gauges(self) -> Dict[str, Any]:
+        """Latest gauges; computed on the spot the first time if the job has not run yet"""
+        cached = self._cache.get("gauges")
+        if cached is not None:
+            return cached
+        gauges = await self.db[KPI_COLLECTION].find_one({"_id": "current"})
+        if not gauges:
+            gauges = await self.refresh_gauges()
+        self._cache.set("gauges", gauges)
+        return gauges
+
+    async def get_days(self, start: datetime, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Day documents (including today's running counters) from ``start`` onwards"""
+        query: Dict[str, Any] = {"type": "day", "date": {"$gte": day_start(start)}}
+        if end:
+            query["date"]["$lte"] = end
+        return await self.db[KPI_COLLECTION].find(query, {"_id": 0}).sort("date", ASCENDING).to_list(length=None)
+
+    async def get_transaction_days(self, start: datetime, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Live ``{"date", "transactions", "revenue", "platform_fees"}`` per day
+        with at least one completed or paid order, by order creation day
+        """
+        window: Dict[str, Any] = {"$gte": day_start(start)}
+        if end:
+            window["$lt"] = day_start(end) + timedelta(days=1)
+        rows = await self.db.orders.aggregate([
+            {"$match": {"status": {"$in": TRANSACTION_STATUSES}, "created_at": window}},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                "transactions": {"$sum": 1},
+                "revenue": {"$sum": "$total_amount"},
+                "platform_fees": {"$sum": "$platform_fee"},
+            }},
+            {"$sort": {"_id": 1}}
+        ]).to_list(length=None)
+        return [
+            {"date": datetime.strptime(row["_id"], "%Y-%m-%d"),
+             **{field: row.get(field) or 0 for field in TRANSACTION_FIELDS}}
+            for row in rows
+        ]
+
+    async def get_today(self) -> Dict[str, Any]:
+        today = day_start(datetime.utcnow())
+        doc = await self.db[KPI_COLLECTION].find_one({"_id": day_key(today)}, {"_id": 0})
+        return doc or {"type": "day", "date": today, **{field: 0 for field in DAY_FIELDS}}
+
+    async def get_totals(self) -> Dict[str, int]:
+        """Approximate collection totals from collection metadata (no scans)"""
+        cached = self._cache.get("totals")
+        if cached is not None:
+            return cached
+        totals = {
+            "total_users": await self.db.users.estimated_document_count(),
+            "total_listings": await self.db.listings.estimated_document_count(),
+            "total_orders": await self.db.orders.estimated_document_count(),
+        }
+        self._cache.set("totals", totals)
+        return totals
+
+    @staticmethod
+    def sum_days(days: List[Dict[str, Any]], field: str) -> float:
+        return sum(day.get(field) or 0 for day in days)
+
+    @staticmethod
+    def active_users_for(gauges: Dict[str, Any], date_range: int) -> int:
+        """Active users for the smallest stored window covering ``date_range`` days"""
+        active = gauges.get("active_users", {})
+        for days in ACTIVE_USER_WINDOWS:
+            if date_range <= days:
+                return active.get(f"{days}d", 0)
+        return active.get(f"{ACTIVE_USER_WINDOWS[-1]}d", 0)
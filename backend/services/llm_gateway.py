@@ -0,0 +1,302 @@
+"""
+Shared async gateway for every LLM call in the backend.
+
+All services go through one ``LLMGateway`` instead of building their own
+OpenAI clients. The gateway owns a single ``AsyncOpenAI`` client and adds:
+
+* per-model concurrency limits (``LLM_CONCURRENCY="gpt-4=4,gpt-4o-mini=16"``,
+  ``LLM_DEFAULT_CONCURRENCY`` for everything else),
+* a per-attempt timeout (``LLM_TIMEOUT_SECONDS``),
+* retries with exponential backoff and full jitter for timeouts, rate limits
+  and 5xx errors (``LLM_MAX_RETRIES``),
+* per-model call, error, token and latency metrics.
+
+``LLM_BACKEND=stub`` swaps in ``StubLLMBackend``, which answers locally and
+deterministically so the AI paths can run in tests and offline environments.
+Responses keep the OpenAI shape (``response.choices[0].message.content``,
+``response.data[i].embedding``, ``response.usage``) so call sites only change
+which object they call.
+"""
+import os
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+STUB_EMBEDDING_DIMENSIONS = 256
+
+
+class LLMUnavailableError(Exception):
+    """No LLM backend is configured (e.g. missing API key)"""
+
+
+def _parse_concurrency(spec: str) -> Dict[str, int]:
+    limits = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            model, limit = part.split("=", 1)
+            try:
+                limits[model.strip()] = max(1, int(limit))
+            except ValueError:
+                logger.warning(f"Ignoring invalid LLM concurrency setting: {part}")
+    return limits
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    # Connection-level failures from the OpenAI SDK carry no status code
+    return type(error).__name__ in {"APIConnectionError", "APITimeoutError"}
+
+
+class OpenAIBackend:
+    """Thin wrapper over one shared ``AsyncOpenAI`` client"""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY") or os.environ.get("EMERGENT_LLM_KEY")
+        self._client = None
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def client(self):
+        if self._client is None:
+            if not self.api_key:
+                raise LLMUnavailableError("No OpenAI API key configured")
+            from openai import AsyncOpenAI
+            # Retries and timeouts are handled by the gateway
+            self._client = AsyncOpenAI(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    async def chat_completion(self, **params):
+        return await self.client.chat.completions.create(**params)
+
+    async def embeddings(self, **params):
+        return await self.client.embeddings.create(**params)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+class StubLLMBackend:
+    """
+    Offline backend. Chat replies are looked up by substring of the last user
+    message in ``responses`` and otherwise fall back to ``default_content``;
+    embeddings are deterministic unit vectors derived from a hash of the text.
+    """
+
+    name = "stub"
+    available = True
+
+    def __init__(self, default_content: str = "{}", responses: Optional[Dict[str, str]] = None,
+                 dimensions: int = STUB_EMBEDDING_DIMENSIONS):
+        self.default_content = default_content
+        self.responses = dict(responses or {})
+        self.dimensions = dimensions
+        self.calls: List[Dict[str, Any]] = []
+
+    async def chat_completion(self, **params):
+        self.calls.append(params)
+        prompt = self._last_user_text(params.get("messages", []))
+        content = next(
+            (reply for needle, reply in self.responses.items() if needle.lower() in prompt.lower()),
+            self.default_content
+        )
+        prompt_tokens = sum(len(self._text(m.get("content")).split()) for m in params.get("messages", []))
+        completion_tokens = len(content.split())
+        return SimpleNamespace(
+            model=params.get("model"),
+            choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                     message=SimpleNamespace(role="assistant", content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens)
+        )
+
+    async def embeddings(self, **params):
+        self.calls.append(params)
+        inputs = params.get("input")
+        texts = [inputs] if isinstance(inputs, str) else list(inputs or [])
+        tokens = sum(len(str(text).split()) for text in texts)
+        return SimpleNamespace(
+            model=params.get("model"),
+            data=[SimpleNamespace(index=i, embedding=self.embed_text(str(text)).tolist())
+                  for i, text in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens)
+        )
+
+    def embed_text(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(text.strip().lower().encode("utf-8"), digest_size=8).digest(), "big")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    async def close(self):
+        pass
+
+    @staticmethod
+    def _text(content) -> str:
+        if isinstance(content, list):
+            return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return str(content or "")
+
+    def _last_user_text(self, messages: List[Dict[str, Any]]) -> str:
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                return self._text(message.get("content"))
+        return ""
+
+
+class _ModelMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies_ms = deque(maxlen=500)
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 1)
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+        }
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        backend=None,
+        timeout_seconds: float = None,
+        max_retries: int = None,
+        concurrency: Optional[Dict[str, int]] = None,
+        default_concurrency: int = None,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 8.0
+    ):
+        if backend is None:
+            backend = StubLLMBackend() if os.getenv("LLM_BACKEND", "openai").lower() == "stub" else OpenAIBackend()
+        self.backend = backend
+        self.timeout_seconds = timeout_seconds or float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.concurrency = concurrency if concurrency is not None else _parse_concurrency(os.getenv("LLM_CONCURRENCY", ""))
+        self.default_concurrency = default_concurrency or int(os.getenv("LLM_DEFAULT_CONCURRENCY", "8"))
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._metrics: Dict[str, _ModelMetrics] = {}
+
+    @property
+    def available(self) -> bool:
+        return self.backend.available
+
+    async def chat_completion(self, *, model: str, messages: List[Dict[str, Any]],
+                              timeout: Optional[float] = None, **params):
+        """``chat.completions.create`` through the shared limits; returns the OpenAI-shaped response"""
+        return await self._call("chat_completion", timeout, dict(params, model=model, messages=messages))
+
+    async def chat_text(self, *, model: str, messages: List[Dict[str, Any]],
+                        timeout: Optional[float] = None, **params) -> str:
+        """Convenience wrapper returning just the first choice's content"""
+        response = await self.chat_completion(model=model, messages=messages, timeout=timeout, **params)
+        return response.choices[0].message.content or ""
+
+    async def embeddings(self, *, model: str, input, timeout: Optional[float] = None, **params):
+        return await self._call("embeddings", timeout, dict(params, model=model, input=input))
+
+    async def _call(self, method: str, timeout: Optional[float], params: Dict[str, Any]):
+        if not self.backend.available:
+            raise LLMUnavailableError("LLM backend is not configured")
+
+        model = params["model"]
+        metrics = self._metrics.setdefault(model, _ModelMetrics())
+        semaphore = self._semaphore(model)
+        attempt = 0
+        while True:
+            async with semaphore:
+                metrics.calls += 1
+                metrics.in_flight += 1
+                started = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(
+                        getattr(self.backend, method)(**params), timeout=timeout or self.timeout_seconds
+                    )
+                except Exception as e:
+                    metrics.errors += 1
+                    if isinstance(e, asyncio.TimeoutError):
+                        metrics.timeouts += 1
+                    if attempt >= self.max_retries or not _is_retryable(e):
+                        raise
+                    error = e
+                else:
+                    metrics.latencies_ms.append((time.perf_counter() - started) * 1000)
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        metrics.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+                        metrics.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+                    return response
+                finally:
+                    metrics.in_flight -= 1
+
+            # Back off outside the semaphore so waiting retries don't hold a slot
+            attempt += 1
+            metrics.retries += 1
+            delay = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+            logger.warning(f"LLM {method} on {model} failed ({error}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(model)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency.get(model, self.default_concurrency))
+            self._semaphores[model] = semaphore
+        return semaphore
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "available": self.available,
+            "timeout_seconds": self.timeout_seconds,
+            "max_retries": self.max_retries,
+            "models": {model: metrics.snapshot() for model, metrics in self._metrics.items()}
+        }
+
+    async def close(self):
+        await self.backend.close()
+
+
+# Global gateway shared by all AI services
+llm_gateway = LLMGateway()
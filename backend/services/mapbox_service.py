@@ -1,68 +1,293 @@
 import os
+import re
+import asyncio
 import logging
 import httpx
 from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
+from urllib.parse import quote
 import json
 import math
 from enum import Enum
 
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from services.geo import haversine_km, within_radius
+from services.ttl_cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
+GEOCODE_COLLECTION = "geocode_cache"
+LOCATION_NOT_FOUND = "Location not found"
+# Misses are remembered for a day so typos and unknown farms don't hit the API on every request
+NOT_FOUND_TTL_SECONDS = 24 * 3600
+COUNTRY_ALIASES = {"ZA": {"za", "rsa", "south africa"}}
+GEOCODE_BATCH_LIMIT = int(os.getenv("GEOCODE_BATCH_LIMIT", "500"))
+
+
+def normalize_address(location: str, country: str = "ZA") -> str:
+    """
+    Cache key form of an address: lower-cased, punctuation stripped, whitespace
+    collapsed within each comma-separated part, and a trailing country name
+    dropped ("Pretoria,  Gauteng, South Africa" -> "pretoria, gauteng").
+    """
+    text = re.sub(r"[^\w\s,]", " ", (location or "").lower())
+    parts = [" ".join(part.split()) for part in text.split(",")]
+    parts = [part for part in parts if part]
+    aliases = COUNTRY_ALIASES.get((country or "").upper(), {(country or "").lower()})
+    while len(parts) > 1 and parts[-1] in aliases:
+        parts.pop()
+    return ", ".join(parts)
+
+
 class MapboxService:
-    def __init__(self):
-        self.access_token = os.environ.get('MAPBOX_ACCESS_TOKEN')
-        self.base_url = "https://api.mapbox.com"
-        
-    async def geocode_location(
+    def __init__(
         self,
-        location: str,
-        country: str = "ZA"
-    ) -> Dict[str, Any]:
-        """Convert location string to coordinates using Mapbox Geocoding API"""
+        db=None,
+        access_token: str = None,
+        base_url: str = None,
+        geocode_ttl_seconds: float = None,
+        memory_cache_entries: int = None
+    ):
+        self.db = db
+        self.access_token = access_token or os.environ.get('MAPBOX_ACCESS_TOKEN')
+        # MAPBOX_BASE_URL points the service at a local fake server (fake_mapbox_server.py)
+        self.base_url = (base_url or os.environ.get('MAPBOX_BASE_URL', "https://api.mapbox.com")).rstrip("/")
+        
+        # One pooled HTTP client shared by every Mapbox call, created on first use
+        self.timeout = httpx.Timeout(10.0, connect=5.0)
+        self.limits = httpx.Limits(
+            max_keepalive_connections=10,
+            max_connections=int(os.getenv("MAPBOX_MAX_CONNECTIONS", "20"))
+        )
+        self._client: Optional[httpx.AsyncClient] = None
         
+        # Geocodes: in-process LRU in front of the geocode_cache collection
+        self.geocode_ttl_seconds = geocode_ttl_seconds or float(os.getenv("GEOCODE_CACHE_TTL_DAYS", "90")) * 86400
+        self.geocode_concurrency = int(os.getenv("MAPBOX_GEOCODE_CONCURRENCY", "8"))
+        self._geocode_cache = TTLCache(
+            ttl_seconds=min(self.geocode_ttl_seconds, float(os.getenv("GEOCODE_MEMORY_TTL_SECONDS", "86400"))),
+            max_entries=memory_cache_entries or int(os.getenv("GEOCODE_MEMORY_CACHE_ENTRIES", "5000"))
+        )
+        self._geocode_inflight: Dict[str, asyncio.Future] = {}
+        self.geocode_stats = {"db_hits": 0, "api_requests": 0, "api_errors": 0, "coalesced": 0}
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+    
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    @property
+    def geocodes(self):
+        return self.db[GEOCODE_COLLECTION]
+    
+    async def ensure_indexes(self):
+        if self.db is None:
+            return
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"{self.base_url}/geocoding/v5/mapbox.places/{location}.json"
-                params = {
-                    "access_token": self.access_token,
-                    "country": country,
-                    "types": "place,locality,neighborhood,address",
-                    "limit": 1
-                }
-                
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("features"):
-                    feature = data["features"][0]
-                    coordinates = feature["geometry"]["coordinates"]
-                    
-                    return {
-                        "success": True,
-                        "longitude": coordinates[0],
-                        "latitude": coordinates[1],
-                        "place_name": feature.get("place_name"),
-                        "formatted_address": feature.get("text"),
-                        "context": feature.get("context", []),
-                        "bbox": feature.get("bbox"),
-                        "geocoded_at": datetime.now(timezone.utc).isoformat()
-                    }
+            await self.geocodes.create_indexes([
+                IndexModel([("key", ASCENDING)], name="geocode_key", unique=True),
+                IndexModel([("expires_at", ASCENDING)], name="geocode_expires_ttl", expireAfterSeconds=0),
+            ])
+        except Exception as e:
+            logger.warning(f"Could not create geocode cache indexes: {e}")
+    
+    @staticmethod
+    def _geocode_key(location: str, country: str) -> str:
+        return f"{(country or '').upper()}:{normalize_address(location, country)}"
+    
+    @staticmethod
+    def _geocode_error(error: str) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": error,
+            "geocoded_at": datetime.now(timezone.utc).isoformat()
+        }
+    
+    def _cache_ttl(self, result: Dict[str, Any]) -> Optional[float]:
+        """How long a geocode result may be reused; ``None`` for transient failures"""
+        if result.get("success"):
+            return self.geocode_ttl_seconds
+        if result.get("error") == LOCATION_NOT_FOUND:
+            return min(NOT_FOUND_TTL_SECONDS, self.geocode_ttl_seconds)
+        return None
+    
+    def _remember(self, key: str, result: Dict[str, Any]):
+        ttl = self._cache_ttl(result)
+        if ttl is not None:
+            self._geocode_cache.set(key, result, ttl_seconds=min(ttl, self._geocode_cache.ttl_seconds))
+    
+    async def _load_stored_geocodes(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        if self.db is None or not keys:
+            return {}
+        try:
+            cursor = self.geocodes.find(
+                {"key": {"$in": keys}, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"_id": 0, "key": 1, "result": 1}
+            )
+            stored = {doc["key"]: doc["result"] async for doc in cursor}
+            self.geocode_stats["db_hits"] += len(stored)
+            return stored
+        except Exception as e:
+            logger.warning(f"Geocode cache read failed: {e}")
+            return {}
+    
+    async def _store_geocodes(self, entries: List[Tuple[str, str, str, Dict[str, Any]]]):
+        """Persist ``(key, location, country, result)`` entries that are worth reusing"""
+        if self.db is None:
+            return
+        now = datetime.now(timezone.utc)
+        operations = []
+        for key, location, country, result in entries:
+            ttl = self._cache_ttl(result)
+            if ttl is None:
+                continue
+            operations.append(UpdateOne(
+                {"key": key},
+                {"$set": {"key": key, "query": location, "country": country, "result": result,
+                          "created_at": now, "expires_at": now + timedelta(seconds=ttl)}},
+                upsert=True
+            ))
+        if not operations:
+            return
+        try:
+            await self.geocodes.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.warning(f"Geocode cache write failed: {e}")
+    
+    async def _fetch_geocode(self, location: str, country: str) -> Dict[str, Any]:
+        """One Mapbox Geocoding API request"""
+        
+        self.geocode_stats["api_requests"] += 1
+        try:
+            client = self._get_client()
+            url = f"{self.base_url}/geocoding/v5/mapbox.places/{quote(location.strip(), safe='')}.json"
+            params = {
+                "access_token": self.access_token,
+                "country": country,
+                "types": "place,locality,neighborhood,address",
+                "limit": 1
+            }
+            
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            
+            if data.get("features"):
+                feature = data["features"][0]
+                coordinates = feature["geometry"]["coordinates"]
                 
                 return {
-                    "success": False,
-                    "error": "Location not found",
+                    "success": True,
+                    "longitude": coordinates[0],
+                    "latitude": coordinates[1],
+                    "place_name": feature.get("place_name"),
+                    "formatted_address": feature.get("text"),
+                    "context": feature.get("context", []),
+                    "bbox": feature.get("bbox"),
                     "geocoded_at": datetime.now(timezone.utc).isoformat()
                 }
-                
+            
+            return self._geocode_error(LOCATION_NOT_FOUND)
+            
         except Exception as e:
+            self.geocode_stats["api_errors"] += 1
             logger.error(f"Geocoding failed for {location}: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "geocoded_at": datetime.now(timezone.utc).isoformat()
-            }
+            return self._geocode_error(str(e))
+    
+    async def geocode_location(
+        self,
+        location: str,
+        country: str = "ZA"
+    ) -> Dict[str, Any]:
+        """
+        Convert location string to coordinates using Mapbox Geocoding API.
+        Results are cached by normalised address in memory and in Mongo, and
+        concurrent lookups of the same address share one API request.
+        """
+        
+        if not normalize_address(location, country):
+            return self._geocode_error("Location is required")
+        
+        key = self._geocode_key(location, country)
+        cached = self._geocode_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+        
+        pending = self._geocode_inflight.get(key)
+        if pending is not None:
+            self.geocode_stats["coalesced"] += 1
+            return dict(await asyncio.shield(pending))
+        
+        future = asyncio.get_running_loop().create_future()
+        self._geocode_inflight[key] = future
+        try:
+            result = (await self._load_stored_geocodes([key])).get(key)
+            if result is None:
+                result = await self._fetch_geocode(location, country)
+                await self._store_geocodes([(key, location, country, result)])
+            self._remember(key, result)
+            future.set_result(result)
+            return dict(result)
+        finally:
+            self._geocode_inflight.pop(key, None)
+            if not future.done():
+                future.set_result(self._geocode_error("Geocoding interrupted"))
+    
+    async def geocode_many(
+        self,
+        locations: List[str],
+        country: str = "ZA"
+    ) -> List[Dict[str, Any]]:
+        """
+        Geocode a batch of locations (bulk imports). Each distinct normalised
+        address is resolved once: memory first, then a single Mongo ``$in``
+        lookup, then Mapbox with at most ``geocode_concurrency`` requests in
+        flight. Results line up with ``locations``.
+        """
+        
+        keys = [self._geocode_key(location, country) for location in locations]
+        results: Dict[str, Dict[str, Any]] = {}
+        missing: Dict[str, str] = {}
+        
+        for location, key in zip(locations, keys):
+            if key in results or key in missing:
+                continue
+            if not normalize_address(location, country):
+                results[key] = self._geocode_error("Location is required")
+                continue
+            cached = self._geocode_cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                missing[key] = location
+        
+        stored = await self._load_stored_geocodes(list(missing))
+        for key, result in stored.items():
+            results[key] = result
+            self._remember(key, result)
+            del missing[key]
+        
+        semaphore = asyncio.Semaphore(self.geocode_concurrency)
+        
+        async def fetch(key: str, location: str):
+            async with semaphore:
+                results[key] = await self._fetch_geocode(location, country)
+            self._remember(key, results[key])
+        
+        if missing:
+            await asyncio.gather(*(fetch(key, location) for key, location in missing.items()))
+            await self._store_geocodes([(key, location, country, results[key]) for key, location in missing.items()])
+        
+        return [dict(results[key]) for key in keys]
+    
+    def get_geocode_cache_metrics(self) -> Dict[str, Any]:
+        return {**self._geocode_cache.get_metrics(), **self.geocode_stats}
     
     async def calculate_distance_matrix(
         self,
@@ -76,27 +301,27 @@ class MapboxService:
             origin_coords = ";".join([f"{lng},{lat}" for lng, lat in origins])
             dest_coords = ";".join([f"{lng},{lat}" for lng, lat in destinations])
             
-            async with httpx.AsyncClient() as client:
-                url = f"{self.base_url}/directions-matrix/v1/mapbox/driving/{origin_coords};{dest_coords}"
-                params = {
-                    "access_token": self.access_token,
-                    "sources": ";".join([str(i) for i in range(len(origins))]),
-                    "destinations": ";".join([str(i + len(origins)) for i in range(len(destinations))])
-                }
-                
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                return {
-                    "success": True,
-                    "distances": data.get("distances", []),  # in meters
-                    "durations": data.get("durations", []),  # in seconds
-                    "sources": data.get("sources", []),
-                    "destinations": data.get("destinations", []),
-                    "calculated_at": datetime.now(timezone.utc).isoformat()
-                }
-                
+            client = self._get_client()
+            url = f"{self.base_url}/directions-matrix/v1/mapbox/driving/{origin_coords};{dest_coords}"
+            params = {
+                "access_token": self.access_token,
+                "sources": ";".join([str(i) for i in range(len(origins))]),
+                "destinations": ";".join([str(i + len(origins)) for i in range(len(destinations))])
+            }
+            
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            
+            return {
+                "success": True,
+                "distances": data.get("distances", []),  # in meters
+                "durations": data.get("durations", []),  # in seconds
+                "sources": data.get("sources", []),
+                "destinations": data.get("destinations", []),
+                "calculated_at": datetime.now(timezone.utc).isoformat()
+            }
+            
         except Exception as e:
             logger.error(f"Distance matrix calculation failed: {e}")
             return {
@@ -116,36 +341,36 @@ class MapboxService:
             seller_lng, seller_lat = seller_location
             buyer_lng, buyer_lat = buyer_location
             
-            async with httpx.AsyncClient() as client:
-                url = f"{self.base_url}/directions/v5/mapbox/driving/{seller_lng},{seller_lat};{buyer_lng},{buyer_lat}"
-                params = {
-                    "access_token": self.access_token,
-                    "geometries": "geojson",
-                    "overview": "simplified"
-                }
-                
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("routes"):
-                    route = data["routes"][0]
-                    
-                    return {
-                        "success": True,
-                        "distance_km": round(route["distance"] / 1000, 2),
-                        "duration_minutes": round(route["duration"] / 60, 1),
-                        "geometry": route["geometry"],
-                        "estimated_cost": self._estimate_delivery_cost(route["distance"] / 1000),
-                        "calculated_at": datetime.now(timezone.utc).isoformat()
-                    }
+            client = self._get_client()
+            url = f"{self.base_url}/directions/v5/mapbox/driving/{seller_lng},{seller_lat};{buyer_lng},{buyer_lat}"
+            params = {
+                "access_token": self.access_token,
+                "geometries": "geojson",
+                "overview": "simplified"
+            }
+            
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            
+            if data.get("routes"):
+                route = data["routes"][0]
                 
                 return {
-                    "success": False,
-                    "error": "No route found",
+                    "success": True,
+                    "distance_km": round(route["distance"] / 1000, 2),
+                    "duration_minutes": round(route["duration"] / 60, 1),
+                    "geometry": route["geometry"],
+                    "estimated_cost": self._estimate_delivery_cost(route["distance"] / 1000),
                     "calculated_at": datetime.now(timezone.utc).isoformat()
                 }
-                
+            
+            return {
+                "success": False,
+                "error": "No route found",
+                "calculated_at": datetime.now(timezone.utc).isoformat()
+            }
+            
         except Exception as e:
             logger.error(f"Delivery distance calculation failed: {e}")
             return {
@@ -188,10 +413,10 @@ class MapboxService:
         
         try:
             center_lng, center_lat = center_location
-            nearby_requests = []
             
+            # Requests with coordinates (assuming they're geocoded)
+            located = []
             for request in buy_requests:
-                # Get coordinates from request (assuming they're geocoded)
                 req_coords = request.get('coordinates')
                 if not req_coords:
                     continue
@@ -199,20 +424,22 @@ class MapboxService:
                 req_lng, req_lat = req_coords.get('longitude'), req_coords.get('latitude')
                 if not req_lng or not req_lat:
                     continue
-                
-                # Calculate distance using haversine formula
-                distance = self._haversine_distance(
-                    center_lat, center_lng,
-                    req_lat, req_lng
-                )
-                
-                if distance <= radius_km:
-                    request_copy = request.copy()
-                    request_copy['distance_km'] = round(distance, 2)
-                    nearby_requests.append(request_copy)
+                located.append((request, req_lat, req_lng))
+            
+            if not located:
+                return []
             
-            # Sort by distance
-            nearby_requests.sort(key=lambda x: x['distance_km'])
+            # Bounding-box prefilter, then haversine on the remaining candidates; nearest first
+            indices, distances = within_radius(
+                center_lat, center_lng, radius_km,
+                [lat for _, lat, _ in located], [lng for _, _, lng in located]
+            )
+            
+            nearby_requests = []
+            for index, distance in zip(indices, distances):
+                request_copy = located[index][0].copy()
+                request_copy['distance_km'] = round(float(distance), 2)
+                nearby_requests.append(request_copy)
             
             return nearby_requests
             
@@ -220,23 +447,6 @@ class MapboxService:
             logger.error(f"Nearby requests search failed: {e}")
             return []
     
-    def _haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calculate haversine distance between two points in kilometers"""
-        
-        # Convert latitude and longitude from degrees to radians
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        # Radius of earth in kilometers
-        r = 6371
-        
-        return c * r
-    
     async def optimize_delivery_route(
         self,
         depot: Tuple[float, float],
@@ -253,39 +463,39 @@ class MapboxService:
             
             coords_str = ";".join([f"{lng},{lat}" for lng, lat in all_points])
             
-            async with httpx.AsyncClient() as client:
-                url = f"{self.base_url}/optimized-trips/v1/mapbox/driving/{coords_str}"
-                params = {
-                    "access_token": self.access_token,
-                    "source": "first",
-                    "destination": "last" if return_to_depot else "any",
-                    "roundtrip": return_to_depot,
-                    "geometries": "geojson"
-                }
-                
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("trips"):
-                    trip = data["trips"][0]
-                    
-                    return {
-                        "success": True,
-                        "total_distance_km": round(trip["distance"] / 1000, 2),
-                        "total_duration_minutes": round(trip["duration"] / 60, 1),
-                        "geometry": trip["geometry"],
-                        "waypoint_order": [wp["waypoint_index"] for wp in trip["legs"]],
-                        "estimated_cost": self._estimate_delivery_cost(trip["distance"] / 1000),
-                        "optimized_at": datetime.now(timezone.utc).isoformat()
-                    }
+            client = self._get_client()
+            url = f"{self.base_url}/optimized-trips/v1/mapbox/driving/{coords_str}"
+            params = {
+                "access_token": self.access_token,
+                "source": "first",
+                "destination": "last" if return_to_depot else "any",
+                "roundtrip": return_to_depot,
+                "geometries": "geojson"
+            }
+            
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            
+            if data.get("trips"):
+                trip = data["trips"][0]
                 
                 return {
-                    "success": False,
-                    "error": "No optimized route found",
+                    "success": True,
+                    "total_distance_km": round(trip["distance"] / 1000, 2),
+                    "total_duration_minutes": round(trip["duration"] / 60, 1),
+                    "geometry": trip["geometry"],
+                    "waypoint_order": [wp["waypoint_index"] for wp in trip["legs"]],
+                    "estimated_cost": self._estimate_delivery_cost(trip["distance"] / 1000),
                     "optimized_at": datetime.now(timezone.utc).isoformat()
                 }
-                
+            
+            return {
+                "success": False,
+                "error": "No optimized route found",
+                "optimized_at": datetime.now(timezone.utc).isoformat()
+            }
+            
         except Exception as e:
             logger.error(f"Route optimization failed: {e}")
             return {
@@ -364,7 +574,7 @@ class MapboxService:
                 center = geofence["properties"]["center"]
                 radius_km = geofence["properties"]["radius_km"]
                 
-                distance = self._haversine_distance(
+                distance = haversine_km(
                     point_lat, point_lng,
                     center[1], center[0]
                 )
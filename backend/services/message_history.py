@@ -0,0 +1,99 @@
+"""
+Message history pages and read pointers shared by the unified inbox and
+real-time chat.
+
+Pages are keyset pages on ``(sent_at, id)`` - ``created_at``/``id`` for inbox
+messages, ``timestamp``/``_id`` for chat messages - served by a compound index
+on ``(conversation_id, sent_at, id)``, so the 200th page of a long
+conversation costs the same as the first. The opaque cursor carries the last
+message's ``(sent_at, id)``; a page is fetched with one extra row to tell
+whether another exists.
+
+Read receipts are no longer pushed onto every message. Each conversation keeps
+one last-read timestamp per participant, and a message counts as read by a
+user once it is no newer than their pointer. Pointers only move forward
+(``$max``). Pages leave out the legacy ``read_by``/``delivered_to`` arrays
+that older messages still carry.
+"""
+import json
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, IndexModel
+
+HEAVY_MESSAGE_FIELDS = {"read_by": 0, "delivered_to": 0}
+MAX_MESSAGE_PAGE_SIZE = 200
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def message_history_index(time_field: str, id_field: str, name: str) -> IndexModel:
+    """Index behind ``fetch_page`` (either direction) for one message shape"""
+    return IndexModel([("conversation_id", ASCENDING), (time_field, ASCENDING), (id_field, ASCENDING)], name=name)
+
+
+def encode_message_cursor(sent_at: datetime, message_id: str) -> str:
+    payload = json.dumps({"at": sent_at.isoformat(), "id": message_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_message_cursor(cursor: str) -> Tuple[datetime, str]:
+    """``(sent_at, message_id)`` of an ``encode_message_cursor`` string"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["at"]), str(payload["id"])
+    except Exception as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}")
+
+
+async def fetch_page(
+    collection,
+    match: Dict[str, Any],
+    time_field: str,
+    id_field: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    newest_first: bool = False,
+    skip: int = 0,
+    projection: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    One keyset page of messages in chronological order: ``{"items",
+    "next_cursor", "has_more"}``. With ``newest_first`` the page is the newest
+    ``limit`` messages (older than the cursor), otherwise the oldest (newer
+    than the cursor). Pass ``next_cursor`` back to continue the same way;
+    ``skip`` is for callers that still page by offset.
+    """
+    query = dict(match)
+    if cursor:
+        sent_at, message_id = decode_message_cursor(cursor)
+        beyond = "$lt" if newest_first else "$gt"
+        query["$or"] = [
+            {time_field: {beyond: sent_at}},
+            {time_field: sent_at, id_field: {beyond: message_id}},
+        ]
+
+    direction = -1 if newest_first else 1
+    rows: List[Dict[str, Any]] = await collection.find(
+        query, {**HEAVY_MESSAGE_FIELDS, **(projection or {})}
+    ).sort([(time_field, direction), (id_field, direction)]).skip(skip).limit(limit + 1).to_list(length=limit + 1)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_message_cursor(rows[-1][time_field], rows[-1][id_field]) if has_more else None
+    if newest_first:
+        rows.reverse()
+
+    return {"items": rows, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def is_read(pointer: Optional[datetime], sent_at: Optional[datetime]) -> bool:
+    """Whether a message sent at ``sent_at`` is covered by a last-read pointer"""
+    if pointer is None or sent_at is None:
+        return False
+    # Mongo hands back naive UTC; drop tzinfo from values that never left the process
+    return sent_at.replace(tzinfo=None) <= pointer.replace(tzinfo=None)
@@ -1,6 +1,5 @@
 import os
 import logging
-import openai
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Optional, Any, Tuple
@@ -17,14 +16,14 @@ import base64
 from PIL import Image
 import io
 
+from services.llm_gateway import llm_gateway
+
 logger = logging.getLogger(__name__)
 
 class MLEngineService:
     def __init__(self, db):
         self.db = db
-        self.openai_client = openai.OpenAI(
-            api_key=os.environ.get('OPENAI_API_KEY')
-        )
+        self.llm = llm_gateway
         
         # Model storage paths
         self.models_dir = '/app/backend/models/ml_engine'
@@ -213,7 +212,7 @@ class MLEngineService:
             Based on South African livestock market conditions, analyze pricing factors and provide insights.
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {
@@ -991,7 +990,7 @@ class MLEngineService:
             provide a demand forecast with confidence levels and key factors.
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {
@@ -1631,7 +1630,7 @@ class MLEngineService:
             Based on this South African livestock market data, provide strategic insights and recommendations.
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {
@@ -1691,7 +1690,7 @@ class MLEngineService:
             Provide strategic insights on these market trends for livestock traders and farmers.
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {
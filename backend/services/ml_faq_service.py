@@ -1,6 +1,5 @@
-import os
+import time
 import logging
-import openai
 import numpy as np
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timezone, timedelta
@@ -13,17 +12,25 @@ import uuid
 from collections import Counter
 from .website_info_fetcher import WebsiteInfoFetcher
 
+from services.llm_gateway import llm_gateway
+from services.semantic_response_cache import faq_response_cache
+from services.faq_vector_index import FAQVectorIndex
+
 logger = logging.getLogger(__name__)
 
+FAQ_CACHE_NAMESPACE = "ml_faq"
+# Answers worth reusing; fallbacks are cheap and should be retried
+CACHEABLE_SOURCES = {"enhanced_local_knowledge", "openai_filtered"}
+
 class MLFAQService:
     def __init__(self, db):
         self.db = db
-        self.openai_client = openai.OpenAI(
-            api_key=os.environ.get('OPENAI_API_KEY')
-        )
+        self.llm = llm_gateway
         self.embedding_model = "text-embedding-3-large"
         self.vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
         self.website_fetcher = WebsiteInfoFetcher()
+        self.vector_index = FAQVectorIndex(db)
+        faq_response_cache.bind_knowledge_source(db)
         
     async def ingest_questions_from_sources(self) -> Dict[str, Any]:
         """Ingest and process questions from multiple sources"""
@@ -406,7 +413,7 @@ class MLFAQService:
         """Generate embeddings for texts using OpenAI"""
         
         try:
-            response = self.openai_client.embeddings.create(
+            response = await self.llm.embeddings(
                 model=self.embedding_model,
                 input=texts
             )
@@ -448,7 +455,7 @@ Provide a JSON response with:
 - has_existing_answer: true if this is covered in standard FAQ/documentation
 """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "You are analyzing customer support questions for a livestock marketplace. Respond with valid JSON."},
@@ -595,7 +602,7 @@ Generate a JSON response with:
 Make the answer helpful, accurate, and specific to livestock marketplace context.
 """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant for a livestock marketplace. Generate accurate FAQ answers based on the knowledge base."},
@@ -630,30 +637,15 @@ Make the answer helpful, accurate, and specific to livestock marketplace context
         """Search FAQ using semantic similarity"""
         
         try:
-            # Get published FAQ entries
-            cursor = self.db.faq_entries.find({"status": "published"})
-            faq_entries = await cursor.to_list(length=None)
-            
-            if not faq_entries:
+            # Published entries live in the vector index; it reloads when they change
+            await self.vector_index.ensure_fresh()
+            if not self.vector_index.size:
                 return []
             
             # Generate query embedding
             query_embedding = await self._generate_embeddings([query])
-            query_vector = query_embedding[0]
-            
-            # Calculate similarities
-            results = []
-            for entry in faq_entries:
-                entry_embedding = entry.get("embedding")
-                if entry_embedding:
-                    similarity = cosine_similarity([query_vector], [entry_embedding])[0][0]
-                    results.append({
-                        "entry": entry,
-                        "similarity": float(similarity)
-                    })
             
-            # Sort by similarity and return top results
-            results.sort(key=lambda x: x["similarity"], reverse=True)
+            results = self.vector_index.search(query_embedding[0], limit=limit, min_similarity=0.7)
             
             return [
                 {
@@ -664,8 +656,7 @@ Make the answer helpful, accurate, and specific to livestock marketplace context
                     "similarity": r["similarity"],
                     "keywords": r["entry"].get("keywords", [])
                 }
-                for r in results[:limit]
-                if r["similarity"] > 0.7  # Minimum similarity threshold
+                for r in results
             ]
             
         except Exception as e:
@@ -707,6 +698,27 @@ Make the answer helpful, accurate, and specific to livestock marketplace context
             return False
 
     async def get_ai_response(self, question: str, context: List[dict] = None) -> Dict[str, Any]:
+        """
+        Get AI-powered response, served from the semantic response cache when
+        a near-duplicate question was answered recently
+        """
+        if context:
+            # Conversation-specific answers are not reusable
+            return await self._answer_question(question, context)
+        
+        started = time.perf_counter()
+        cached, embedding = await faq_response_cache.lookup(question, FAQ_CACHE_NAMESPACE)
+        if cached is not None:
+            faq_response_cache.record_latency(True, (time.perf_counter() - started) * 1000)
+            return {**cached, "cached": True, "timestamp": datetime.now(timezone.utc).isoformat()}
+        
+        result = await self._answer_question(question, context)
+        if result.get("source") in CACHEABLE_SOURCES:
+            await faq_response_cache.store(question, result, FAQ_CACHE_NAMESPACE, embedding)
+        faq_response_cache.record_latency(False, (time.perf_counter() - started) * 1000)
+        return result
+
+    async def _answer_question(self, question: str, context: List[dict] = None) -> Dict[str, Any]:
         """
         Get AI-powered response with enhanced local knowledge prioritized
         """
@@ -761,7 +773,7 @@ Output Style:
                 }
 
             # SECOND: Try OpenAI only for complex questions not covered locally
-            if hasattr(self, 'openai_client') and self.openai_client:
+            if self.llm.available:
                 try:
                     # Add few-shot examples to train the model
                     messages = [
@@ -775,7 +787,7 @@ Output Style:
                         {"role": "user", "content": f"StockLot covers ALL livestock including Aquaculture (fish), Game Animals (kudu, eland), Poultry, Ruminants, and Small Livestock. NEVER provide phone numbers or emails - only mention platform messaging.\n\nQuestion: {question}{context if context else ''}"}
                     ]
 
-                    response = await self.openai_client.chat.completions.create(
+                    response = await self.llm.chat_completion(
                         model="gpt-4o-mini",  # Cost-effective model
                         messages=messages,
                         max_tokens=250,
@@ -1152,6 +1164,7 @@ For more detailed information and the latest updates, check our blog or use in-a
             }
             
             await self.db.faq_learning.insert_one(learning_record)
+            faq_response_cache.invalidate()
             
             logger.info(f"Website content learning completed: {len(learning_data['categories_learned'])} categories, {len(learning_data['species_learned'])} species")
             
@@ -1222,6 +1235,7 @@ For more detailed information and the latest updates, check our blog or use in-a
             }
             
             await self.db.faq_learning.insert_one(learning_record)
+            faq_response_cache.invalidate()
             
             logger.info(f"Blog content learning completed: {len(posts)} posts processed, {len(learning_data['topics_learned'])} topics learned")
             
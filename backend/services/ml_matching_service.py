@@ -11,7 +11,7 @@ import joblib
 import pandas as pd
 import json
 import uuid
-from geopy.distance import geodesic
+from services.geo import haversine_km, distances_from
 
 logger = logging.getLogger(__name__)
 
@@ -71,9 +71,10 @@ class MLMatchingService:
             # Extract features for each request
             features_list = []
             request_data = []
+            distances = self._request_distances(requests, seller)
             
-            for request in requests:
-                features = await self._extract_features(request, seller, seller_history)
+            for request, distance_km in zip(requests, distances):
+                features = await self._extract_features(request, seller, seller_history, distance_km)
                 if features:
                     features_list.append(features)
                     request_data.append(request)
@@ -109,13 +110,15 @@ class MLMatchingService:
         self, 
         request: Dict[str, Any], 
         seller: Dict[str, Any],
-        seller_history: Dict[str, Any]
+        seller_history: Dict[str, Any],
+        distance_km: Optional[float] = None
     ) -> Optional[Dict[str, Any]]:
         """Extract ML features from request and seller data"""
         
         try:
-            # 1. Distance calculation
-            distance_km = await self._calculate_distance(request, seller)
+            # 1. Distance calculation (precomputed for the whole batch when coordinates are known)
+            if distance_km is None:
+                distance_km = await self._calculate_distance(request, seller)
             
             # 2. Species match score
             species_match = self._calculate_species_match(request, seller)
@@ -155,6 +158,42 @@ class MLMatchingService:
             logger.error(f"Feature extraction failed: {e}")
             return None
     
+    def _request_distances(
+        self,
+        requests: List[Dict[str, Any]],
+        seller: Dict[str, Any]
+    ) -> List[Optional[float]]:
+        """
+        Capped seller distances for every request with coordinates, computed in
+        one vectorised pass. ``None`` entries fall back to _calculate_distance.
+        """
+        distances: List[Optional[float]] = [None] * len(requests)
+        try:
+            seller_coords = (seller.get('location_data') or {}).get('coordinates')
+            if not seller_coords:
+                return distances
+            
+            positions, lats, lngs = [], [], []
+            for i, request in enumerate(requests):
+                coords = (request.get('location_data') or {}).get('coordinates')
+                if coords:
+                    positions.append(i)
+                    lats.append(coords['latitude'])
+                    lngs.append(coords['longitude'])
+            
+            if positions:
+                computed = np.minimum(
+                    distances_from(seller_coords['latitude'], seller_coords['longitude'], lats, lngs),
+                    1000  # Cap at 1000km
+                )
+                for i, distance in zip(positions, computed.tolist()):
+                    distances[i] = distance
+        except Exception as e:
+            logger.error(f"Batch distance calculation failed: {e}")
+            return [None] * len(requests)
+        
+        return distances
+    
     async def _calculate_distance(
         self, 
         request: Dict[str, Any], 
@@ -170,7 +209,7 @@ class MLMatchingService:
             if buyer_coords and seller_coords:
                 buyer_location = (buyer_coords['latitude'], buyer_coords['longitude'])
                 seller_location = (seller_coords['latitude'], seller_coords['longitude'])
-                distance = geodesic(buyer_location, seller_location).kilometers
+                distance = haversine_km(*buyer_location, *seller_location)
                 return min(distance, 1000)  # Cap at 1000km
             
             # Fallback: province-based rough distance
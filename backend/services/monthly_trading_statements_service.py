@@ -1,330 +1,463 @@
+"""
+Monthly trading statements for buyers and sellers.
+
+Totals and the daily/species/seller breakdowns are computed server-side by a
+single ``$facet`` aggregation over the month's completed orders; order lines
+are read with a projected cursor. Statements for closed months are persisted
+as immutable snapshots in ``trading_statement_snapshots`` and served from
+there; a late adjustment to an order in a closed month (refund, escrow
+release) marks the affected snapshots stale so the next read recomputes them
+as a new revision. CSV and PDF exports stream order lines straight from the
+cursor instead of building the statement in memory.
+"""
+import os
+import io
+import csv
+import logging
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Any, Optional
 from decimal import Decimal
-import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson.decimal128 import Decimal128
+from pymongo import ASCENDING, IndexModel
 from pymongo.database import Database
+from pymongo.errors import DocumentTooLarge
+
+from services.streaming_pdf import StreamingPDFWriter
 
 logger = logging.getLogger(__name__)
 
+SNAPSHOT_COLLECTION = "trading_statement_snapshots"
+EXPORT_BATCH_SIZE = 500
+
+# Order fields read for statement lines
+ORDER_LINE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "completed_at": 1,
+    "buyer_name": 1,
+    "seller_name": 1,
+    "species_name": 1,
+    "quantity": 1,
+    "unit_price": 1,
+    "merchandise_total": 1,
+    "delivery_cost": 1,
+    "platform_fee": 1,
+}
+
+DETAIL_COLUMNS = {
+    "seller": ["order_id", "date", "buyer_name", "species", "quantity", "unit_price",
+               "merchandise_total", "delivery_cost", "platform_fee"],
+    "buyer": ["order_id", "date", "seller_name", "species", "quantity", "unit_price",
+              "merchandise_total", "delivery_cost", "platform_fee", "grand_total"],
+}
+
+
+def month_range(year: int, month: int) -> Tuple[datetime, datetime]:
+    start_date = datetime(year, month, 1, tzinfo=timezone.utc)
+    if month == 12:
+        end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        end_date = datetime(year, month + 1, 1, tzinfo=timezone.utc)
+    return start_date, end_date
+
+
+def snapshot_id(statement_type: str, user_id: str, year: int, month: int) -> str:
+    return f"{statement_type}:{user_id}:{year:04d}-{month:02d}"
+
+
+def _money(field: str) -> Dict[str, Any]:
+    return {"$toDecimal": {"$ifNull": [f"${field}", 0]}}
+
+
+def _decimal(value) -> Decimal:
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return Decimal(str(value or 0))
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value
+
+
 class MonthlyTradingStatementsService:
     """Service for generating monthly trading statements for buyers and sellers"""
-    
-    def __init__(self, db: Database):
+
+    def __init__(self, db: Database, close_grace_hours: float = None):
         self.db = db
-        
+        # A month is final once this long has passed after its last day
+        self.close_grace = timedelta(hours=close_grace_hours if close_grace_hours is not None
+                                     else float(os.getenv("STATEMENT_CLOSE_GRACE_HOURS", "24")))
+
+    async def ensure_indexes(self):
+        try:
+            await self.db.orders.create_indexes([
+                IndexModel([("seller_id", ASCENDING), ("status", ASCENDING), ("completed_at", ASCENDING)],
+                           name="orders_seller_status_completed"),
+                IndexModel([("buyer_id", ASCENDING), ("status", ASCENDING), ("completed_at", ASCENDING)],
+                           name="orders_buyer_status_completed"),
+            ])
+            await self.db[SNAPSHOT_COLLECTION].create_indexes([
+                IndexModel([("user_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)],
+                           name="statement_snapshots_user_period")
+            ])
+        except Exception as e:
+            logger.warning(f"Could not create trading statement indexes: {e}")
+
     async def get_seller_monthly_statement(self, seller_id: str, year: int, month: int) -> Dict[str, Any]:
         """Generate monthly trading statement for seller"""
         try:
-            # Define date range for the month
-            start_date = datetime(year, month, 1, tzinfo=timezone.utc)
-            if month == 12:
-                end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
-            else:
-                end_date = datetime(year, month + 1, 1, tzinfo=timezone.utc)
-            
-            # Get completed orders for the seller in this month
-            orders_cursor = self.db.orders.find({
-                "seller_id": seller_id,
-                "status": "completed",
-                "completed_at": {
-                    "$gte": start_date,
-                    "$lt": end_date
-                }
-            })
-            orders = await orders_cursor.to_list(length=None)
-            
-            # Calculate revenue metrics
-            total_revenue = Decimal('0')
-            total_orders = len(orders)
-            total_quantity_sold = 0
-            platform_fees = Decimal('0')
-            delivery_earnings = Decimal('0')
-            net_earnings = Decimal('0')
-            
-            order_details = []
-            species_breakdown = {}
-            daily_sales = {}
-            
-            for order in orders:
-                order_date = order.get("completed_at", order.get("created_at"))
-                if isinstance(order_date, str):
-                    order_date = datetime.fromisoformat(order_date.replace('Z', '+00:00'))
-                
-                day_key = order_date.strftime('%Y-%m-%d')
-                
-                # Order totals
-                merchandise_total = Decimal(str(order.get("merchandise_total", 0)))
-                delivery_cost = Decimal(str(order.get("delivery_cost", 0)))
-                platform_fee = Decimal(str(order.get("platform_fee", 0)))
-                
-                total_revenue += merchandise_total
-                delivery_earnings += delivery_cost
-                platform_fees += platform_fee
-                total_quantity_sold += order.get("quantity", 0)
-                
-                # Daily breakdown
-                if day_key not in daily_sales:
-                    daily_sales[day_key] = {
-                        "orders": 0,
-                        "revenue": Decimal('0'),
-                        "quantity": 0
-                    }
-                
-                daily_sales[day_key]["orders"] += 1
-                daily_sales[day_key]["revenue"] += merchandise_total
-                daily_sales[day_key]["quantity"] += order.get("quantity", 0)
-                
-                # Species breakdown
-                species_name = order.get("species_name", "Unknown")
-                if species_name not in species_breakdown:
-                    species_breakdown[species_name] = {
-                        "orders": 0,
-                        "revenue": Decimal('0'),
-                        "quantity": 0
-                    }
-                
-                species_breakdown[species_name]["orders"] += 1
-                species_breakdown[species_name]["revenue"] += merchandise_total
-                species_breakdown[species_name]["quantity"] += order.get("quantity", 0)
-                
-                # Order detail
-                order_details.append({
-                    "order_id": order.get("id"),
-                    "date": order_date.strftime('%Y-%m-%d'),
-                    "buyer_name": order.get("buyer_name", "Anonymous"),
-                    "species": species_name,
-                    "quantity": order.get("quantity", 0),
-                    "unit_price": float(order.get("unit_price", 0)),
-                    "merchandise_total": float(merchandise_total),
-                    "delivery_cost": float(delivery_cost),
-                    "platform_fee": float(platform_fee)
-                })
-            
-            net_earnings = total_revenue + delivery_earnings - platform_fees
-            
-            # Get seller info
-            seller_doc = await self.db.users.find_one({"id": seller_id})
-            seller_name = seller_doc.get("full_name", "Unknown Seller") if seller_doc else "Unknown Seller"
-            
-            # Convert daily sales to list format
-            daily_sales_list = []
-            for date_str, data in sorted(daily_sales.items()):
-                daily_sales_list.append({
-                    "date": date_str,
-                    "orders": data["orders"],
-                    "revenue": float(data["revenue"]),
-                    "quantity": data["quantity"]
-                })
-            
-            # Convert species breakdown to list format
-            species_breakdown_list = []
-            for species, data in species_breakdown.items():
-                species_breakdown_list.append({
-                    "species": species,
-                    "orders": data["orders"],
-                    "revenue": float(data["revenue"]),
-                    "quantity": data["quantity"],
-                    "percentage": float((data["revenue"] / total_revenue * 100) if total_revenue > 0 else 0)
-                })
-            
-            return {
-                "statement_type": "seller",
-                "seller_id": seller_id,
-                "seller_name": seller_name,
-                "period": {
-                    "year": year,
-                    "month": month,
-                    "month_name": start_date.strftime('%B'),
-                    "start_date": start_date.isoformat(),
-                    "end_date": end_date.isoformat()
-                },
-                "summary": {
-                    "total_orders": total_orders,
-                    "total_revenue": float(total_revenue),
-                    "total_quantity_sold": total_quantity_sold,
-                    "platform_fees": float(platform_fees),
-                    "delivery_earnings": float(delivery_earnings),
-                    "net_earnings": float(net_earnings),
-                    "average_order_value": float(total_revenue / total_orders) if total_orders > 0 else 0
-                },
-                "daily_breakdown": daily_sales_list,
-                "species_breakdown": species_breakdown_list,
-                "order_details": order_details,
-                "generated_at": datetime.now(timezone.utc).isoformat()
-            }
-            
+            return await self._get_statement("seller", seller_id, year, month)
         except Exception as e:
             logger.error(f"Error generating seller monthly statement: {e}")
             raise
-    
+
     async def get_buyer_monthly_statement(self, buyer_id: str, year: int, month: int) -> Dict[str, Any]:
         """Generate monthly trading statement for buyer"""
         try:
-            # Define date range for the month
-            start_date = datetime(year, month, 1, tzinfo=timezone.utc)
-            if month == 12:
-                end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
-            else:
-                end_date = datetime(year, month + 1, 1, tzinfo=timezone.utc)
-            
-            # Get completed orders for the buyer in this month
-            orders_cursor = self.db.orders.find({
-                "buyer_id": buyer_id,
-                "status": "completed",
-                "completed_at": {
-                    "$gte": start_date,
-                    "$lt": end_date
-                }
-            })
-            orders = await orders_cursor.to_list(length=None)
-            
-            # Calculate expense metrics
-            total_spent = Decimal('0')
-            total_orders = len(orders)
-            total_quantity_purchased = 0
-            delivery_costs = Decimal('0')
-            platform_fees = Decimal('0')
-            
-            order_details = []
-            species_breakdown = {}
-            daily_purchases = {}
-            seller_breakdown = {}
-            
-            for order in orders:
-                order_date = order.get("completed_at", order.get("created_at"))
-                if isinstance(order_date, str):
-                    order_date = datetime.fromisoformat(order_date.replace('Z', '+00:00'))
-                
-                day_key = order_date.strftime('%Y-%m-%d')
-                
-                # Order totals
-                merchandise_total = Decimal(str(order.get("merchandise_total", 0)))
-                delivery_cost = Decimal(str(order.get("delivery_cost", 0)))
-                platform_fee = Decimal(str(order.get("platform_fee", 0)))
-                grand_total = merchandise_total + delivery_cost + platform_fee
-                
-                total_spent += grand_total
-                delivery_costs += delivery_cost
-                platform_fees += platform_fee
-                total_quantity_purchased += order.get("quantity", 0)
-                
-                # Daily breakdown
-                if day_key not in daily_purchases:
-                    daily_purchases[day_key] = {
-                        "orders": 0,
-                        "total_spent": Decimal('0'),
-                        "quantity": 0
-                    }
-                
-                daily_purchases[day_key]["orders"] += 1
-                daily_purchases[day_key]["total_spent"] += grand_total
-                daily_purchases[day_key]["quantity"] += order.get("quantity", 0)
-                
-                # Species breakdown
-                species_name = order.get("species_name", "Unknown")
-                if species_name not in species_breakdown:
-                    species_breakdown[species_name] = {
-                        "orders": 0,
-                        "total_spent": Decimal('0'),
-                        "quantity": 0
-                    }
-                
-                species_breakdown[species_name]["orders"] += 1
-                species_breakdown[species_name]["total_spent"] += grand_total
-                species_breakdown[species_name]["quantity"] += order.get("quantity", 0)
-                
-                # Seller breakdown
-                seller_name = order.get("seller_name", "Unknown Seller")
-                if seller_name not in seller_breakdown:
-                    seller_breakdown[seller_name] = {
-                        "orders": 0,
-                        "total_spent": Decimal('0'),
-                        "quantity": 0
-                    }
-                
-                seller_breakdown[seller_name]["orders"] += 1
-                seller_breakdown[seller_name]["total_spent"] += grand_total
-                seller_breakdown[seller_name]["quantity"] += order.get("quantity", 0)
-                
-                # Order detail
-                order_details.append({
-                    "order_id": order.get("id"),
-                    "date": order_date.strftime('%Y-%m-%d'),
-                    "seller_name": seller_name,
-                    "species": species_name,
-                    "quantity": order.get("quantity", 0),
-                    "unit_price": float(order.get("unit_price", 0)),
-                    "merchandise_total": float(merchandise_total),
-                    "delivery_cost": float(delivery_cost),
-                    "platform_fee": float(platform_fee),
-                    "grand_total": float(grand_total)
-                })
-            
-            # Get buyer info
-            buyer_doc = await self.db.users.find_one({"id": buyer_id})
-            buyer_name = buyer_doc.get("full_name", "Unknown Buyer") if buyer_doc else "Unknown Buyer"
-            
-            # Convert daily purchases to list format
-            daily_purchases_list = []
-            for date_str, data in sorted(daily_purchases.items()):
-                daily_purchases_list.append({
-                    "date": date_str,
-                    "orders": data["orders"],
-                    "total_spent": float(data["total_spent"]),
-                    "quantity": data["quantity"]
-                })
-            
-            # Convert breakdowns to list format
-            species_breakdown_list = []
-            for species, data in species_breakdown.items():
-                species_breakdown_list.append({
-                    "species": species,
-                    "orders": data["orders"],
-                    "total_spent": float(data["total_spent"]),
-                    "quantity": data["quantity"],
-                    "percentage": float((data["total_spent"] / total_spent * 100) if total_spent > 0 else 0)
-                })
-            
-            seller_breakdown_list = []
-            for seller, data in seller_breakdown.items():
-                seller_breakdown_list.append({
-                    "seller": seller,
-                    "orders": data["orders"],
-                    "total_spent": float(data["total_spent"]),
-                    "quantity": data["quantity"],
-                    "percentage": float((data["total_spent"] / total_spent * 100) if total_spent > 0 else 0)
-                })
-            
-            return {
-                "statement_type": "buyer",
-                "buyer_id": buyer_id,
-                "buyer_name": buyer_name,
-                "period": {
-                    "year": year,
-                    "month": month,
-                    "month_name": start_date.strftime('%B'),
-                    "start_date": start_date.isoformat(),
-                    "end_date": end_date.isoformat()
-                },
-                "summary": {
-                    "total_orders": total_orders,
-                    "total_spent": float(total_spent),
-                    "total_quantity_purchased": total_quantity_purchased,
-                    "delivery_costs": float(delivery_costs),
-                    "platform_fees": float(platform_fees),
-                    "average_order_value": float(total_spent / total_orders) if total_orders > 0 else 0
-                },
-                "daily_breakdown": daily_purchases_list,
-                "species_breakdown": species_breakdown_list,
-                "seller_breakdown": seller_breakdown_list,
-                "order_details": order_details,
-                "generated_at": datetime.now(timezone.utc).isoformat()
-            }
-            
+            return await self._get_statement("buyer", buyer_id, year, month)
         except Exception as e:
             logger.error(f"Error generating buyer monthly statement: {e}")
             raise
-    
+
+    def is_closed(self, year: int, month: int) -> bool:
+        _, end_date = month_range(year, month)
+        return end_date + self.close_grace <= datetime.now(timezone.utc)
+
+    # Snapshots
+
+    async def _get_statement(self, statement_type: str, user_id: str, year: int, month: int,
+                             include_details: bool = True) -> Dict[str, Any]:
+        closed = self.is_closed(year, month)
+        if closed:
+            snapshot = await self._load_snapshot(statement_type, user_id, year, month, include_details)
+            if snapshot:
+                return snapshot
+
+        statement = await self._compute_statement(statement_type, user_id, year, month,
+                                                  include_details=include_details)
+        statement["is_final"] = closed
+        # Snapshots hold the order lines, so only full reads save one; exports stream the
+        # lines from the cursor and never hold them all in memory
+        if closed and include_details:
+            statement["revision"] = await self._save_snapshot(statement_type, user_id, year, month, statement)
+        return statement
+
+    async def _load_snapshot(self, statement_type: str, user_id: str, year: int, month: int,
+                             include_details: bool) -> Optional[Dict[str, Any]]:
+        projection = {"statement": 1, "revision": 1}
+        if not include_details:
+            projection = {"statement.order_details": 0}
+        doc = await self.db[SNAPSHOT_COLLECTION].find_one(
+            {"_id": snapshot_id(statement_type, user_id, year, month), "stale": {"$ne": True}},
+            projection
+        )
+        if not doc:
+            return None
+        statement = doc["statement"]
+        statement["revision"] = doc.get("revision", 1)
+        return statement
+
+    async def _save_snapshot(self, statement_type: str, user_id: str, year: int, month: int,
+                             statement: Dict[str, Any]) -> int:
+        """Persist a closed month's statement; returns its revision"""
+        try:
+            doc = await self.db[SNAPSHOT_COLLECTION].find_one_and_update(
+                {"_id": snapshot_id(statement_type, user_id, year, month)},
+                {
+                    "$set": {
+                        "statement_type": statement_type,
+                        "user_id": user_id,
+                        "year": year,
+                        "month": month,
+                        "statement": statement,
+                        "stale": False,
+                        "computed_at": datetime.now(timezone.utc)
+                    },
+                    "$inc": {"revision": 1}
+                },
+                projection={"revision": 1},
+                upsert=True,
+                return_document=True
+            )
+            return doc["revision"]
+        except DocumentTooLarge:
+            logger.warning(f"Statement {snapshot_id(statement_type, user_id, year, month)} too large to snapshot")
+        except Exception as e:
+            logger.error(f"Failed to save statement snapshot: {e}")
+        return 0
+
+    async def invalidate_period(self, user_id: str, year: int, month: int, statement_type: Optional[str] = None):
+        """Mark a closed month's snapshot(s) for a user stale after a late adjustment"""
+        types = [statement_type] if statement_type else list(DETAIL_COLUMNS)
+        await self.db[SNAPSHOT_COLLECTION].update_many(
+            {"_id": {"$in": [snapshot_id(t, user_id, year, month) for t in types]}},
+            {"$set": {"stale": True, "adjusted_at": datetime.now(timezone.utc)}}
+        )
+
+    async def invalidate_order(self, order_id: str):
+        """Mark the buyer and seller statements covering an order stale. Never raises."""
+        try:
+            order = await self.db.orders.find_one(
+                {"id": order_id}, {"_id": 0, "seller_id": 1, "buyer_id": 1, "completed_at": 1}
+            )
+            completed_at = _as_datetime(order.get("completed_at")) if order else None
+            if not completed_at:
+                return
+            keys = [
+                snapshot_id(statement_type, order[field], completed_at.year, completed_at.month)
+                for statement_type, field in (("seller", "seller_id"), ("buyer", "buyer_id"))
+                if order.get(field)
+            ]
+            await self.db[SNAPSHOT_COLLECTION].update_many(
+                {"_id": {"$in": keys}},
+                {"$set": {"stale": True, "adjusted_at": datetime.now(timezone.utc)}}
+            )
+        except Exception as e:
+            logger.warning(f"Failed to invalidate statements for order {order_id}: {e}")
+
+    # Computation
+
+    def _orders_query(self, statement_type: str, user_id: str, year: int, month: int) -> Dict[str, Any]:
+        start_date, end_date = month_range(year, month)
+        return {
+            "seller_id" if statement_type == "seller" else "buyer_id": user_id,
+            "status": "completed",
+            "completed_at": {"$gte": start_date, "$lt": end_date}
+        }
+
+    async def _aggregate(self, statement_type: str, user_id: str, year: int, month: int) -> Dict[str, Any]:
+        """Summary plus daily/species(/seller) breakdowns in one round trip"""
+        # Money components are summed separately; amounts are derived from them in Python
+        group_fields = {
+            "orders": {"$sum": 1},
+            "quantity": {"$sum": "$qty"},
+            "merchandise": {"$sum": "$merchandise"},
+            "delivery": {"$sum": "$delivery"},
+            "fee": {"$sum": "$fee"}
+        }
+        facets = {
+            "summary": [{"$group": {"_id": None, **group_fields}}],
+            "daily": [
+                {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$completed_at"}},
+                            **group_fields}},
+                {"$sort": {"_id": 1}}
+            ],
+            "species": [{"$group": {"_id": {"$ifNull": ["$species_name", "Unknown"]}, **group_fields}}],
+        }
+        if statement_type == "buyer":
+            facets["sellers"] = [
+                {"$group": {"_id": {"$ifNull": ["$seller_name", "Unknown Seller"]}, **group_fields}}
+            ]
+
+        result = await self.db.orders.aggregate([
+            {"$match": self._orders_query(statement_type, user_id, year, month)},
+            {"$project": {
+                "completed_at": 1,
+                "species_name": 1,
+                "seller_name": 1,
+                "qty": {"$ifNull": ["$quantity", 0]},
+                "merchandise": _money("merchandise_total"),
+                "delivery": _money("delivery_cost"),
+                "fee": _money("platform_fee"),
+            }},
+            {"$facet": facets}
+        ]).to_list(length=1)
+        return result[0] if result else {}
+
+    async def _compute_statement(self, statement_type: str, user_id: str, year: int, month: int,
+                                 include_details: bool = True) -> Dict[str, Any]:
+        start_date, end_date = month_range(year, month)
+        facets = await self._aggregate(statement_type, user_id, year, month)
+        summary_row = (facets.get("summary") or [{}])[0]
+        amount_key = "revenue" if statement_type == "seller" else "total_spent"
+
+        def amount(row: Dict[str, Any]) -> Decimal:
+            # Sellers are credited the merchandise total; buyers pay merchandise, delivery and fees
+            if statement_type == "seller":
+                return _decimal(row.get("merchandise"))
+            return _decimal(row.get("merchandise")) + _decimal(row.get("delivery")) + _decimal(row.get("fee"))
+
+        total_orders = summary_row.get("orders", 0)
+        total_amount = amount(summary_row)
+        total_quantity = summary_row.get("quantity", 0)
+        merchandise = _decimal(summary_row.get("merchandise"))
+        delivery = _decimal(summary_row.get("delivery"))
+        platform_fees = _decimal(summary_row.get("fee"))
+
+        def breakdown(rows: List[Dict[str, Any]], label: str, with_percentage: bool = True):
+            items = []
+            for row in rows or []:
+                row_amount = amount(row)
+                item = {label: row["_id"], "orders": row["orders"], amount_key: float(row_amount),
+                        "quantity": row["quantity"]}
+                if with_percentage:
+                    item["percentage"] = float((row_amount / total_amount * 100) if total_amount > 0 else 0)
+                items.append(item)
+            if with_percentage:
+                items.sort(key=lambda item: item[amount_key], reverse=True)
+            return items
+
+        user_doc = await self.db.users.find_one({"id": user_id}, {"_id": 0, "full_name": 1})
+        fallback_name = "Unknown Seller" if statement_type == "seller" else "Unknown Buyer"
+        user_name = user_doc.get("full_name", fallback_name) if user_doc else fallback_name
+
+        if statement_type == "seller":
+            summary = {
+                "total_orders": total_orders,
+                "total_revenue": float(merchandise),
+                "total_quantity_sold": total_quantity,
+                "platform_fees": float(platform_fees),
+                "delivery_earnings": float(delivery),
+                "net_earnings": float(merchandise + delivery - platform_fees),
+                "average_order_value": float(merchandise / total_orders) if total_orders > 0 else 0
+            }
+        else:
+            summary = {
+                "total_orders": total_orders,
+                "total_spent": float(total_amount),
+                "total_quantity_purchased": total_quantity,
+                "delivery_costs": float(delivery),
+                "platform_fees": float(platform_fees),
+                "average_order_value": float(total_amount / total_orders) if total_orders > 0 else 0
+            }
+
+        statement = {
+            "statement_type": statement_type,
+            f"{statement_type}_id": user_id,
+            f"{statement_type}_name": user_name,
+            "period": {
+                "year": year,
+                "month": month,
+                "month_name": start_date.strftime('%B'),
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat()
+            },
+            "summary": summary,
+            "daily_breakdown": breakdown(facets.get("daily"), "date", with_percentage=False),
+            "species_breakdown": breakdown(facets.get("species"), "species"),
+        }
+        if statement_type == "buyer":
+            statement["seller_breakdown"] = breakdown(facets.get("sellers"), "seller")
+        if include_details:
+            statement["order_details"] = [
+                line async for line in self._iter_order_lines(statement_type, user_id, year, month)
+            ]
+        statement["generated_at"] = datetime.now(timezone.utc).isoformat()
+        return statement
+
+    async def _iter_order_lines(self, statement_type: str, user_id: str, year: int, month: int
+                                ) -> AsyncIterator[Dict[str, Any]]:
+        cursor = self.db.orders.find(
+            self._orders_query(statement_type, user_id, year, month), ORDER_LINE_PROJECTION
+        ).sort("completed_at", ASCENDING).batch_size(EXPORT_BATCH_SIZE)
+        async for order in cursor:
+            yield self._format_order_line(statement_type, order)
+
+    @staticmethod
+    def _format_order_line(statement_type: str, order: Dict[str, Any]) -> Dict[str, Any]:
+        order_date = _as_datetime(order.get("completed_at"))
+        merchandise_total = _decimal(order.get("merchandise_total"))
+        delivery_cost = _decimal(order.get("delivery_cost"))
+        platform_fee = _decimal(order.get("platform_fee"))
+        line = {
+            "order_id": order.get("id"),
+            "date": order_date.strftime('%Y-%m-%d') if order_date else None,
+        }
+        if statement_type == "seller":
+            line["buyer_name"] = order.get("buyer_name", "Anonymous")
+        else:
+            line["seller_name"] = order.get("seller_name", "Unknown Seller")
+        line.update({
+            "species": order.get("species_name") or "Unknown",
+            "quantity": order.get("quantity", 0),
+            "unit_price": float(order.get("unit_price", 0)),
+            "merchandise_total": float(merchandise_total),
+            "delivery_cost": float(delivery_cost),
+            "platform_fee": float(platform_fee)
+        })
+        if statement_type == "buyer":
+            line["grand_total"] = float(merchandise_total + delivery_cost + platform_fee)
+        return line
+
+    # Exports
+
+    async def export_csv(self, statement_type: str, user_id: str, year: int, month: int) -> AsyncIterator[str]:
+        """Stream a statement as CSV: header block, summary, then one row per order"""
+        statement = await self._get_statement(statement_type, user_id, year, month, include_details=False)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def drain() -> str:
+            data = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return data
+
+        writer.writerow(["Statement", f"{statement_type.title()} trading statement"])
+        writer.writerow(["Name", statement.get(f"{statement_type}_name")])
+        writer.writerow(["Period", f"{statement['period']['month_name']} {year}"])
+        writer.writerow(["Final", "yes" if statement.get("is_final") else "no (month still open)"])
+        for key, value in statement["summary"].items():
+            writer.writerow([key, value])
+        writer.writerow([])
+        columns = DETAIL_COLUMNS[statement_type]
+        writer.writerow(columns)
+        yield drain()
+
+        rows = 0
+        async for line in self._iter_order_lines(statement_type, user_id, year, month):
+            writer.writerow([line.get(column) for column in columns])
+            rows += 1
+            if rows % EXPORT_BATCH_SIZE == 0:
+                yield drain()
+        yield drain()
+
+    async def export_pdf(self, statement_type: str, user_id: str, year: int, month: int) -> AsyncIterator[bytes]:
+        """Stream a statement as a plain-text PDF, one page at a time"""
+        statement = await self._get_statement(statement_type, user_id, year, month, include_details=False)
+        pdf = StreamingPDFWriter()
+        yield pdf.start()
+
+        amount_key = "revenue" if statement_type == "seller" else "total_spent"
+        header = [
+            f"{statement_type.title()} trading statement - {statement['period']['month_name']} {year}",
+            f"Name: {statement.get(f'{statement_type}_name')}",
+            "Final statement" if statement.get("is_final") else "Provisional: month still open",
+            "",
+            "Summary",
+        ]
+        header += [f"  {key.replace('_', ' '):<28}{value:>16,.2f}" if isinstance(value, float)
+                   else f"  {key.replace('_', ' '):<28}{value:>16}"
+                   for key, value in statement["summary"].items()]
+        header += ["", "Daily breakdown", f"  {'date':<12}{'orders':>8}{'quantity':>10}{amount_key:>16}"]
+        header += [f"  {day['date']:<12}{day['orders']:>8}{day['quantity']:>10}{day[amount_key]:>16,.2f}"
+                   for day in statement["daily_breakdown"]]
+        header += ["", "Species breakdown"]
+        header += [f"  {item['species'][:30]:<32}{item['orders']:>8}{item['quantity']:>10}"
+                   f"{item[amount_key]:>16,.2f}{item['percentage']:>8.1f}%"
+                   for item in statement["species_breakdown"]]
+        counterparty = "buyer_name" if statement_type == "seller" else "seller_name"
+        amount_column = "merchandise_total" if statement_type == "seller" else "grand_total"
+        header += ["", "Orders",
+                   f"  {'date':<11}{'order':<14}{counterparty.split('_')[0]:<22}{'species':<18}"
+                   f"{'qty':>6}{'amount':>14}"]
+        chunk = pdf.add_lines(header)
+        if chunk:
+            yield chunk
+
+        async for line in self._iter_order_lines(statement_type, user_id, year, month):
+            chunk = pdf.add_line(
+                f"  {line['date'] or '':<11}{str(line['order_id'] or '')[:12]:<14}"
+                f"{str(line[counterparty] or '')[:20]:<22}{str(line['species'] or '')[:16]:<18}"
+                f"{line['quantity'] or 0:>6}{line[amount_column]:>14,.2f}"
+            )
+            if chunk:
+                yield chunk
+        yield pdf.finish()
+
     async def get_available_periods(self, user_id: str, user_type: str) -> List[Dict[str, Any]]:
         """Get available periods for which statements can be generated"""
         try:
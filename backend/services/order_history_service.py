@@ -0,0 +1,178 @@
+"""
+Paginated order history for buyers and sellers.
+
+Loads one page of order groups and then hydrates every seller order, user
+name and order item for that page with a single ``$in`` query per
+collection, so the number of round trips is constant regardless of how many
+orders a user has.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+USER_NAME_PROJECTION = {"_id": 0, "id": 1, "full_name": 1, "name": 1}
+
+
+def _serialize_dates(doc: Dict[str, Any]):
+    for field in ["created_at", "updated_at"]:
+        if field in doc and hasattr(doc[field], 'isoformat'):
+            doc[field] = doc[field].isoformat()
+
+
+def _display_name(user: Optional[Dict[str, Any]], fallback: str) -> str:
+    if not user:
+        return fallback
+    return user.get("full_name") or user.get("name") or fallback
+
+
+class OrderHistoryService:
+    def __init__(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        """Indexes backing the history queries (idempotent)"""
+        try:
+            await self.db.order_groups.create_indexes([
+                IndexModel([("buyer_user_id", ASCENDING), ("created_at", DESCENDING)],
+                           name="order_groups_buyer_created")
+            ])
+            await self.db.seller_orders.create_indexes([
+                IndexModel([("order_group_id", ASCENDING)], name="seller_orders_group"),
+                IndexModel([("seller_id", ASCENDING), ("created_at", DESCENDING)],
+                           name="seller_orders_seller_created")
+            ])
+            await self.db.order_items.create_indexes([
+                IndexModel([("seller_order_id", ASCENDING)], name="order_items_seller_order")
+            ])
+        except Exception as e:
+            logger.warning(f"Could not create order history indexes: {e}")
+
+    async def get_buyer_history(self, user_id: str, page: int = 1, limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """One page of order groups the user bought, newest first"""
+        page, limit = self._normalise_page(page, limit)
+        query = {"buyer_user_id": user_id}
+
+        total = await self.db.order_groups.count_documents(query)
+        groups = await self.db.order_groups.find(query, {"_id": 0}) \
+            .sort("created_at", -1).skip((page - 1) * limit).limit(limit).to_list(length=limit)
+
+        seller_orders_by_group, items_by_order = await self._load_seller_orders(g["id"] for g in groups)
+        sellers = await self._load_users(
+            so["seller_id"] for orders in seller_orders_by_group.values() for so in orders
+        )
+
+        for group in groups:
+            _serialize_dates(group)
+            group["orders"] = [
+                self._format_order(
+                    so, group, items_by_order,
+                    seller_name=_display_name(sellers.get(so.get("seller_id")), "Unknown Seller")
+                )
+                for so in seller_orders_by_group.get(group["id"], [])
+            ]
+
+        return {"orders": groups, "pagination": self._pagination(page, limit, total)}
+
+    async def get_seller_history(self, user_id: str, page: int = 1, limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """One page of order groups containing a seller order for the user, newest first"""
+        page, limit = self._normalise_page(page, limit)
+
+        # Distinct group ids ordered by the seller's most recent order in each group
+        pipeline = [
+            {"$match": {"seller_id": user_id, "order_group_id": {"$ne": None}}},
+            {"$group": {"_id": "$order_group_id", "created_at": {"$max": "$created_at"}}},
+            {"$sort": {"created_at": -1, "_id": 1}},
+            {"$facet": {
+                "page": [{"$skip": (page - 1) * limit}, {"$limit": limit}],
+                "total": [{"$count": "count"}]
+            }}
+        ]
+        result = await self.db.seller_orders.aggregate(pipeline).to_list(length=1)
+        facet = result[0] if result else {"page": [], "total": []}
+        group_ids = [entry["_id"] for entry in facet["page"]]
+        total = facet["total"][0]["count"] if facet["total"] else 0
+
+        groups_by_id = {
+            group["id"]: group
+            async for group in self.db.order_groups.find({"id": {"$in": group_ids}}, {"_id": 0})
+        }
+        seller_orders_by_group, items_by_order = await self._load_seller_orders(groups_by_id.keys())
+        buyers = await self._load_users(g.get("buyer_user_id") for g in groups_by_id.values())
+
+        groups = []
+        for group_id in group_ids:
+            group = groups_by_id.get(group_id)
+            if not group:
+                continue
+            _serialize_dates(group)
+            buyer_name = _display_name(buyers.get(group.get("buyer_user_id")), "Unknown Buyer")
+            group["orders"] = [
+                self._format_order(so, group, items_by_order, buyer_name=buyer_name)
+                for so in seller_orders_by_group.get(group_id, [])
+            ]
+            groups.append(group)
+
+        return {"orders": groups, "pagination": self._pagination(page, limit, total)}
+
+    async def _load_seller_orders(
+        self, group_ids: Iterable[str]
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, List[Dict[str, Any]]]]:
+        """Seller orders grouped by order group id, and their items grouped by seller order id"""
+        group_ids = list(group_ids)
+        seller_orders_by_group: Dict[str, List[Dict[str, Any]]] = {}
+        items_by_order: Dict[str, List[Dict[str, Any]]] = {}
+        if not group_ids:
+            return seller_orders_by_group, items_by_order
+
+        seller_order_ids = []
+        async for seller_order in self.db.seller_orders.find({"order_group_id": {"$in": group_ids}}, {"_id": 0}):
+            _serialize_dates(seller_order)
+            seller_orders_by_group.setdefault(seller_order["order_group_id"], []).append(seller_order)
+            seller_order_ids.append(seller_order["id"])
+
+        if seller_order_ids:
+            async for item in self.db.order_items.find({"seller_order_id": {"$in": seller_order_ids}}, {"_id": 0}):
+                items_by_order.setdefault(item["seller_order_id"], []).append(item)
+
+        return seller_orders_by_group, items_by_order
+
+    async def _load_users(self, user_ids: Iterable[Optional[str]]) -> Dict[str, Dict[str, Any]]:
+        ids = list({user_id for user_id in user_ids if user_id})
+        if not ids:
+            return {}
+        return {
+            user["id"]: user
+            async for user in self.db.users.find({"id": {"$in": ids}}, USER_NAME_PROJECTION)
+        }
+
+    @staticmethod
+    def _format_order(seller_order: Dict[str, Any], group: Dict[str, Any],
+                      items_by_order: Dict[str, List[Dict[str, Any]]], **names) -> Dict[str, Any]:
+        # Format as expected by frontend
+        return {
+            "id": seller_order["id"],
+            "status": seller_order.get("status", "PENDING"),
+            "total_amount": int(seller_order.get("total", 0) * 100),  # Convert to cents
+            "created_at": seller_order.get("created_at", group.get("created_at")),
+            **names,
+            "items": items_by_order.get(seller_order["id"], [])
+        }
+
+    @staticmethod
+    def _normalise_page(page: int, limit: int) -> Tuple[int, int]:
+        return max(1, page), max(1, min(limit, MAX_PAGE_SIZE))
+
+    @staticmethod
+    def _pagination(page: int, limit: int, total: int) -> Dict[str, Any]:
+        return {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "has_more": page * limit < total
+        }
@@ -16,6 +16,9 @@ from .transfer_models import PaystackResponse
 
 logger = logging.getLogger(__name__)
 
+# Paystack accepts at most 100 transfers per bulk request
+BULK_TRANSFER_LIMIT = 100
+
 class PaystackError(Exception):
     def __init__(self, message: str, status_code: int = None, response_data: Dict = None):
         self.message = message
@@ -24,9 +27,10 @@ class PaystackError(Exception):
         super().__init__(message)
 
 class PaystackTransferClient:
-    def __init__(self, secret_key: str = None, base_url: str = "https://api.paystack.co"):
+    def __init__(self, secret_key: str = None, base_url: str = None):
         self.secret_key = secret_key or os.getenv("PAYSTACK_SECRET_KEY")
-        self.base_url = base_url
+        # PAYSTACK_BASE_URL points the client at a local fake server (fake_paystack_server.py)
+        self.base_url = base_url or os.getenv("PAYSTACK_BASE_URL", "https://api.paystack.co")
         
         if not self.secret_key:
             raise ValueError("Paystack secret key is required")
@@ -271,10 +275,40 @@ class PaystackTransferClient:
         logger.info(f"Initiating transfer of {amount/100:.2f} ZAR to {recipient_code}")
         return await self._make_request("POST", "/transfer", data=data)
     
+    async def initiate_bulk_transfer(
+        self,
+        transfers: List[Dict[str, Any]],
+        currency: str = "ZAR"
+    ) -> PaystackResponse:
+        """
+        Initiate up to BULK_TRANSFER_LIMIT transfers in one request. Each item
+        needs ``recipient``, ``amount`` (cents) and ``reference``; ``reason`` is
+        optional. ``data`` lists one result per item, matched by reference.
+        A timeout or 5xx leaves the outcome unknown.
+        """
+        if len(transfers) > BULK_TRANSFER_LIMIT:
+            raise PaystackError(f"Bulk transfers are limited to {BULK_TRANSFER_LIMIT} items per request")
+        
+        data = {
+            "currency": currency,
+            "source": "balance",
+            "transfers": transfers
+        }
+        
+        total = sum(item["amount"] for item in transfers)
+        logger.info(f"Initiating bulk transfer of {len(transfers)} items ({total/100:.2f} {currency})")
+        # Never retried: a repeat of a bulk POST Paystack already accepted is rejected as a whole,
+        # which would hide transfers that were paid. Callers verify by reference instead.
+        return await self._make_request("POST", "/transfer/bulk", data=data, max_retries=0)
+    
     async def fetch_transfer(self, transfer_code: str) -> PaystackResponse:
         """Fetch transfer details"""
         return await self._make_request("GET", f"/transfer/{transfer_code}")
     
+    async def verify_transfer(self, reference: str) -> PaystackResponse:
+        """Look up a transfer by our reference (404 if Paystack never received it)"""
+        return await self._make_request("GET", f"/transfer/verify/{reference}")
+    
     async def list_transfers(
         self,
         page: int = 1,
@@ -0,0 +1,74 @@
+"""
+Response cache for the listing Product Detail Page.
+
+Caches the viewer-independent PDP body per listing. Viewer-specific fields
+(seller contact visibility, delivery range) are applied on top of a copy of
+the cached body on every request, so the cache never stores a response that
+was redacted or revealed for a particular user.
+"""
+import os
+import logging
+from typing import Any, Dict, Optional, Set
+
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class PDPCacheService:
+    def __init__(self, ttl_seconds: float = None, max_entries: int = 5000):
+        ttl = ttl_seconds if ttl_seconds is not None else float(os.getenv("PDP_CACHE_TTL_SECONDS", "120"))
+        self._cache = TTLCache(ttl_seconds=ttl, max_entries=max_entries)
+        # seller_id -> listing ids cached for that seller, for seller-wide invalidation; pruned
+        # back to what is still cached once it holds twice the cache's capacity
+        self._listings_by_seller: Dict[str, Set[str]] = {}
+        self._indexed = 0
+
+    def get(self, listing_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry ({"body", "seller_contact"}) for a listing"""
+        return self._cache.get(listing_id)
+
+    def set(self, listing_id: str, body: Dict[str, Any], seller_contact: Dict[str, Any]):
+        """
+        Store a PDP body. ``seller_contact`` holds the seller's raw id, phone and
+        email; it is kept beside the body and never returned to clients as-is.
+        """
+        self._cache.set(listing_id, {"body": body, "seller_contact": seller_contact})
+        listings = self._listings_by_seller.setdefault(seller_contact["id"], set())
+        if listing_id not in listings:
+            listings.add(listing_id)
+            self._indexed += 1
+            if self._indexed > 2 * self._cache.max_entries:
+                self._prune_index()
+
+    def invalidate_listing(self, listing_id: str):
+        self._cache.invalidate(listing_id)
+
+    def invalidate_seller(self, seller_id: str):
+        """Drop every cached PDP for a seller (profile or rating changes)"""
+        listings = self._listings_by_seller.pop(seller_id, set())
+        self._indexed -= len(listings)
+        for listing_id in listings:
+            self._cache.invalidate(listing_id)
+
+    def clear(self):
+        self._cache.clear()
+        self._listings_by_seller.clear()
+        self._indexed = 0
+
+    def _prune_index(self):
+        """Forget listings that expired, were evicted or invalidated since they were indexed"""
+        pruned: Dict[str, Set[str]] = {}
+        for seller_id, listing_ids in self._listings_by_seller.items():
+            cached = {listing_id for listing_id in listing_ids if listing_id in self._cache}
+            if cached:
+                pruned[seller_id] = cached
+        self._listings_by_seller = pruned
+        self._indexed = sum(len(listing_ids) for listing_ids in pruned.values())
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return self._cache.get_metrics()
+
+
+# Global PDP cache instance
+pdp_cache = PDPCacheService()
@@ -1,6 +1,4 @@
-import os
 import logging
-import openai
 import base64
 import json
 from typing import Dict, List, Optional, Any
@@ -10,14 +8,14 @@ import io
 import cv2
 import numpy as np
 
+from services.llm_gateway import llm_gateway
+
 logger = logging.getLogger(__name__)
 
 class PhotoIntelligenceService:
     def __init__(self, db):
         self.db = db
-        self.openai_client = openai.OpenAI(
-            api_key=os.environ.get('OPENAI_API_KEY')
-        )
+        self.llm = llm_gateway
     
     async def analyze_livestock_photo(
         self, 
@@ -126,7 +124,7 @@ class PhotoIntelligenceService:
             - professional_assessment: overall professional rating 0-10
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4-vision-preview",
                 messages=[
                     {
@@ -534,7 +532,7 @@ class PhotoIntelligenceService:
             }}
             """
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model="gpt-4-vision-preview",
                 messages=[
                     {
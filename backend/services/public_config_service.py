@@ -7,11 +7,14 @@ from typing import Dict, Any, Optional
 from datetime import datetime, timezone
 import json
 
+from services.kpi_snapshot_service import KPISnapshotService
+
 logger = logging.getLogger(__name__)
 
 class PublicConfigService:
-    def __init__(self, db):
+    def __init__(self, db, kpi_snapshots: Optional[KPISnapshotService] = None):
         self.db = db
+        self.kpi_snapshots = kpi_snapshots or KPISnapshotService(db)
         self._cache = {}
         self._cache_ttl = 300  # 5 minutes TTL
         self._last_update = None
@@ -143,21 +146,15 @@ class PublicConfigService:
             }
     
     async def _get_platform_stats(self) -> Dict[str, Any]:
-        """Get public platform statistics"""
+        """Get public platform statistics from the KPI snapshot gauges"""
         try:
-            # Count active listings
-            active_listings = await self.db.listings.count_documents({"status": "active"})
-            
-            # Count total users (non-sensitive)
-            total_users = await self.db.users.count_documents({"is_active": {"$ne": False}})
-            
-            # Count successful orders
-            successful_orders = await self.db.orders.count_documents({"order_status": "confirmed"})
+            gauges = await self.kpi_snapshots.get_gauges()
             
+            # Total users is a display figure - the metadata estimate is sufficient
             return {
-                "active_listings": active_listings,
-                "total_users": total_users,
-                "successful_orders": successful_orders
+                "active_listings": gauges.get("active_listings", 0),
+                "total_users": gauges.get("total_users", 0),
+                "successful_orders": gauges.get("successful_orders", 0)
             }
             
         except Exception as e:
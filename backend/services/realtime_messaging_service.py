@@ -6,6 +6,9 @@ import os
 from datetime import datetime, timedelta
 from bson import ObjectId
 import motor.motor_asyncio
+from pymongo import ReturnDocument
+from services.inbox_hydration import UserProfileCache, UnreadCounters
+from services.message_history import fetch_page, is_read, message_history_index
 # Note: User model is defined in auth_models.py, not models.py
 # We'll work with database documents directly instead of importing User model
 import uuid
@@ -23,12 +26,24 @@ class RealTimeMessagingService:
     - Message encryption
     """
     
-    def __init__(self, db, socketio_instance=None):
+    def __init__(self, db, socketio_instance=None, profile_cache: UserProfileCache = None):
         self.db = db
         self.socketio = socketio_instance
         self.active_connections = {}  # user_id -> socket_id mapping
         self.conversation_participants = {}  # conversation_id -> [user_ids]
         self.typing_users = {}  # conversation_id -> [user_ids]
+        self.profile_cache = profile_cache or UserProfileCache(db)
+        self.unread_counters = UnreadCounters(db, "chat", self._count_unread_by_type)
+    
+    async def ensure_indexes(self):
+        """Message history index and per-user unread counters"""
+        try:
+            await self.db.messages.create_indexes([
+                message_history_index('timestamp', '_id', 'messages_conversation_timestamp')
+            ])
+        except Exception as e:
+            print(f"Could not create chat message indexes: {str(e)}")
+        await self.unread_counters.ensure_indexes()
         
     async def create_conversation(self, participant_ids: List[str], conversation_type: str = "direct", 
                                 listing_id: str = None, metadata: Dict = None) -> Dict[str, Any]:
@@ -49,6 +64,7 @@ class RealTimeMessagingService:
                 'metadata': metadata or {},
                 'last_message': None,
                 'unread_counts': {pid: 0 for pid in participant_ids},
+                'last_read': {},
                 'status': 'active'
             }
             
@@ -104,7 +120,6 @@ class RealTimeMessagingService:
                 'edited': False,
                 'edited_at': None,
                 'delivery_status': 'sent',
-                'read_by': [sender_id],  # Sender has read their own message
                 'reactions': {},
                 'reply_to': message_data.get('reply_to'),
                 'metadata': message_data.get('metadata', {})
@@ -115,7 +130,7 @@ class RealTimeMessagingService:
             
             # Update conversation
             await self._update_conversation_last_message(conversation_id, message)
-            await self._update_unread_counts(conversation_id, sender_id)
+            await self._update_unread_counts(conversation, sender_id)
             
             # Real-time delivery
             await self._deliver_message_realtime(conversation, message)
@@ -137,52 +152,35 @@ class RealTimeMessagingService:
                               offset: int = 0) -> Dict[str, Any]:
         """Get user's conversations with latest messages"""
         try:
-            # Build aggregation pipeline
-            pipeline = [
-                {
-                    '$match': {
-                        'participants': user_id,
-                        'status': 'active'
-                    }
-                },
-                {
-                    '$lookup': {
-                        'from': 'messages',
-                        'localField': '_id',
-                        'foreignField': 'conversation_id',
-                        'as': 'recent_messages',
-                        'pipeline': [
-                            {'$sort': {'timestamp': -1}},
-                            {'$limit': 1}
-                        ]
-                    }
-                },
-                {
-                    '$lookup': {
-                        'from': 'users',
-                        'localField': 'participants',
-                        'foreignField': '_id',
-                        'as': 'participant_details'
-                    }
-                },
-                {
-                    '$addFields': {
-                        'last_message': {'$arrayElemAt': ['$recent_messages', 0]},
-                        'unread_count': f'$unread_counts.{user_id}'
-                    }
-                },
-                {'$sort': {'updated_at': -1}},
-                {'$skip': offset},
-                {'$limit': limit}
-            ]
-            
-            conversations = await self.db.conversations.aggregate(pipeline).to_list(limit)
+            # One page query; last_message is kept on the conversation by send_message
+            conversations = await self.db.conversations.find({
+                'participants': user_id,
+                'status': 'active'
+            }).sort('updated_at', -1).skip(offset).limit(limit).to_list(limit)
+            
+            # Conversations whose only messages were written directly (e.g. inquiry welcomes)
+            missing_last = [conv['_id'] for conv in conversations if not conv.get('last_message')]
+            if missing_last:
+                latest = await self.db.messages.aggregate([
+                    {'$match': {'conversation_id': {'$in': missing_last}}},
+                    {'$sort': {'timestamp': -1}},
+                    {'$group': {'_id': '$conversation_id', 'message': {'$first': '$$ROOT'}}}
+                ]).to_list(len(missing_last))
+                latest_by_conversation = {row['_id']: row['message'] for row in latest}
+                for conv in conversations:
+                    if conv['_id'] in latest_by_conversation:
+                        conv['last_message'] = latest_by_conversation[conv['_id']]
+            
+            # Participant names/avatars for the whole page in one lookup
+            profiles = await self.profile_cache.get_profiles(
+                pid for conv in conversations for pid in conv.get('participants', [])
+            )
             
             # Process conversations for frontend
-            processed_conversations = []
-            for conv in conversations:
-                processed_conv = await self._process_conversation_for_user(conv, user_id)
-                processed_conversations.append(processed_conv)
+            processed_conversations = [
+                self._process_conversation_for_user(conv, user_id, profiles)
+                for conv in conversations
+            ]
             
             return {
                 'success': True,
@@ -195,8 +193,12 @@ class RealTimeMessagingService:
             return {'success': False, 'error': str(e)}
     
     async def get_messages(self, conversation_id: str, user_id: str, 
-                          limit: int = 50, before_timestamp: datetime = None) -> Dict[str, Any]:
-        """Get messages from a conversation"""
+                          limit: int = 50, before_timestamp: datetime = None,
+                          cursor: str = None) -> Dict[str, Any]:
+        """
+        Latest messages from a conversation, in chronological order. Pass the
+        returned ``next_cursor`` back as ``cursor`` for the page before it.
+        """
         try:
             # Verify user has access to conversation
             conversation = await self.db.conversations.find_one({
@@ -209,31 +211,34 @@ class RealTimeMessagingService:
             
             # Build query
             query = {'conversation_id': conversation_id}
-            if before_timestamp:
+            if before_timestamp and not cursor:
                 query['timestamp'] = {'$lt': before_timestamp}
             
-            # Get messages
-            messages = await self.db.messages.find(query)\
-                .sort('timestamp', -1)\
-                .limit(limit)\
-                .to_list(limit)
+            # Get messages (newest page first, returned in chronological order)
+            page = await fetch_page(
+                self.db.messages, query, time_field='timestamp', id_field='_id',
+                limit=limit, cursor=cursor, newest_first=True
+            )
+            messages = page['items']
             
-            # Reverse to get chronological order
-            messages.reverse()
+            # Read state as of this request, before the page is marked read
+            last_read_at = (conversation.get('last_read') or {}).get(user_id)
             
             # Mark messages as read
-            await self._mark_messages_read(conversation_id, user_id, messages)
+            await self._mark_messages_read(conversation, user_id, messages)
             
             # Process messages for frontend
-            processed_messages = []
-            for msg in messages:
-                processed_msg = await self._process_message_for_user(msg, user_id)
-                processed_messages.append(processed_msg)
+            processed_messages = [
+                self._process_message_for_user(msg, user_id, last_read_at)
+                for msg in messages
+            ]
             
             return {
                 'success': True,
                 'messages': processed_messages,
-                'conversation': conversation
+                'conversation': conversation,
+                'next_cursor': page['next_cursor'],
+                'has_more': page['has_more']
             }
             
         except Exception as e:
@@ -470,36 +475,45 @@ class RealTimeMessagingService:
                         'type': message['type']
                     },
                     'updated_at': datetime.utcnow()
-                }
+                },
+                # The sender has read up to their own message
+                '$max': {f"last_read.{message['sender_id']}": message['timestamp']}
             }
         )
     
-    async def _update_unread_counts(self, conversation_id: str, sender_id: str):
+    async def _update_unread_counts(self, conversation: Dict, sender_id: str):
         """Update unread counts for all participants except sender"""
-        conversation = await self.db.conversations.find_one({'_id': conversation_id})
-        if conversation:
-            for participant_id in conversation['participants']:
-                if participant_id != sender_id:
-                    await self.db.conversations.update_one(
-                        {'_id': conversation_id},
-                        {'$inc': {f'unread_counts.{participant_id}': 1}}
-                    )
-    
-    async def _mark_messages_read(self, conversation_id: str, user_id: str, messages: List[Dict]):
-        """Mark messages as read by user"""
-        message_ids = [msg['_id'] for msg in messages if user_id not in msg.get('read_by', [])]
-        
-        if message_ids:
-            await self.db.messages.update_many(
-                {'_id': {'$in': message_ids}},
-                {'$addToSet': {'read_by': user_id}}
-            )
-            
-            # Reset unread count for this user
+        recipients = [pid for pid in conversation['participants'] if pid != sender_id]
+        if recipients:
             await self.db.conversations.update_one(
-                {'_id': conversation_id},
-                {'$set': {f'unread_counts.{user_id}': 0}}
+                {'_id': conversation['_id']},
+                {'$inc': {f'unread_counts.{pid}': 1 for pid in recipients}}
             )
+            # Counters cover the same conversations as _count_unread_by_type: active ones
+            if conversation.get('status') == 'active':
+                await self.unread_counters.increment(recipients, conversation.get('type'))
+    
+    async def _mark_messages_read(self, conversation: Dict, user_id: str, messages: List[Dict]):
+        """Move the user's last-read pointer up to the newest message they were shown"""
+        if not messages:
+            return
+        newest = messages[-1]['timestamp']
+        last_read_at = (conversation.get('last_read') or {}).get(user_id)
+        unread = (conversation.get('unread_counts') or {}).get(user_id, 0)
+        if is_read(last_read_at, newest) and not unread:
+            return
+        
+        # Reset unread count for this user and take it off their total
+        before = await self.db.conversations.find_one_and_update(
+            {'_id': conversation['_id']},
+            {'$set': {f'unread_counts.{user_id}': 0},
+             '$max': {f'last_read.{user_id}': newest}},
+            projection={'type': 1, f'unread_counts.{user_id}': 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before:
+            cleared = (before.get('unread_counts') or {}).get(user_id, 0)
+            await self.unread_counters.decrement(user_id, before.get('type'), cleared)
     
     # Missing helper methods implementation
     async def _create_listing_inquiry_welcome(self, conversation_id: str, listing_id: str):
@@ -518,7 +532,6 @@ class RealTimeMessagingService:
                     'type': 'system',
                     'timestamp': datetime.utcnow(),
                     'delivery_status': 'sent',
-                    'read_by': [],
                     'reactions': {},
                     'metadata': {'listing_id': listing_id}
                 }
@@ -549,19 +562,21 @@ class RealTimeMessagingService:
         except Exception as e:
             print(f"Error handling automated responses: {str(e)}")
     
-    async def _process_conversation_for_user(self, conversation: Dict, user_id: str) -> Dict:
+    def _process_conversation_for_user(self, conversation: Dict, user_id: str,
+                                       profiles: Dict[str, Dict]) -> Dict:
         """Process conversation data for user display"""
         try:
-            # Remove current user from participant details for display
+            # Everyone but the current user, for display
             participant_details = []
-            for participant in conversation.get('participant_details', []):
-                if participant.get('_id') != user_id:
+            for participant_id in conversation.get('participants', []):
+                if participant_id != user_id:
+                    profile = profiles.get(participant_id, {})
                     participant_details.append({
-                        '_id': participant.get('_id'),
-                        'first_name': participant.get('first_name', 'Unknown'),
-                        'last_name': participant.get('last_name', ''),
-                        'profile_image': participant.get('profile_image'),
-                        'is_online': participant.get('is_online', False)
+                        '_id': participant_id,
+                        'first_name': profile.get('first_name', 'Unknown'),
+                        'last_name': profile.get('last_name', ''),
+                        'profile_image': profile.get('avatar'),
+                        'is_online': participant_id in self.active_connections
                     })
             
             return {
@@ -569,7 +584,7 @@ class RealTimeMessagingService:
                 'type': conversation.get('type', 'direct'),
                 'participant_details': participant_details,
                 'last_message': conversation.get('last_message'),
-                'unread_count': conversation.get('unread_count', 0),
+                'unread_count': (conversation.get('unread_counts') or {}).get(user_id, 0),
                 'updated_at': conversation.get('updated_at'),
                 'metadata': conversation.get('metadata', {})
             }
@@ -577,12 +592,12 @@ class RealTimeMessagingService:
             print(f"Error processing conversation: {str(e)}")
             return conversation
     
-    async def _process_message_for_user(self, message: Dict, user_id: str) -> Dict:
+    def _process_message_for_user(self, message: Dict, user_id: str, last_read_at: datetime = None) -> Dict:
         """Process message data for user display"""
         try:
-            # Add user-specific data like read status
-            is_read = user_id in message.get('read_by', [])
+            # Add user-specific data like read status (from the user's last-read pointer)
             is_own = message.get('sender_id') == user_id
+            read = is_own or is_read(last_read_at, message.get('timestamp'))
             
             processed_message = {
                 '_id': message['_id'],
@@ -591,7 +606,7 @@ class RealTimeMessagingService:
                 'content': message.get('content'),
                 'type': message.get('type', 'text'),
                 'timestamp': message.get('timestamp'),
-                'is_read': is_read,
+                'is_read': read,
                 'is_own': is_own,
                 'delivery_status': message.get('delivery_status', 'sent'),
                 'reactions': message.get('reactions', {}),
@@ -604,29 +619,33 @@ class RealTimeMessagingService:
             return message
     
     async def _get_total_unread_count(self, user_id: str) -> int:
-        """Get total unread count across all conversations"""
+        """Get total unread count across all conversations (from the user's counter document)"""
         try:
-            pipeline = [
-                {
-                    '$match': {
-                        'participants': user_id,
-                        'status': 'active'
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': None,
-                        'total_unread': {'$sum': f'$unread_counts.{user_id}'}
-                    }
-                }
-            ]
-            
-            result = await self.db.conversations.aggregate(pipeline).to_list(1)
-            return result[0]['total_unread'] if result else 0
+            return await self.unread_counters.total(user_id)
         except Exception as e:
             print(f"Error getting total unread count: {str(e)}")
             return 0
     
+    async def _count_unread_by_type(self, user_id: str) -> Dict[str, int]:
+        """Unread per conversation type, aggregated from the conversations (seeds the user's counter)"""
+        pipeline = [
+            {
+                '$match': {
+                    'participants': user_id,
+                    'status': 'active'
+                }
+            },
+            {
+                '$group': {
+                    '_id': '$type',
+                    'total_unread': {'$sum': f'$unread_counts.{user_id}'}
+                }
+            }
+        ]
+        
+        results = await self.db.conversations.aggregate(pipeline).to_list(None)
+        return {row['_id'] or 'other': row['total_unread'] for row in results if row['total_unread']}
+    
     async def _validate_media_upload(self, file_data: bytes, file_type: str, filename: str) -> Dict[str, Any]:
         """Validate media upload"""
         try:
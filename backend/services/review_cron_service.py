@@ -1,112 +1,38 @@
 # ⏰ REVIEW CRON SERVICE
 # Background jobs for review system maintenance
 
-import asyncio
 import logging
 from datetime import datetime, timezone, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from services.review_service import ReviewService
+from services.job_scheduler import every, daily_at, weekly_on
 
 logger = logging.getLogger(__name__)
 
 class ReviewCronService:
-    """Background job service for review system maintenance"""
+    """Scheduled jobs for review system maintenance"""
     
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
         self.review_service = ReviewService(db)
-        self.running = False
     
-    async def start_background_jobs(self):
-        """Start all background jobs"""
-        if self.running:
-            return
-        
-        self.running = True
-        logger.info("Starting review system background jobs")
-        
-        # Start concurrent jobs
-        tasks = [
-            self._unblind_reviews_job(),
-            self._aggregate_recomputation_job(),
-            self._cleanup_job()
-        ]
-        
-        await asyncio.gather(*tasks, return_exceptions=True)
+    def register_jobs(self, scheduler):
+        """Register the maintenance jobs; the scheduler runs each on one worker only"""
+        scheduler.register_periodic(
+            "reviews.unblind_expired", self.review_service.unblind_expired_reviews, every(3600), run_on_start=True
+        )
+        scheduler.register_periodic(
+            "reviews.recompute_aggregates", self._recompute_aggregates, daily_at(0)
+        )
+        scheduler.register_periodic(
+            "reviews.weekly_cleanup", self._perform_cleanup, weekly_on(6)
+        )
     
-    async def stop_background_jobs(self):
-        """Stop all background jobs"""
-        self.running = False
-        logger.info("Stopping review system background jobs")
-    
-    async def _unblind_reviews_job(self):
-        """Hourly job to unblind expired reviews"""
-        while self.running:
-            try:
-                await self.review_service.unblind_expired_reviews()
-                
-                # Sleep for 1 hour
-                await asyncio.sleep(3600)
-                
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Unblind reviews job error: {e}")
-                # Sleep for 5 minutes before retrying
-                await asyncio.sleep(300)
-    
-    async def _aggregate_recomputation_job(self):
+    async def _recompute_aggregates(self):
         """Daily job to recompute all rating aggregates"""
-        while self.running:
-            try:
-                # Calculate time until next midnight
-                now = datetime.now(timezone.utc)
-                next_midnight = (now + timedelta(days=1)).replace(
-                    hour=0, minute=0, second=0, microsecond=0
-                )
-                seconds_until_midnight = (next_midnight - now).total_seconds()
-                
-                # Sleep until midnight
-                await asyncio.sleep(seconds_until_midnight)
-                
-                if self.running:
-                    logger.info("Starting daily aggregate recomputation")
-                    await self.review_service.recompute_all_rating_aggregates()
-                    logger.info("Completed daily aggregate recomputation")
-                
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Aggregate recomputation job error: {e}")
-                # Sleep for 1 hour before retrying
-                await asyncio.sleep(3600)
-    
-    async def _cleanup_job(self):
-        """Weekly cleanup of old review data"""
-        while self.running:
-            try:
-                # Calculate time until next Sunday midnight
-                now = datetime.now(timezone.utc)
-                days_until_sunday = (6 - now.weekday()) % 7
-                if days_until_sunday == 0:
-                    days_until_sunday = 7  # Next Sunday if today is Sunday
-                
-                next_sunday = now + timedelta(days=days_until_sunday)
-                next_sunday = next_sunday.replace(hour=0, minute=0, second=0, microsecond=0)
-                seconds_until_sunday = (next_sunday - now).total_seconds()
-                
-                # Sleep until next Sunday
-                await asyncio.sleep(seconds_until_sunday)
-                
-                if self.running:
-                    await self._perform_cleanup()
-                
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Cleanup job error: {e}")
-                # Sleep for 1 day before retrying
-                await asyncio.sleep(86400)
+        logger.info("Starting daily aggregate recomputation")
+        await self.review_service.recompute_all_rating_aggregates()
+        logger.info("Completed daily aggregate recomputation")
     
     async def _perform_cleanup(self):
         """Perform weekly cleanup tasks"""
@@ -1,9 +1,11 @@
 # 🌟 REVIEW SERVICE
 # Comprehensive duo review system with anti-abuse measures and Bayesian ratings
 
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, Callable
 from datetime import datetime, timezone, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReplaceOne, ReturnDocument
+import os
 import logging
 import asyncio
 import math
@@ -39,6 +41,26 @@ class ReviewService:
         # Bayesian constants
         self.confidence_constant = 20.0
         self.default_marketplace_mean = 4.3
+        self.marketplace_mean_ttl_seconds = 3600
+        self._marketplace_mean_cache: Dict[str, Tuple[float, datetime]] = {}
+        
+        # Bulk recompute tuning
+        self.recompute_batch_size = 500
+        self.recompute_concurrency = 10
+        
+        # Callbacks fired with (subject_user_id, direction) after aggregates change
+        self._rating_listeners: List[Callable[[str, ReviewDirection], Any]] = []
+    
+    def add_rating_listener(self, listener: Callable[[str, ReviewDirection], Any]):
+        """Register a callback for rating aggregate changes (e.g. cache invalidation)"""
+        self._rating_listeners.append(listener)
+    
+    def _notify_rating_listeners(self, subject_user_id: str, direction: ReviewDirection):
+        for listener in self._rating_listeners:
+            try:
+                listener(subject_user_id, direction)
+            except Exception as e:
+                logger.warning(f"Rating listener failed: {e}")
     
     # ELIGIBILITY CHECKS
     async def check_review_eligibility(
@@ -243,7 +265,12 @@ class ReviewService:
             
             # If approved, update aggregates
             if review.moderation_status == ReviewStatus.APPROVED:
-                await self._update_rating_aggregates(subject_user_id, review_data.direction)
+                await self._apply_rating_change(
+                    subject_user_id,
+                    review_data.direction,
+                    added_rating=review.rating,
+                    review_created_at=now
+                )
             
             # Send notifications
             await self._send_review_notifications(review, "created")
@@ -441,10 +468,12 @@ class ReviewService:
                 {"$set": update_data}
             )
             
-            # Update aggregates if moderation status changed to approved
-            if update_data.get("moderation_status") == ReviewStatus.APPROVED.value:
-                direction = ReviewDirection(review["direction"])
-                await self._update_rating_aggregates(review["subject_user_id"], direction)
+            # Apply rating and moderation changes to the aggregates
+            await self.apply_review_transition(
+                review,
+                update_data.get("moderation_status", review.get("moderation_status")),
+                update_data.get("rating", review["rating"])
+            )
             
             return {
                 "success": True,
@@ -496,8 +525,7 @@ class ReviewService:
             await self.db.user_reviews.delete_one({"id": review_id})
             
             # Update aggregates
-            direction = ReviewDirection(review["direction"])
-            await self._update_rating_aggregates(review["subject_user_id"], direction)
+            await self.apply_review_transition(review, None, None)
             
             return {
                 "success": True,
@@ -513,70 +541,250 @@ class ReviewService:
             }
     
     # AGGREGATION SYSTEM
+    async def apply_review_transition(
+        self,
+        review_before: Dict[str, Any],
+        new_status: Optional[str],
+        new_rating: Optional[int]
+    ):
+        """
+        Apply a review state change to the rating aggregates.
+        
+        ``review_before`` is the stored review prior to the change; pass
+        ``new_status=None`` when the review is being deleted.
+        """
+        was_approved = review_before.get("moderation_status") == ReviewStatus.APPROVED.value
+        is_approved = new_status == ReviewStatus.APPROVED.value
+        old_rating = review_before["rating"]
+        
+        if not was_approved and not is_approved:
+            return
+        if was_approved and is_approved and old_rating == new_rating:
+            return
+        
+        await self._apply_rating_change(
+            review_before["subject_user_id"],
+            ReviewDirection(review_before["direction"]),
+            added_rating=new_rating if is_approved else None,
+            removed_rating=old_rating if was_approved else None,
+            review_created_at=review_before.get("created_at")
+        )
+    
+    async def _apply_rating_change(
+        self,
+        subject_user_id: str,
+        direction: ReviewDirection,
+        added_rating: Optional[int] = None,
+        removed_rating: Optional[int] = None,
+        review_created_at: Optional[datetime] = None
+    ):
+        """Incrementally apply one rating change to the stats document (O(1))"""
+        try:
+            is_seller = direction == ReviewDirection.BUYER_ON_SELLER
+            collection = self.db.seller_rating_stats if is_seller else self.db.buyer_rating_stats
+            key = "seller_id" if is_seller else "buyer_id"
+            
+            increments = {"ratings_count": 0, "rating_sum": 0}
+            if added_rating:
+                increments["ratings_count"] += 1
+                increments["rating_sum"] += added_rating
+                if is_seller:
+                    increments[f"star_{added_rating}"] = increments.get(f"star_{added_rating}", 0) + 1
+            if removed_rating:
+                increments["ratings_count"] -= 1
+                increments["rating_sum"] -= removed_rating
+                if is_seller:
+                    increments[f"star_{removed_rating}"] = increments.get(f"star_{removed_rating}", 0) - 1
+            
+            counters = {
+                field: {"$add": [{"$ifNull": [f"${field}", 0]}, delta]}
+                for field, delta in increments.items()
+            }
+            counters["updated_at"] = datetime.now(timezone.utc)
+            if added_rating and review_created_at:
+                counters["last_review_at"] = {"$max": ["$last_review_at", review_created_at]}
+            
+            marketplace_mean = await self._get_marketplace_mean("seller" if is_seller else "buyer")
+            
+            # Counters and derived averages are updated atomically in one pipeline update
+            stats_doc = await collection.find_one_and_update(
+                {key: subject_user_id, "rating_sum": {"$exists": True}},
+                [{"$set": counters}, {"$set": self._derived_average_fields(marketplace_mean)}],
+                return_document=ReturnDocument.AFTER
+            )
+            
+            if stats_doc is None:
+                # First rating for this user, or a stats document written before
+                # rating_sum existed - rebuild it once from the source reviews
+                await self._update_rating_aggregates(subject_user_id, direction)
+                return
+            
+            self._notify_rating_listeners(subject_user_id, direction)
+            
+            if not is_seller:
+                reliability_score = 50.0
+                if stats_doc.get("ratings_count", 0) > 0:
+                    reliability_score = await self._calculate_buyer_reliability_score(
+                        subject_user_id, stats_doc.get("avg_rating_bayes", 0.0)
+                    )
+                await collection.update_one(
+                    {key: subject_user_id},
+                    {"$set": {"reliability_score": round(reliability_score, 1)}}
+                )
+            
+        except Exception as e:
+            logger.error(f"Error applying rating change: {e}")
+    
+    def _derived_average_fields(self, marketplace_mean: float) -> Dict[str, Any]:
+        """Aggregation expressions for raw and Bayesian averages from counters"""
+        has_ratings = {"$gt": ["$ratings_count", 0]}
+        return {
+            "avg_rating_raw": {
+                "$cond": [has_ratings, {"$round": [{"$divide": ["$rating_sum", "$ratings_count"]}, 2]}, 0.0]
+            },
+            "avg_rating_bayes": {
+                "$cond": [
+                    has_ratings,
+                    {"$round": [
+                        {"$divide": [
+                            {"$add": [self.confidence_constant * marketplace_mean, "$rating_sum"]},
+                            {"$add": [self.confidence_constant, "$ratings_count"]}
+                        ]},
+                        2
+                    ]},
+                    0.0
+                ]
+            }
+        }
+    
+    def bayesian_average(self, rating_sum: float, ratings_count: int, marketplace_mean: float) -> float:
+        """Bayesian-smoothed average rating"""
+        if ratings_count <= 0:
+            return 0.0
+        return (
+            (self.confidence_constant * marketplace_mean + rating_sum) /
+            (self.confidence_constant + ratings_count)
+        )
+    
+    async def get_seller_rating_summary(self, seller_id: str) -> Dict[str, Any]:
+        """Read precomputed seller stats, deriving the Bayesian average on read"""
+        stats_doc = await self.db.seller_rating_stats.find_one({"seller_id": seller_id}, {"_id": 0})
+        if not stats_doc:
+            return {
+                "avg_bayes": 0.0,
+                "avg_raw": 0.0,
+                "count": 0,
+                "stars": {"1": 0, "2": 0, "3": 0, "4": 0, "5": 0},
+                "last_review_at": None
+            }
+        
+        ratings_count = stats_doc.get("ratings_count", 0)
+        avg_bayes = stats_doc.get("avg_rating_bayes", 0.0)
+        if "rating_sum" in stats_doc:
+            marketplace_mean = await self._get_marketplace_mean("seller")
+            avg_bayes = round(self.bayesian_average(stats_doc["rating_sum"], ratings_count, marketplace_mean), 2)
+        
+        return {
+            "avg_bayes": avg_bayes,
+            "avg_raw": stats_doc.get("avg_rating_raw", 0.0),
+            "count": ratings_count,
+            "stars": {str(star): stats_doc.get(f"star_{star}", 0) for star in range(1, 6)},
+            "last_review_at": stats_doc.get("last_review_at")
+        }
+    
     async def _update_rating_aggregates(self, subject_user_id: str, direction: ReviewDirection):
-        """Update rating aggregates for seller or buyer"""
+        """Fully recompute rating aggregates for one seller or buyer (repair path)"""
         try:
             if direction == ReviewDirection.BUYER_ON_SELLER:
                 await self._update_seller_rating_stats(subject_user_id)
             else:
                 await self._update_buyer_rating_stats(subject_user_id)
+            self._notify_rating_listeners(subject_user_id, direction)
         except Exception as e:
             logger.error(f"Error updating rating aggregates: {e}")
     
+    def _rating_group_pipeline(self, match: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Server-side grouping of approved reviews into rating counters per subject"""
+        group = {
+            "_id": "$subject_user_id",
+            "ratings_count": {"$sum": 1},
+            "rating_sum": {"$sum": "$rating"},
+            "last_review_at": {"$max": "$created_at"}
+        }
+        for star in range(1, 6):
+            group[f"star_{star}"] = {"$sum": {"$cond": [{"$eq": ["$rating", star]}, 1, 0]}}
+        
+        return [
+            {"$match": {**match, "moderation_status": ReviewStatus.APPROVED.value}},
+            {"$group": group}
+        ]
+    
+    def _build_seller_stats(
+        self,
+        seller_id: str,
+        row: Optional[Dict[str, Any]],
+        marketplace_mean: float
+    ) -> SellerRatingStats:
+        if not row or not row.get("ratings_count"):
+            return SellerRatingStats(seller_id=seller_id)
+        
+        ratings_count = row["ratings_count"]
+        last_review_at = row.get("last_review_at")
+        if isinstance(last_review_at, str):
+            last_review_at = datetime.fromisoformat(last_review_at.replace('Z', '+00:00'))
+        
+        return SellerRatingStats(
+            seller_id=seller_id,
+            avg_rating_bayes=round(self.bayesian_average(row["rating_sum"], ratings_count, marketplace_mean), 2),
+            avg_rating_raw=round(row["rating_sum"] / ratings_count, 2),
+            ratings_count=ratings_count,
+            rating_sum=row["rating_sum"],
+            star_1=row.get("star_1", 0),
+            star_2=row.get("star_2", 0),
+            star_3=row.get("star_3", 0),
+            star_4=row.get("star_4", 0),
+            star_5=row.get("star_5", 0),
+            last_review_at=last_review_at
+        )
+    
+    async def _build_buyer_stats(
+        self,
+        buyer_id: str,
+        row: Optional[Dict[str, Any]],
+        marketplace_mean: float
+    ) -> BuyerRatingStats:
+        if not row or not row.get("ratings_count"):
+            # No reviews - neutral starting score
+            return BuyerRatingStats(buyer_id=buyer_id, reliability_score=50.0)
+        
+        ratings_count = row["ratings_count"]
+        avg_rating_bayes = self.bayesian_average(row["rating_sum"], ratings_count, marketplace_mean)
+        reliability_score = await self._calculate_buyer_reliability_score(buyer_id, avg_rating_bayes)
+        
+        last_review_at = row.get("last_review_at")
+        if isinstance(last_review_at, str):
+            last_review_at = datetime.fromisoformat(last_review_at.replace('Z', '+00:00'))
+        
+        return BuyerRatingStats(
+            buyer_id=buyer_id,
+            avg_rating_bayes=round(avg_rating_bayes, 2),
+            avg_rating_raw=round(row["rating_sum"] / ratings_count, 2),
+            ratings_count=ratings_count,
+            rating_sum=row["rating_sum"],
+            reliability_score=round(reliability_score, 1),
+            last_review_at=last_review_at
+        )
+    
     async def _update_seller_rating_stats(self, seller_id: str):
         """Update seller rating statistics with Bayesian smoothing"""
         try:
-            # Get approved reviews
-            reviews_cursor = self.db.user_reviews.find({
+            rows = await self.db.user_reviews.aggregate(self._rating_group_pipeline({
                 "subject_user_id": seller_id,
-                "direction": ReviewDirection.BUYER_ON_SELLER.value,
-                "moderation_status": ReviewStatus.APPROVED.value
-            })
-            reviews = await reviews_cursor.to_list(length=None)
-            
-            if not reviews:
-                # No reviews - set defaults
-                stats = SellerRatingStats(
-                    seller_id=seller_id,
-                    avg_rating_bayes=0.0,
-                    avg_rating_raw=0.0,
-                    ratings_count=0
-                )
-            else:
-                # Calculate statistics
-                ratings = [r["rating"] for r in reviews]
-                ratings_count = len(ratings)
-                avg_rating_raw = sum(ratings) / ratings_count
-                
-                # Star distribution
-                star_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-                for rating in ratings:
-                    star_counts[rating] += 1
-                
-                # Bayesian smoothing
-                marketplace_mean = await self._get_marketplace_mean("seller")
-                avg_rating_bayes = (
-                    (self.confidence_constant * marketplace_mean + ratings_count * avg_rating_raw) /
-                    (self.confidence_constant + ratings_count)
-                )
-                
-                # Last review date
-                last_review_at = max(r["created_at"] for r in reviews)
-                if isinstance(last_review_at, str):
-                    last_review_at = datetime.fromisoformat(last_review_at.replace('Z', '+00:00'))
-                
-                stats = SellerRatingStats(
-                    seller_id=seller_id,
-                    avg_rating_bayes=round(avg_rating_bayes, 2),
-                    avg_rating_raw=round(avg_rating_raw, 2),
-                    ratings_count=ratings_count,
-                    star_1=star_counts[1],
-                    star_2=star_counts[2],
-                    star_3=star_counts[3],
-                    star_4=star_counts[4],
-                    star_5=star_counts[5],
-                    last_review_at=last_review_at
-                )
+                "direction": ReviewDirection.BUYER_ON_SELLER.value
+            })).to_list(length=1)
+            
+            marketplace_mean = await self._get_marketplace_mean("seller")
+            stats = self._build_seller_stats(seller_id, rows[0] if rows else None, marketplace_mean)
             
             # Upsert stats
             await self.db.seller_rating_stats.replace_one(
@@ -591,54 +799,13 @@ class ReviewService:
     async def _update_buyer_rating_stats(self, buyer_id: str):
         """Update buyer rating statistics and reliability score"""
         try:
-            # Get approved reviews
-            reviews_cursor = self.db.user_reviews.find({
+            rows = await self.db.user_reviews.aggregate(self._rating_group_pipeline({
                 "subject_user_id": buyer_id,
-                "direction": ReviewDirection.SELLER_ON_BUYER.value,
-                "moderation_status": ReviewStatus.APPROVED.value
-            })
-            reviews = await reviews_cursor.to_list(length=None)
-            
-            if not reviews:
-                # No reviews - set defaults
-                stats = BuyerRatingStats(
-                    buyer_id=buyer_id,
-                    avg_rating_bayes=0.0,
-                    avg_rating_raw=0.0,
-                    ratings_count=0,
-                    reliability_score=50.0  # Neutral starting score
-                )
-            else:
-                # Calculate basic statistics
-                ratings = [r["rating"] for r in reviews]
-                ratings_count = len(ratings)
-                avg_rating_raw = sum(ratings) / ratings_count
-                
-                # Bayesian smoothing
-                marketplace_mean = await self._get_marketplace_mean("buyer")
-                avg_rating_bayes = (
-                    (self.confidence_constant * marketplace_mean + ratings_count * avg_rating_raw) /
-                    (self.confidence_constant + ratings_count)
-                )
-                
-                # Calculate reliability score
-                reliability_score = await self._calculate_buyer_reliability_score(
-                    buyer_id, avg_rating_bayes
-                )
-                
-                # Last review date
-                last_review_at = max(r["created_at"] for r in reviews)
-                if isinstance(last_review_at, str):
-                    last_review_at = datetime.fromisoformat(last_review_at.replace('Z', '+00:00'))
-                
-                stats = BuyerRatingStats(
-                    buyer_id=buyer_id,
-                    avg_rating_bayes=round(avg_rating_bayes, 2),
-                    avg_rating_raw=round(avg_rating_raw, 2),
-                    ratings_count=ratings_count,
-                    reliability_score=round(reliability_score, 1),
-                    last_review_at=last_review_at
-                )
+                "direction": ReviewDirection.SELLER_ON_BUYER.value
+            })).to_list(length=1)
+            
+            marketplace_mean = await self._get_marketplace_mean("buyer")
+            stats = await self._build_buyer_stats(buyer_id, rows[0] if rows else None, marketplace_mean)
             
             # Upsert stats
             await self.db.buyer_rating_stats.replace_one(
@@ -700,8 +867,18 @@ class ReviewService:
             logger.error(f"Error calculating buyer reliability score: {e}")
             return 50.0  # Neutral fallback
     
-    async def _get_marketplace_mean(self, user_type: str) -> float:
+    async def _get_marketplace_mean(self, user_type: str, use_cache: bool = True) -> float:
         """Get marketplace mean rating for Bayesian smoothing"""
+        now = datetime.now(timezone.utc)
+        cached = self._marketplace_mean_cache.get(user_type)
+        if use_cache and cached and (now - cached[1]).total_seconds() < self.marketplace_mean_ttl_seconds:
+            return cached[0]
+        
+        marketplace_mean = await self._load_marketplace_mean(user_type)
+        self._marketplace_mean_cache[user_type] = (marketplace_mean, now)
+        return marketplace_mean
+    
+    async def _load_marketplace_mean(self, user_type: str) -> float:
         try:
             # Try to get from cache/config first
             config = await self.db.system_settings.find_one({
@@ -778,32 +955,68 @@ class ReviewService:
             logger.error(f"Error unblinding reviews: {e}")
     
     async def recompute_all_rating_aggregates(self):
-        """Recompute all rating statistics (nightly job)"""
+        """
+        Rebuild all rating statistics from source reviews (nightly repair job).
+        
+        Reviews are grouped server-side in one aggregation per direction and
+        written back with chunked bulk upserts; buyer reliability scores are
+        computed with bounded concurrency.
+        """
         try:
-            # Get all users who have been reviewed
-            reviewed_sellers = await self.db.user_reviews.distinct(
-                "subject_user_id",
-                {"direction": ReviewDirection.BUYER_ON_SELLER.value}
-            )
-            
-            reviewed_buyers = await self.db.user_reviews.distinct(
-                "subject_user_id", 
-                {"direction": ReviewDirection.SELLER_ON_BUYER.value}
+            run_started = datetime.now(timezone.utc)
+            seller_mean = await self._get_marketplace_mean("seller", use_cache=False)
+            buyer_mean = await self._get_marketplace_mean("buyer", use_cache=False)
+            
+            # Seller stats
+            seller_count = 0
+            batch = []
+            seller_rows = self.db.user_reviews.aggregate(
+                self._rating_group_pipeline({"direction": ReviewDirection.BUYER_ON_SELLER.value}),
+                allowDiskUse=True
             )
+            async for row in seller_rows:
+                stats = self._build_seller_stats(row["_id"], row, seller_mean)
+                batch.append(ReplaceOne({"seller_id": row["_id"]}, stats.dict(), upsert=True))
+                if len(batch) >= self.recompute_batch_size:
+                    await self.db.seller_rating_stats.bulk_write(batch, ordered=False)
+                    seller_count += len(batch)
+                    batch = []
+            if batch:
+                await self.db.seller_rating_stats.bulk_write(batch, ordered=False)
+                seller_count += len(batch)
+            
+            # Buyer stats
+            semaphore = asyncio.Semaphore(self.recompute_concurrency)
+            
+            async def build_buyer(row):
+                async with semaphore:
+                    return await self._build_buyer_stats(row["_id"], row, buyer_mean)
+            
+            buyer_rows = await self.db.user_reviews.aggregate(
+                self._rating_group_pipeline({"direction": ReviewDirection.SELLER_ON_BUYER.value}),
+                allowDiskUse=True
+            ).to_list(length=None)
+            
+            for i in range(0, len(buyer_rows), self.recompute_batch_size):
+                chunk = buyer_rows[i:i + self.recompute_batch_size]
+                buyer_stats = await asyncio.gather(*(build_buyer(row) for row in chunk))
+                await self.db.buyer_rating_stats.bulk_write(
+                    [ReplaceOne({"buyer_id": stats.buyer_id}, stats.dict(), upsert=True) for stats in buyer_stats],
+                    ordered=False
+                )
             
-            # Update seller stats
-            for seller_id in reviewed_sellers:
-                await self._update_seller_rating_stats(seller_id)
-            
-            # Update buyer stats
-            for buyer_id in reviewed_buyers:
-                await self._update_buyer_rating_stats(buyer_id)
-            
-            # Update marketplace means
-            await self._get_marketplace_mean("seller")
-            await self._get_marketplace_mean("buyer")
+            # Users whose approved reviews have all gone were not touched above
+            stale = {"updated_at": {"$lt": run_started}}
+            await self.db.seller_rating_stats.update_many(stale, {"$set": {
+                **SellerRatingStats(seller_id="").dict(exclude={"seller_id", "updated_at"}),
+                "updated_at": run_started
+            }})
+            await self.db.buyer_rating_stats.update_many(stale, {"$set": {
+                **BuyerRatingStats(buyer_id="", reliability_score=50.0).dict(exclude={"buyer_id", "updated_at"}),
+                "updated_at": run_started
+            }})
             
-            logger.info(f"Recomputed stats for {len(reviewed_sellers)} sellers and {len(reviewed_buyers)} buyers")
+            logger.info(f"Recomputed stats for {seller_count} sellers and {len(buyer_rows)} buyers")
             
         except Exception as e:
             logger.error(f"Error recomputing rating aggregates: {e}")
@@ -818,5 +1031,3 @@ class ReviewService:
             
         except Exception as e:
             logger.error(f"Error sending review notifications: {e}")
-
-import os
\ No newline at end of file
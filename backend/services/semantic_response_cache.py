@@ -0,0 +1,255 @@
+"""
+Semantic response cache for FAQ/chat answers.
+
+Lookups go through two layers:
+
+1. an exact layer keyed by the normalised question (lower-cased, punctuation
+   and filler words stripped, whitespace collapsed), which costs nothing;
+2. a semantic layer that embeds the question and compares it against the
+   embeddings of every cached question in the same namespace with a single
+   matrix-vector product, returning the best answer above
+   ``similarity_threshold``.
+
+Embeddings come from the LLM gateway when it is configured, and the semantic
+layer is only on by default for those. The local hashed bag-of-words
+embedder scores questions that differ in one meaning-bearing word ("buy
+goats"/"buy sheep", "fee"/"no fee") around 0.8, as close as real
+paraphrases, so with it the cache is exact-match only unless
+``FAQ_CACHE_SIMILARITY`` sets a threshold (which also overrides the LLM one). Entries expire after
+``FAQ_CACHE_TTL_SECONDS``. When bound to the database, the cache also watches
+``faq_learning`` and drops everything once the knowledge base has been
+re-learned, so other workers pick up ``learn_from_*`` runs as well.
+"""
+import os
+import re
+import time
+import zlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.llm_gateway import llm_gateway
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+LOCAL_EMBEDDING_DIMENSIONS = 1024
+# Cosine thresholds tuned on paraphrased FAQ questions; None turns the semantic layer off
+DEFAULT_THRESHOLDS = {"llm": 0.90, "local": None}
+KNOWLEDGE_CHECK_SECONDS = 30
+_UNSET = object()
+
+# Greetings and phrasing only: negations ("no", "not"), quantifiers ("any") and the
+# words that pick a side or a product ("buy", "sell", species) must never be dropped
+FILLER_WORDS = {
+    "a", "an", "the", "please", "pls", "hi", "hello", "hey", "can", "could", "would",
+    "you", "your", "tell", "me", "i", "want", "to", "know", "is", "are", "do", "does", "there",
+    "stocklot",
+}
+
+
+def normalize_question(question: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", (question or "").lower())
+    words = [word for word in text.split() if word not in FILLER_WORDS]
+    return " ".join(words) or " ".join(text.split())
+
+
+def local_embedding(text: str, dimensions: int = LOCAL_EMBEDDING_DIMENSIONS) -> np.ndarray:
+    """Hashed unigram + bigram + character-trigram embedding, L2-normalised"""
+    words = normalize_question(text).split()
+    features = words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"#{word}#"
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in features:
+        # Whole words and bigrams carry more meaning than character trigrams
+        weight = 1.0 if len(feature) > 3 or feature in words else 0.35
+        vector[zlib.crc32(feature.encode("utf-8")) % dimensions] += weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticResponseCache:
+    def __init__(
+        self,
+        ttl_seconds: float = None,
+        max_entries: int = 2000,
+        similarity_threshold: float = None,
+        embedder: str = None
+    ):
+        self.ttl_seconds = ttl_seconds or float(os.getenv("FAQ_CACHE_TTL_SECONDS", str(6 * 3600)))
+        self.max_entries = max_entries
+        self.embedder = embedder or os.getenv("FAQ_CACHE_EMBEDDER") or ("llm" if llm_gateway.available else "local")
+        threshold = similarity_threshold or os.getenv("FAQ_CACHE_SIMILARITY") or DEFAULT_THRESHOLDS.get(self.embedder, 0.9)
+        self.similarity_threshold = float(threshold) if threshold is not None else None
+
+        # (namespace, normalised question) -> (response, expires_at, slot)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, float, int]]" = OrderedDict()
+        # Row ``slot`` of the matrix holds the embedding of the entry stored in that slot
+        self._matrix: Optional[np.ndarray] = None
+        self._slot_keys: List[Optional[Tuple[str, str]]] = [None] * max_entries
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+
+        self._db = None
+        self._knowledge_stamp = _UNSET
+        self._knowledge_checked_at = 0.0
+
+        self.counters = {
+            "lookups": 0,
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "embedding_errors": 0,
+        }
+        self._latency = {"hit": [0, 0.0], "miss": [0, 0.0]}
+
+    def bind_knowledge_source(self, db):
+        """Watch ``faq_learning`` so re-learning on any worker clears this cache"""
+        self._db = db
+
+    async def lookup(self, question: str, namespace: str = "default") -> Tuple[Optional[Any], Optional[np.ndarray]]:
+        """
+        Return ``(cached_response, embedding)``. The embedding of a missed
+        question is returned so ``store`` can reuse it without a second call.
+        """
+        await self._check_knowledge_version()
+        self.counters["lookups"] += 1
+        key = (namespace, normalize_question(question))
+        now = time.monotonic()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end(key)
+                self.counters["exact_hits"] += 1
+                return entry[0], None
+            self._remove(key)
+
+        if self.similarity_threshold is None:
+            self.counters["misses"] += 1
+            return None, None
+
+        embedding = await self._embed(question)
+        if embedding is not None and self._matrix is not None and self._entries:
+            scores = self._matrix @ embedding
+            for slot in np.argsort(scores)[::-1][:5]:
+                if scores[slot] < self.similarity_threshold:
+                    break
+                candidate_key = self._slot_keys[slot]
+                if candidate_key is None or candidate_key[0] != namespace:
+                    continue
+                response, expires_at, _ = self._entries[candidate_key]
+                if expires_at <= now:
+                    continue
+                self._entries.move_to_end(candidate_key)
+                self.counters["semantic_hits"] += 1
+                return response, embedding
+
+        self.counters["misses"] += 1
+        return None, embedding
+
+    async def store(self, question: str, response: Any, namespace: str = "default",
+                    embedding: Optional[np.ndarray] = None):
+        key = (namespace, normalize_question(question))
+        if key in self._entries:
+            self._remove(key)
+        if embedding is None and self.similarity_threshold is not None:
+            embedding = await self._embed(question)
+
+        while not self._free_slots:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.counters["evictions"] += 1
+        slot = self._free_slots.pop()
+
+        if embedding is not None:
+            if self._matrix is None or self._matrix.shape[1] != embedding.shape[0]:
+                self._matrix = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+            self._matrix[slot] = embedding
+        elif self._matrix is not None:
+            self._matrix[slot] = 0
+        self._slot_keys[slot] = key
+        self._entries[key] = (response, time.monotonic() + self.ttl_seconds, slot)
+        self.counters["stores"] += 1
+
+    def invalidate(self, namespace: Optional[str] = None):
+        """Drop every entry (or every entry of one namespace)"""
+        keys = [key for key in self._entries if namespace is None or key[0] == namespace]
+        for key in keys:
+            self._remove(key)
+        self.counters["invalidations"] += len(keys)
+
+    def record_latency(self, hit: bool, elapsed_ms: float):
+        bucket = self._latency["hit" if hit else "miss"]
+        bucket[0] += 1
+        bucket[1] += elapsed_ms
+
+    def get_metrics(self) -> Dict[str, Any]:
+        lookups = self.counters["lookups"]
+        hits = self.counters["exact_hits"] + self.counters["semantic_hits"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "avg_hit_latency_ms": self._average_latency("hit"),
+            "avg_miss_latency_ms": self._average_latency("miss"),
+            "embedder": self.embedder,
+            "similarity_threshold": self.similarity_threshold,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    def _average_latency(self, bucket: str) -> Optional[float]:
+        count, total = self._latency[bucket]
+        return round(total / count, 1) if count else None
+
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        slot = entry[2]
+        self._slot_keys[slot] = None
+        if self._matrix is not None:
+            self._matrix[slot] = 0
+        self._free_slots.append(slot)
+
+    async def _embed(self, question: str) -> Optional[np.ndarray]:
+        if self.embedder != "llm":
+            return local_embedding(question)
+        try:
+            response = await llm_gateway.embeddings(model=EMBEDDING_MODEL, input=[normalize_question(question)],
+                                                    timeout=5)
+            vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else vector
+        except Exception as e:
+            # Exact matches still work without an embedding
+            self.counters["embedding_errors"] += 1
+            logger.warning(f"FAQ cache embedding failed: {e}")
+            return None
+
+    async def _check_knowledge_version(self):
+        if self._db is None or time.monotonic() - self._knowledge_checked_at < KNOWLEDGE_CHECK_SECONDS:
+            return
+        self._knowledge_checked_at = time.monotonic()
+        try:
+            latest = await self._db.faq_learning.find_one(
+                {}, {"_id": 0, "id": 1}, sort=[("created_at", -1)]
+            )
+        except Exception as e:
+            logger.warning(f"FAQ cache knowledge check failed: {e}")
+            return
+        stamp = latest.get("id") if latest else None
+        if self._knowledge_stamp is not _UNSET and stamp != self._knowledge_stamp:
+            logger.info("FAQ knowledge base changed; clearing response cache")
+            self.invalidate()
+        self._knowledge_stamp = stamp
+
+
+# Global cache shared by the FAQ chat endpoints
+faq_response_cache = SemanticResponseCache()
@@ -0,0 +1,209 @@
+"""
+Static file serving for local uploads with HTTP caching semantics.
+
+Adds strong ETags, Last-Modified, 304 Not Modified handling and single
+byte-range responses on top of Starlette's FileResponse, and keeps a small
+in-memory stat/metadata cache so hot images are served without repeated
+exists/isfile/stat/mimetypes work.
+"""
+import os
+import time
+import asyncio
+import logging
+import mimetypes
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional
+
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONTROL = "max-age=86400"  # Cache for 1 day
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class FileMetadata:
+    stat_result: os.stat_result
+    etag: str
+    last_modified: str
+    content_type: Optional[str]
+    cached_at: float
+
+    @property
+    def size(self) -> int:
+        return self.stat_result.st_size
+
+
+class StaticFileService:
+    def __init__(self, cache_ttl_seconds: float = 60.0, max_entries: int = 4096):
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, FileMetadata]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "partial": 0}
+
+    async def get_metadata(self, file_path: str) -> Optional[FileMetadata]:
+        """Return cached metadata for a regular file, or None if it does not exist"""
+        now = time.monotonic()
+        cached = self._cache.get(file_path)
+        if cached and now - cached.cached_at < self.cache_ttl_seconds:
+            self._cache.move_to_end(file_path)
+            self.stats["hits"] += 1
+            return cached
+
+        self.stats["misses"] += 1
+        loop = asyncio.get_running_loop()
+        metadata = await loop.run_in_executor(None, self._load_metadata, file_path, now)
+        if metadata is None:
+            self._cache.pop(file_path, None)
+            return None
+
+        self._cache[file_path] = metadata
+        self._cache.move_to_end(file_path)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return metadata
+
+    def invalidate(self, file_path: str):
+        self._cache.pop(file_path, None)
+
+    async def serve(self, file_path: str, headers: Dict[str, str]) -> Optional[Response]:
+        """
+        Build the response for ``file_path`` honouring conditional and range
+        request headers. Returns None when the file does not exist.
+        """
+        metadata = await self.get_metadata(file_path)
+        if metadata is None:
+            return None
+
+        base_headers = {
+            "Cache-Control": CACHE_CONTROL,
+            "ETag": metadata.etag,
+            "Last-Modified": metadata.last_modified,
+            "Accept-Ranges": "bytes",
+        }
+
+        if self._is_not_modified(metadata, headers):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=base_headers)
+
+        range_header = headers.get("range")
+        if range_header and self._if_range_matches(metadata, headers.get("if-range")):
+            byte_range = self._parse_range(range_header, metadata.size)
+            if byte_range == "unsatisfiable":
+                return Response(
+                    status_code=416,
+                    headers={**base_headers, "Content-Range": f"bytes */{metadata.size}"}
+                )
+            if byte_range:
+                start, end = byte_range
+                self.stats["partial"] += 1
+                return StreamingResponse(
+                    self._iter_file_range(file_path, start, end),
+                    status_code=206,
+                    media_type=metadata.content_type,
+                    headers={
+                        **base_headers,
+                        "Content-Range": f"bytes {start}-{end}/{metadata.size}",
+                        "Content-Length": str(end - start + 1),
+                    }
+                )
+
+        return FileResponse(
+            path=file_path,
+            media_type=metadata.content_type,
+            headers=base_headers,
+            stat_result=metadata.stat_result
+        )
+
+    @staticmethod
+    def _load_metadata(file_path: str, now: float) -> Optional[FileMetadata]:
+        try:
+            stat_result = os.stat(file_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not os.path.isfile(file_path):
+            return None
+
+        content_type, _ = mimetypes.guess_type(file_path)
+        # Upload filenames are unique and never rewritten in place, so size +
+        # mtime + inode identifies the content and is safe as a strong validator
+        etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_ino:x}"'
+        return FileMetadata(
+            stat_result=stat_result,
+            etag=etag,
+            last_modified=formatdate(stat_result.st_mtime, usegmt=True),
+            content_type=content_type,
+            cached_at=now
+        )
+
+    @staticmethod
+    def _is_not_modified(metadata: FileMetadata, headers: Dict[str, str]) -> bool:
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            # If-None-Match uses weak comparison
+            return "*" in tags or any(tag.removeprefix("W/") == metadata.etag for tag in tags)
+
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(metadata.stat_result.st_mtime) <= since
+        return False
+
+    @staticmethod
+    def _if_range_matches(metadata: FileMetadata, if_range: Optional[str]) -> bool:
+        if not if_range:
+            return True
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            # If-Range requires a strong comparison
+            return if_range == metadata.etag
+        return if_range == metadata.last_modified
+
+    @staticmethod
+    def _parse_range(range_header: str, size: int):
+        """
+        Parse a single ``bytes=`` range. Returns (start, end) inclusive, None to
+        ignore the header (malformed or multi-range) or "unsatisfiable".
+        """
+        unit, _, spec = range_header.partition("=")
+        if unit.strip().lower() != "bytes" or "," in spec:
+            return None
+
+        first, _, last = spec.strip().partition("-")
+        try:
+            if first == "":
+                suffix = int(last)
+                if suffix <= 0:
+                    return "unsatisfiable"
+                return max(0, size - suffix), size - 1
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+
+        if start >= size or end < start:
+            return "unsatisfiable"
+        return start, min(end, size - 1)
+
+    @staticmethod
+    def _iter_file_range(file_path: str, start: int, end: int):
+        # Sync generator: StreamingResponse iterates it in the threadpool
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+# Global static file service instance
+static_file_service = StaticFileService()
@@ -0,0 +1,124 @@
+"""
+Minimal incremental PDF writer for plain-text reports.
+
+Pages are emitted as soon as they are filled, so a report can be streamed to
+the client while its rows are still being read from a cursor; only the byte
+offsets of the written objects are kept in memory. Text is set in Courier so
+column layouts built with fixed-width formatting line up. The font declares
+WinAnsiEncoding and text is written as cp1252; other characters are
+transliterated (accents dropped) or replaced with "?".
+"""
+import unicodedata
+from typing import List
+
+PAGE_WIDTH = 595  # A4 in points
+PAGE_HEIGHT = 842
+MARGIN = 40
+FONT_SIZE = 8
+LEADING = 11
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+# Fixed object numbers; page content/page objects are numbered from FIRST_PAGE_OBJECT
+CATALOG_OBJECT = 1
+PAGES_OBJECT = 2
+FONT_OBJECT = 3
+FIRST_PAGE_OBJECT = 4
+
+
+def _winansi(char: str) -> bytes:
+    try:
+        return char.encode("cp1252")
+    except UnicodeEncodeError:
+        base = unicodedata.normalize("NFKD", char).encode("ascii", errors="ignore")
+        return base or b"?"
+
+
+def _escape(text: str) -> bytes:
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    try:
+        return escaped.encode("cp1252")
+    except UnicodeEncodeError:
+        return b"".join(_winansi(char) for char in escaped)
+
+
+class StreamingPDFWriter:
+    """
+    Usage::
+
+        pdf = StreamingPDFWriter()
+        yield pdf.start()
+        for line in lines:
+            chunk = pdf.add_line(line)
+            if chunk:
+                yield chunk
+        yield pdf.finish()
+    """
+
+    def __init__(self):
+        self._offset = 0
+        self._offsets = {}
+        self._page_objects: List[int] = []
+        self._next_object = FIRST_PAGE_OBJECT
+        self._lines: List[str] = []
+
+    def start(self) -> bytes:
+        return self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def add_line(self, line: str = "") -> bytes:
+        """Buffer a line; returns the bytes of a completed page, or b"" """
+        self._lines.append(line)
+        if len(self._lines) >= LINES_PER_PAGE:
+            return self._flush_page()
+        return b""
+
+    def add_lines(self, lines: List[str]) -> bytes:
+        return b"".join(self.add_line(line) for line in lines)
+
+    def finish(self) -> bytes:
+        chunks = [self._flush_page()] if self._lines or not self._page_objects else []
+        kids = " ".join(f"{number} 0 R" for number in self._page_objects)
+        chunks.append(self._object(
+            PAGES_OBJECT, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_objects)} >>".encode()
+        ))
+        chunks.append(self._object(CATALOG_OBJECT, f"<< /Type /Catalog /Pages {PAGES_OBJECT} 0 R >>".encode()))
+        chunks.append(self._object(FONT_OBJECT, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>"))
+
+        xref_offset = self._offset
+        size = self._next_object
+        xref = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for number in range(1, size):
+            xref.append(f"{self._offsets[number]:010d} 00000 n \n")
+        xref.append(f"trailer\n<< /Size {size} /Root {CATALOG_OBJECT} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        chunks.append(self._emit("".join(xref).encode()))
+        return b"".join(chunks)
+
+    def _flush_page(self) -> bytes:
+        lines, self._lines = self._lines, []
+        body = [f"BT /F1 {FONT_SIZE} Tf {LEADING} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td".encode()]
+        for line in lines:
+            body.append(b"(" + _escape(line) + b") '")
+        body.append(b"ET")
+        content = b"\n".join(body)
+
+        content_number = self._next_object
+        page_number = self._next_object + 1
+        self._next_object += 2
+        self._page_objects.append(page_number)
+
+        content_object = self._object(
+            content_number, f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream"
+        )
+        page_object = self._object(page_number, (
+            f"<< /Type /Page /Parent {PAGES_OBJECT} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {FONT_OBJECT} 0 R >> >> /Contents {content_number} 0 R >>"
+        ).encode())
+        return content_object + page_object
+
+    def _object(self, number: int, body: bytes) -> bytes:
+        self._offsets[number] = self._offset
+        return self._emit(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def _emit(self, data: bytes) -> bytes:
+        self._offset += len(data)
+        return data
+
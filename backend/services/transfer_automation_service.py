@@ -2,13 +2,16 @@
 Transfer Automation Service for South African Livestock Marketplace
 Handles automated transfers, escrow releases, and background processing
 """
+import os
 import logging
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 import uuid
 import asyncio
 
-from .paystack_transfer_client import PaystackTransferClient, PaystackError
+from pymongo import UpdateOne
+
+from .paystack_transfer_client import PaystackTransferClient, PaystackError, BULK_TRANSFER_LIMIT
 from .transfer_recipient_service import TransferRecipientService
 from .transfer_models import (
     Transfer, TransferStatus, EscrowTransaction, EscrowStatus,
@@ -17,12 +20,38 @@ from .transfer_models import (
 
 logger = logging.getLogger(__name__)
 
+PROCESS_TRANSFER_JOB = "transfers.process"
+SUBMIT_BATCH_JOB = "transfers.submit_batch"
+BATCH_PAYOUT_MODE = "batch"
+# Claimed batch transfers left unresolved for this long are verified by reference; the grace
+# keeps recovery from racing a submission that is still in flight
+BATCH_RECOVERY_GRACE = timedelta(minutes=10)
+
 class TransferAutomationService:
-    def __init__(self, db, paystack_client: PaystackTransferClient = None):
+    def __init__(self, db, paystack_client: PaystackTransferClient = None, scheduler=None,
+                 batch_payouts: bool = None, batch_interval_seconds: int = None):
         self.db = db
         self.paystack_client = paystack_client or PaystackTransferClient()
         self.recipient_service = TransferRecipientService(db, paystack_client)
         
+        # Transfers are processed and retried through the durable job scheduler when one is given,
+        # so a restart doesn't lose in-flight payouts
+        self.scheduler = scheduler
+        
+        # Batch payout mode: new transfers wait as pending and are submitted together through
+        # Paystack's bulk transfer endpoint every batch_interval_seconds
+        if batch_payouts is None:
+            batch_payouts = os.getenv("PAYSTACK_BATCH_PAYOUTS", "false").lower() == "true"
+        self.batch_payouts = batch_payouts
+        self.batch_interval_seconds = batch_interval_seconds or int(os.getenv("PAYSTACK_BATCH_INTERVAL_SECONDS", "300"))
+        self.max_batch_size = 1000  # Transfers claimed per run, submitted in chunks of BULK_TRANSFER_LIMIT
+        
+        if scheduler is not None:
+            scheduler.register_handler(PROCESS_TRANSFER_JOB, self._run_transfer_job)
+            if self.batch_payouts:
+                scheduler.register_periodic(SUBMIT_BATCH_JOB, self.submit_pending_batch,
+                                            lambda now: now + timedelta(seconds=self.batch_interval_seconds))
+        
         # Configuration
         self.min_transfer_amount = 100  # ZAR 1.00 in cents
         self.max_transfer_amount = 1000000  # ZAR 10,000.00 in cents
@@ -41,9 +70,13 @@ class TransferAutomationService:
         reason: str = None,
         reference: str = None,
         escrow_transaction_id: str = None,
-        livestock_listing_id: str = None
+        livestock_listing_id: str = None,
+        batch: bool = None
     ) -> Transfer:
-        """Initiate a transfer to a recipient"""
+        """Initiate a transfer to a recipient; with ``batch`` it waits for the next bulk submission"""
+        
+        if batch is None:
+            batch = self.batch_payouts
         
         try:
             # Validate recipient
@@ -88,13 +121,16 @@ class TransferAutomationService:
                 "initiated_at": datetime.now(),
                 "created_at": datetime.now()
             }
+            if batch:
+                transfer_data["payout_mode"] = BATCH_PAYOUT_MODE
             
             await self.db.transfers.insert_one(transfer_data)
             
             logger.info(f"Created transfer {transfer_data['id']} with reference {reference}")
             
-            # Process transfer asynchronously
-            asyncio.create_task(self._process_single_transfer(transfer_data["id"]))
+            # Process transfer asynchronously (batched transfers go out with the next bulk submission)
+            if not batch:
+                await self._schedule_transfer(transfer_data["id"])
             
             # Remove MongoDB ObjectId for return
             transfer_data.pop("_id", None)
@@ -104,6 +140,58 @@ class TransferAutomationService:
             logger.error(f"Error creating transfer: {str(e)}")
             raise ValueError(f"Transfer creation failed: {str(e)}")
     
+    async def _schedule_transfer(self, transfer_id: str, delay_seconds: int = 0):
+        """Queue processing of a transfer, after ``delay_seconds``"""
+        if self.scheduler is None:
+            if delay_seconds:
+                asyncio.create_task(self._retry_transfer_after_delay(transfer_id, delay_seconds))
+            else:
+                asyncio.create_task(self._process_single_transfer(transfer_id))
+            return
+        await self.scheduler.enqueue(
+            PROCESS_TRANSFER_JOB,
+            {"transfer_id": transfer_id},
+            delay_seconds=delay_seconds,
+            dedupe_key=f"transfer:{transfer_id}"
+        )
+    
+    async def _run_transfer_job(self, payload: Dict[str, Any], attempt: int):
+        """Scheduler handler; a repeated attempt means the previous worker may have died mid-transfer"""
+        transfer_id = payload["transfer_id"]
+        if attempt > 1:
+            transfer_doc = await self.db.transfers.find_one({"id": transfer_id})
+            if (transfer_doc and transfer_doc.get("status") == TransferStatus.PROCESSING.value
+                    and not transfer_doc.get("paystack_transfer_code")):
+                if not await self._resume_interrupted_transfer(transfer_doc):
+                    return
+                await self.db.transfers.update_one(
+                    {"id": transfer_id, "status": TransferStatus.PROCESSING.value},
+                    {"$set": {"status": TransferStatus.PENDING.value, "updated_at": datetime.now()}}
+                )
+        await self._process_single_transfer(transfer_id)
+    
+    async def _resume_interrupted_transfer(self, transfer_doc: Dict[str, Any]) -> bool:
+        """
+        A transfer left in processing without a Paystack transfer code was
+        interrupted around the Paystack call. Look it up by reference before
+        submitting again so the seller is never paid twice. Returns True if it
+        should be submitted; raises (and the job is retried) if Paystack can't tell.
+        """
+        transfer_id = transfer_doc["id"]
+        response = await self.paystack_client.verify_transfer(transfer_doc["reference"])
+        
+        if response.status and response.data:
+            await self._apply_paystack_result(transfer_id, response.data)
+            logger.info(f"Recovered interrupted transfer {transfer_id} from Paystack")
+            return False
+        
+        if response.status_code != 404:
+            raise PaystackError(f"Could not verify interrupted transfer {transfer_id}: {response.message}",
+                                status_code=response.status_code)
+        
+        logger.info(f"Interrupted transfer {transfer_id} never reached Paystack; submitting it again")
+        return True
+    
     async def _process_single_transfer(self, transfer_id: str) -> bool:
         """Process a single transfer"""
         
@@ -142,34 +230,7 @@ class TransferAutomationService:
             
             if transfer_response.status:
                 # Transfer initiated successfully
-                transfer_data = transfer_response.data
-                
-                update_data = {
-                    "paystack_transfer_code": transfer_data.get("transfer_code"),
-                    "paystack_transfer_id": transfer_data.get("id"),
-                    "updated_at": datetime.now()
-                }
-                
-                # Check immediate status
-                paystack_status = transfer_data.get("status")
-                if paystack_status == "success":
-                    update_data["status"] = TransferStatus.SUCCESS.value
-                    update_data["completed_at"] = datetime.now()
-                    logger.info(f"Transfer {transfer_id} completed immediately")
-                elif paystack_status == "failed":
-                    update_data["status"] = TransferStatus.FAILED.value
-                    update_data["failure_reason"] = transfer_data.get("message", "Transfer failed")
-                    update_data["failed_at"] = datetime.now()
-                    logger.error(f"Transfer {transfer_id} failed immediately: {update_data['failure_reason']}")
-                else:
-                    # Transfer is pending - will be updated by webhook
-                    logger.info(f"Transfer {transfer_id} is pending, awaiting webhook notification")
-                
-                await self.db.transfers.update_one(
-                    {"id": transfer_id},
-                    {"$set": update_data}
-                )
-                
+                await self._apply_paystack_result(transfer_id, transfer_response.data)
                 return True
             else:
                 # Transfer initiation failed
@@ -192,6 +253,19 @@ class TransferAutomationService:
         if not transfer_doc:
             return
         
+        update_data, retry_delay = self._failure_update(transfer_doc, error_message)
+        
+        await self.db.transfers.update_one(
+            {"id": transfer_id},
+            {"$set": update_data}
+        )
+        
+        if retry_delay is not None and transfer_doc.get("payout_mode") != BATCH_PAYOUT_MODE:
+            await self._schedule_transfer(transfer_id, retry_delay)
+    
+    def _failure_update(self, transfer_doc: Dict[str, Any], error_message: str):
+        """Fields recording a failed attempt, and the retry delay (None once retries are exhausted)"""
+        transfer_id = transfer_doc["id"]
         retry_count = transfer_doc.get("retry_count", 0) + 1
         max_retries = transfer_doc.get("max_retries", 3)
         
@@ -207,24 +281,208 @@ class TransferAutomationService:
             
             logger.info(f"Scheduling retry for transfer {transfer_id} in {retry_delay} seconds (attempt {retry_count}/{max_retries})")
             
-            # Reset to pending for retry
+            # Reset to pending for retry; batched transfers rejoin a later batch
             update_data["status"] = TransferStatus.PENDING.value
-            
-            # Schedule retry (in production, this would use Celery or similar)
-            asyncio.create_task(self._retry_transfer_after_delay(transfer_id, retry_delay))
-        else:
-            # Max retries exceeded
-            update_data["status"] = TransferStatus.FAILED.value
-            update_data["failed_at"] = datetime.now()
-            
-            logger.error(f"Transfer {transfer_id} failed after {retry_count} attempts: {error_message}")
-            
-            # TODO: Notify admin of failed transfer
+            if transfer_doc.get("payout_mode") == BATCH_PAYOUT_MODE:
+                update_data["next_attempt_at"] = datetime.now() + timedelta(seconds=retry_delay)
+                update_data["batch_id"] = None
+            return update_data, retry_delay
+        
+        # Max retries exceeded
+        update_data["status"] = TransferStatus.FAILED.value
+        update_data["failed_at"] = datetime.now()
+        
+        logger.error(f"Transfer {transfer_id} failed after {retry_count} attempts: {error_message}")
         
+        # TODO: Notify admin of failed transfer
+        return update_data, None
+    
+    async def _apply_paystack_result(self, transfer_id: str, transfer_data: Dict[str, Any]):
+        """Store the Paystack transfer code and any immediate outcome"""
         await self.db.transfers.update_one(
             {"id": transfer_id},
-            {"$set": update_data}
+            {"$set": self._paystack_result_update(transfer_id, transfer_data)}
+        )
+    
+    def _paystack_result_update(self, transfer_id: str, transfer_data: Dict[str, Any]) -> Dict[str, Any]:
+        update_data = {
+            "paystack_transfer_code": transfer_data.get("transfer_code"),
+            "paystack_transfer_id": transfer_data.get("id"),
+            "updated_at": datetime.now()
+        }
+        
+        # Check immediate status
+        paystack_status = transfer_data.get("status")
+        if paystack_status == "success":
+            update_data["status"] = TransferStatus.SUCCESS.value
+            update_data["completed_at"] = datetime.now()
+            logger.info(f"Transfer {transfer_id} completed immediately")
+        elif paystack_status == "failed":
+            update_data["status"] = TransferStatus.FAILED.value
+            update_data["failure_reason"] = transfer_data.get("message", "Transfer failed")
+            update_data["failed_at"] = datetime.now()
+            logger.error(f"Transfer {transfer_id} failed immediately: {update_data['failure_reason']}")
+        else:
+            # Transfer is pending - will be updated by webhook
+            logger.info(f"Transfer {transfer_id} is pending, awaiting webhook notification")
+        
+        return update_data
+    
+    # Batch payouts
+    
+    async def submit_pending_batch(self) -> Dict[str, Any]:
+        """
+        Submit every due batched transfer through Paystack's bulk endpoint.
+        
+        Transfers are claimed by tagging them with a batch id, recipients are
+        loaded with one query, each chunk of BULK_TRANSFER_LIMIT goes out in
+        one request and its per-item results are written back with one
+        ``bulk_write``. A chunk whose outcome is unknown (timeout, 5xx) stays
+        in processing and is verified by reference on a later run, so no
+        seller is paid twice. The same applies if the worker dies anywhere
+        between the claim and the result write: claimed transfers stay flagged
+        ``batch_unresolved`` until a result is recorded.
+        """
+        summary = {"claimed": 0, "submitted": 0, "succeeded": 0, "pending": 0, "failed": 0,
+                   "retrying": 0, "unresolved": 0}
+        summary["recovered"] = await self._recover_unresolved_batches()
+        
+        batch_id = f"BATCH_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6].upper()}"
+        transfers = await self._claim_batch(batch_id)
+        summary["claimed"] = len(transfers)
+        if not transfers:
+            return summary
+        
+        recipient_ids = list({t["recipient_id"] for t in transfers})
+        recipients = {
+            doc["id"]: doc async for doc in self.db.transfer_recipients.find(
+                {"id": {"$in": recipient_ids}}, {"_id": 0, "id": 1, "paystack_recipient_code": 1, "is_active": 1}
+            )
+        }
+        
+        submittable, operations = [], []
+        for transfer in transfers:
+            recipient = recipients.get(transfer["recipient_id"])
+            if not recipient or not recipient.get("is_active", True):
+                operations.append(self._batch_failure(transfer, "Transfer recipient not found or inactive",
+                                                      summary, permanent=True))
+            else:
+                submittable.append((transfer, recipient["paystack_recipient_code"]))
+        
+        for start in range(0, len(submittable), BULK_TRANSFER_LIMIT):
+            chunk = submittable[start:start + BULK_TRANSFER_LIMIT]
+            operations.extend(await self._submit_chunk(chunk, summary))
+        
+        if operations:
+            await self.db.transfers.bulk_write(operations, ordered=False)
+        logger.info(f"Batch {batch_id}: {summary}")
+        return {"batch_id": batch_id, **summary}
+    
+    async def _claim_batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        now = datetime.now()
+        due = {
+            "status": TransferStatus.PENDING.value,
+            "payout_mode": BATCH_PAYOUT_MODE,
+            "$or": [{"next_attempt_at": None}, {"next_attempt_at": {"$lte": now}}]
+        }
+        ids = [
+            doc["id"] async for doc in self.db.transfers.find(due, {"_id": 0, "id": 1})
+            .sort("created_at", 1).limit(self.max_batch_size)
+        ]
+        if not ids:
+            return []
+        # The status filter makes the claim safe against a concurrent claim of the same transfers.
+        # Claimed transfers are unresolved until their result is written back.
+        await self.db.transfers.update_many(
+            {"id": {"$in": ids}, "status": TransferStatus.PENDING.value},
+            {"$set": {"status": TransferStatus.PROCESSING.value, "batch_id": batch_id,
+                      "batch_submitted_at": now, "batch_unresolved": True, "updated_at": now}}
         )
+        return await self.db.transfers.find(
+            {"batch_id": batch_id},
+            {"_id": 0, "id": 1, "reference": 1, "recipient_id": 1, "amount": 1, "reason": 1,
+             "retry_count": 1, "max_retries": 1, "payout_mode": 1}
+        ).to_list(length=None)
+    
+    async def _submit_chunk(self, chunk, summary: Dict[str, int]) -> List[UpdateOne]:
+        items = [
+            {"recipient": recipient_code, "amount": transfer["amount"],
+             "reference": transfer["reference"], "reason": transfer.get("reason")}
+            for transfer, recipient_code in chunk
+        ]
+        try:
+            response = await self.paystack_client.initiate_bulk_transfer(items, currency="ZAR")
+        except PaystackError as e:
+            # Timed out or unreachable: Paystack may have accepted the chunk. Keep the transfers in
+            # processing and verify them by reference on the next run.
+            logger.error(f"Bulk transfer chunk of {len(chunk)} outcome unknown: {e.message}")
+            summary["unresolved"] += len(chunk)
+            return [
+                UpdateOne({"id": transfer["id"]},
+                          {"$set": {"batch_unresolved": True, "failure_reason": e.message, "updated_at": datetime.now()}})
+                for transfer, _ in chunk
+            ]
+        
+        summary["submitted"] += len(chunk)
+        if not response.status:
+            if response.status_code and response.status_code >= 500:
+                summary["unresolved"] += len(chunk)
+                return [
+                    UpdateOne({"id": transfer["id"]},
+                              {"$set": {"batch_unresolved": True, "failure_reason": response.message,
+                                        "updated_at": datetime.now()}})
+                    for transfer, _ in chunk
+                ]
+            # Rejected as a whole (e.g. insufficient balance): every item goes back for a retry
+            return [self._batch_failure(transfer, response.message, summary) for transfer, _ in chunk]
+        
+        results = {item.get("reference"): item for item in (response.data or [])}
+        operations = []
+        for transfer, _ in chunk:
+            result = results.get(transfer["reference"])
+            if result is None:
+                operations.append(self._batch_failure(transfer, "Missing from bulk transfer response", summary))
+                continue
+            # Same outcome handling as a single transfer: an item Paystack failed outright is final
+            update_data = self._paystack_result_update(transfer["id"], result)
+            status = update_data.get("status")
+            summary[{TransferStatus.SUCCESS.value: "succeeded", TransferStatus.FAILED.value: "failed"}.get(status, "pending")] += 1
+            update_data["batch_unresolved"] = False
+            operations.append(UpdateOne({"id": transfer["id"]}, {"$set": update_data}))
+        return operations
+    
+    def _batch_failure(self, transfer: Dict[str, Any], message: str, summary: Dict[str, int],
+                       permanent: bool = False) -> UpdateOne:
+        if permanent:
+            update_data = {"status": TransferStatus.FAILED.value, "failure_reason": message,
+                           "failed_at": datetime.now(), "updated_at": datetime.now()}
+        else:
+            update_data, _ = self._failure_update(transfer, message)
+        summary["retrying" if update_data["status"] == TransferStatus.PENDING.value else "failed"] += 1
+        update_data["batch_unresolved"] = False
+        return UpdateOne({"id": transfer["id"]}, {"$set": update_data})
+    
+    async def _recover_unresolved_batches(self) -> int:
+        """Verify transfers from chunks with an unknown outcome; found ones are recorded, missing ones retried"""
+        operations = []
+        async for transfer in self.db.transfers.find(
+            {"batch_unresolved": True, "status": TransferStatus.PROCESSING.value,
+             "batch_submitted_at": {"$lte": datetime.now() - BATCH_RECOVERY_GRACE}},
+            {"_id": 0, "id": 1, "reference": 1, "retry_count": 1, "max_retries": 1, "payout_mode": 1}
+        ):
+            response = await self.paystack_client.verify_transfer(transfer["reference"])
+            if response.status and response.data:
+                update_data = self._paystack_result_update(transfer["id"], response.data)
+                update_data["batch_unresolved"] = False
+                operations.append(UpdateOne({"id": transfer["id"]}, {"$set": update_data}))
+            elif response.status_code == 404:
+                update_data, _ = self._failure_update(transfer, "Not received by Paystack")
+                update_data["batch_unresolved"] = False
+                operations.append(UpdateOne({"id": transfer["id"]}, {"$set": update_data}))
+            # Anything else: still unknown, try again next run
+        if operations:
+            await self.db.transfers.bulk_write(operations, ordered=False)
+        return len(operations)
     
     async def _retry_transfer_after_delay(self, transfer_id: str, delay_seconds: int):
         """Retry transfer after delay"""
@@ -7,6 +7,7 @@ import logging
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
 from inbox_models.inbox_models import (
     Conversation, Message, ConversationType, MessageVisibility,
     SystemMessageType, Participant, PerUser, ReadMark, Attachment,
@@ -14,14 +15,31 @@ from inbox_models.inbox_models import (
 )
 from services.pii_service import PIIService
 from services.sse_service import sse_service, InboxEvents
+from services.inbox_hydration import UserProfileCache, UnreadCounters
+from services.message_history import fetch_page, is_read, message_history_index
 import uuid
 
 logger = logging.getLogger(__name__)
 
 class UnifiedInboxService:
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, profile_cache: Optional[UserProfileCache] = None):
         self.db = db
         self.pii_service = PIIService()
+        self.profile_cache = profile_cache or UserProfileCache(db)
+        self.unread_counters = UnreadCounters(db, "inbox", self._count_unread_by_type)
+    
+    async def ensure_indexes(self):
+        try:
+            await self.db.conversations.create_indexes([
+                IndexModel([("per_user.user_id", ASCENDING), ("last_message_at", DESCENDING)],
+                           name="conversations_per_user_last_message")
+            ])
+            await self.db.messages.create_indexes([
+                message_history_index("created_at", "id", "messages_conversation_created")
+            ])
+        except Exception as e:
+            logger.warning(f"Could not create inbox indexes: {e}")
+        await self.unread_counters.ensure_indexes()
     
     async def ensure_conversation(self, 
                                 type: ConversationType,
@@ -74,7 +92,8 @@ class UnifiedInboxService:
                     "unread_count": 0,
                     "muted": False,
                     "archived": False,
-                    "deleted": False
+                    "deleted": False,
+                    "last_read_at": None
                 })
             
             conversation = {
@@ -145,6 +164,11 @@ class UnifiedInboxService:
                 .limit(page_size)\
                 .to_list(length=None)
             
+            # Names and avatars for every participant on the page in one lookup
+            profiles = await self.profile_cache.get_profiles(
+                p["user_id"] for conv in conversations for p in conv.get("participants", [])
+            )
+            
             # Convert to API response format
             result = []
             for conv in conversations:
@@ -165,12 +189,12 @@ class UnifiedInboxService:
                 # Simplify participants for API response
                 participants = []
                 for p in conv.get("participants", []):
-                    # TODO: Fetch user names and avatars
+                    profile = profiles.get(p["user_id"], {})
                     participants.append({
                         "id": p["user_id"],
-                        "name": "User",  # TODO: Fetch actual name
+                        "name": profile.get("name", "User"),
                         "role": p["role"],
-                        "avatar": None
+                        "avatar": profile.get("avatar")
                     })
                 
                 item = ConversationListItem(
@@ -193,6 +217,18 @@ class UnifiedInboxService:
             logger.error(f"Error getting inbox for user {user_id}: {e}")
             raise
     
+    async def _participant_conversation(self, conversation_id: str, user_id: str,
+                                        projection: Dict[str, Any]) -> Dict[str, Any]:
+        """Projected conversation if ``user_id`` is an active participant, else ValueError"""
+        conversation = await self.db.conversations.find_one(
+            {"id": conversation_id, "per_user": {"$elemMatch": {"user_id": user_id, "deleted": {"$ne": True}}}},
+            projection
+        )
+        if not conversation:
+            exists = await self.db.conversations.count_documents({"id": conversation_id}, limit=1)
+            raise ValueError("Access denied" if exists else "Conversation not found")
+        return conversation
+    
     async def get_conversation(self, conversation_id: str, user_id: str) -> Dict[str, Any]:
         """Get conversation details for user"""
         try:
@@ -220,6 +256,10 @@ class UnifiedInboxService:
                     if field in participant and hasattr(participant[field], 'isoformat'):
                         participant[field] = participant[field].isoformat()
             
+            for pu in conversation.get("per_user", []):
+                if hasattr(pu.get("last_read_at"), 'isoformat'):
+                    pu["last_read_at"] = pu["last_read_at"].isoformat()
+            
             return conversation
             
         except Exception as e:
@@ -230,46 +270,47 @@ class UnifiedInboxService:
                           conversation_id: str, 
                           user_id: str, 
                           page: int = 1, 
-                          page_size: int = 50) -> List[Dict[str, Any]]:
-        """Get paginated messages for conversation"""
+                          page_size: int = 50,
+                          cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Messages oldest first: ``{"messages", "next_cursor", "has_more"}``.
+        Pass ``next_cursor`` back as ``cursor`` for the following page; ``page``
+        is only honoured without a cursor and skips over every earlier message.
+        """
         try:
-            # Verify access
-            await self.get_conversation(conversation_id, user_id)
+            # Verify access; the caller's last-read pointer marks which messages are read
+            conversation = await self._participant_conversation(
+                conversation_id, user_id, {"_id": 0, "per_user.user_id": 1, "per_user.last_read_at": 1}
+            )
+            last_read_at = next(
+                (pu.get("last_read_at") for pu in conversation["per_user"] if pu["user_id"] == user_id), None
+            )
             
-            # Get messages
-            messages = await self.db.messages.find({
-                "conversation_id": conversation_id,
-                "visibility": {"$ne": MessageVisibility.HIDDEN.value}
-            }).sort("created_at", 1)\
-              .skip((page - 1) * page_size)\
-              .limit(page_size)\
-              .to_list(length=None)
+            result = await fetch_page(
+                self.db.messages,
+                {"conversation_id": conversation_id, "visibility": {"$ne": MessageVisibility.HIDDEN.value}},
+                time_field="created_at",
+                id_field="id",
+                limit=page_size,
+                cursor=cursor,
+                skip=0 if cursor else (page - 1) * page_size,
+                projection={"_id": 0}
+            )
+            messages = result["items"]
             
             # Add sender info and check if message is from current user
             for msg in messages:
-                # Remove MongoDB ObjectId to avoid serialization issues
-                if "_id" in msg:
-                    del msg["_id"]
-                
                 msg["isMine"] = msg["sender_id"] == user_id
+                msg["is_read"] = msg["isMine"] or is_read(last_read_at, msg.get("created_at"))
                 
                 # Convert datetime objects to ISO strings for JSON serialization
                 for field in ["created_at", "updated_at"]:
                     if field in msg and hasattr(msg[field], 'isoformat'):
                         msg[field] = msg[field].isoformat()
                 
-                # Convert datetime in read_by and delivered_to
-                for read_mark in msg.get("read_by", []):
-                    if "at" in read_mark and hasattr(read_mark["at"], 'isoformat'):
-                        read_mark["at"] = read_mark["at"].isoformat()
-                
-                for delivery_mark in msg.get("delivered_to", []):
-                    if "at" in delivery_mark and hasattr(delivery_mark["at"], 'isoformat'):
-                        delivery_mark["at"] = delivery_mark["at"].isoformat()
-                
                 # TODO: Add sender name/avatar lookup
             
-            return messages
+            return {"messages": messages, "next_cursor": result["next_cursor"], "has_more": result["has_more"]}
             
         except Exception as e:
             logger.error(f"Error getting messages for conversation {conversation_id}: {e}")
@@ -284,8 +325,10 @@ class UnifiedInboxService:
                           meta: Optional[Dict[str, Any]] = None) -> str:
         """Send a message to conversation"""
         try:
-            # Get conversation and verify access
-            conversation = await self.get_conversation(conversation_id, sender_id)
+            # Verify access, loading only what sending needs
+            conversation = await self._participant_conversation(
+                conversation_id, sender_id, {"_id": 0, "type": 1, "order_group_id": 1, "per_user.user_id": 1, "per_user.deleted": 1}
+            )
             
             # For non-system messages, apply PII filtering
             visibility = MessageVisibility.VISIBLE
@@ -322,8 +365,6 @@ class UnifiedInboxService:
                 "meta": meta,
                 "visibility": visibility.value,
                 "redaction_reason": redaction_reason,
-                "read_by": [],
-                "delivered_to": [],
                 "created_at": datetime.now(timezone.utc),
                 "updated_at": datetime.now(timezone.utc)
             }
@@ -335,14 +376,10 @@ class UnifiedInboxService:
             if not preview and attachments:
                 preview = f"[{len(attachments)} attachment(s)]"
             
-            # Update unread counts for other participants
-            update_operations = []
-            participant_ids = []
-            
-            for pu in conversation["per_user"]:
-                if pu["user_id"] != sender_id:
-                    pu["unread_count"] = pu.get("unread_count", 0) + 1
-                    participant_ids.append(pu["user_id"])
+            # Bump every other participant's unread count in the same atomic update,
+            # so concurrent senders cannot overwrite each other's increments; the
+            # sender has read up to their own message
+            participant_ids = [pu["user_id"] for pu in conversation.get("per_user", []) if pu["user_id"] != sender_id]
             
             await self.db.conversations.update_one(
                 {"id": conversation_id},
@@ -351,10 +388,20 @@ class UnifiedInboxService:
                         "last_message_at": message["created_at"],
                         "last_message_preview": preview,
                         "last_sender_id": sender_id,
-                        "per_user": conversation["per_user"],
+                        "last_message_id": message_id,
                         "updated_at": datetime.now(timezone.utc)
-                    }
-                }
+                    },
+                    "$inc": {"per_user.$[other].unread_count": 1},
+                    "$max": {"per_user.$[me].last_read_at": message["created_at"]}
+                },
+                array_filters=[{"other.user_id": {"$ne": sender_id}}, {"me.user_id": sender_id}]
+            )
+            
+            # Counters cover the same conversations as _count_unread_by_type: not deleted by the user
+            await self.unread_counters.increment(
+                [pu["user_id"] for pu in conversation.get("per_user", [])
+                 if pu["user_id"] != sender_id and not pu.get("deleted")],
+                conversation.get("type")
             )
             
             # Send real-time notifications
@@ -379,27 +426,19 @@ class UnifiedInboxService:
     async def mark_conversation_read(self, conversation_id: str, user_id: str) -> None:
         """Mark conversation as read for user"""
         try:
-            # Update conversation unread count
-            await self.db.conversations.update_one(
+            # Clear the unread count and move the user's last-read pointer to now, which
+            # marks every message so far as read; what was cleared comes off their total
+            before = await self.db.conversations.find_one_and_update(
                 {"id": conversation_id, "per_user.user_id": user_id},
-                {"$set": {"per_user.$.unread_count": 0}}
-            )
-            
-            # Mark all messages as read
-            await self.db.messages.update_many(
-                {
-                    "conversation_id": conversation_id,
-                    "read_by.user_id": {"$ne": user_id}
-                },
-                {
-                    "$push": {
-                        "read_by": {
-                            "user_id": user_id,
-                            "at": datetime.now(timezone.utc)
-                        }
-                    }
-                }
+                {"$set": {"per_user.$.unread_count": 0},
+                 "$max": {"per_user.$.last_read_at": datetime.now(timezone.utc)}},
+                projection={"_id": 0, "type": 1, "per_user": 1},
+                return_document=ReturnDocument.BEFORE
             )
+            if before:
+                user_state = next((pu for pu in before.get("per_user", []) if pu["user_id"] == user_id), {})
+                if not user_state.get("deleted"):
+                    await self.unread_counters.decrement(user_id, before.get("type"), user_state.get("unread_count", 0))
             
             # Send real-time update
             sse_service.push_to_user(
@@ -438,47 +477,21 @@ class UnifiedInboxService:
     async def get_inbox_summary(self, user_id: str) -> InboxSummary:
         """Get unread counts by bucket"""
         try:
-            # Aggregate unread counts by conversation type
-            pipeline = [
-                {
-                    "$match": {
-                        "per_user.user_id": user_id,
-                        "per_user.deleted": {"$ne": True}
-                    }
-                },
-                {
-                    "$unwind": "$per_user"
-                },
-                {
-                    "$match": {
-                        "per_user.user_id": user_id,
-                        "per_user.unread_count": {"$gt": 0}
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": "$type",
-                        "unread_count": {"$sum": "$per_user.unread_count"}
-                    }
-                }
-            ]
-            
-            results = await self.db.conversations.aggregate(pipeline).to_list(length=None)
-            
             summary = InboxSummary()
-            for result in results:
-                count = result["unread_count"]
+            for conversation_type, count in (await self.unread_counters.get(user_id)).items():
+                if count <= 0:
+                    continue
                 summary.total_unread += count
                 
-                if result["_id"] == ConversationType.ORDER.value:
+                if conversation_type == ConversationType.ORDER.value:
                     summary.orders_unread = count
-                elif result["_id"] == ConversationType.OFFER.value:
+                elif conversation_type == ConversationType.OFFER.value:
                     summary.offers_unread = count
-                elif result["_id"] == ConversationType.BUY_REQUEST.value:
+                elif conversation_type == ConversationType.BUY_REQUEST.value:
                     summary.requests_unread = count
-                elif result["_id"] == ConversationType.CONSIGNMENT.value:
+                elif conversation_type == ConversationType.CONSIGNMENT.value:
                     summary.logistics_unread = count
-                elif result["_id"] == ConversationType.SYSTEM.value:
+                elif conversation_type == ConversationType.SYSTEM.value:
                     summary.system_unread = count
             
             return summary
@@ -487,6 +500,35 @@ class UnifiedInboxService:
             logger.error(f"Error getting inbox summary: {e}")
             raise
     
+    async def _count_unread_by_type(self, user_id: str) -> Dict[str, int]:
+        """Unread per conversation type, aggregated from the conversations (seeds the user's counter)"""
+        pipeline = [
+            {
+                "$match": {
+                    "per_user": {"$elemMatch": {"user_id": user_id, "deleted": {"$ne": True}}}
+                }
+            },
+            {
+                "$unwind": "$per_user"
+            },
+            {
+                "$match": {
+                    "per_user.user_id": user_id,
+                    "per_user.deleted": {"$ne": True},
+                    "per_user.unread_count": {"$gt": 0}
+                }
+            },
+            {
+                "$group": {
+                    "_id": "$type",
+                    "unread_count": {"$sum": "$per_user.unread_count"}
+                }
+            }
+        ]
+        
+        results = await self.db.conversations.aggregate(pipeline).to_list(length=None)
+        return {result["_id"] or "other": result["unread_count"] for result in results}
+    
     # System message helpers
     async def send_system_message(self, 
                                  conversation_id: str,
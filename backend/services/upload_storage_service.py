@@ -0,0 +1,159 @@
+"""
+Shared upload writer for locally stored files.
+
+Streams ``UploadFile`` chunks to disk in the default executor, enforces the
+size limit while streaming, hashes the content on the fly and keeps a single
+copy of each distinct file in a content-addressed store. Public paths are
+hard links into that store, so repeated uploads of the same photo or document
+cost no extra disk.
+"""
+import os
+import shutil
+import asyncio
+import hashlib
+import logging
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Union
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = os.getenv("UPLOAD_ROOT", "/app/uploads")
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds its size limit while streaming"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size_bytes: int
+    sha256: str
+    deduplicated: bool
+
+
+class UploadStorageService:
+    def __init__(self, upload_root: str = UPLOAD_ROOT, chunk_size: int = CHUNK_SIZE):
+        self.upload_root = Path(upload_root)
+        self.store_dir = self.upload_root / ".cas"
+        self.tmp_dir = self.store_dir / "tmp"
+        self.chunk_size = chunk_size
+
+    async def save_upload(
+        self,
+        file: Any,
+        upload_dir: Union[str, Path],
+        filename: str,
+        max_bytes: int
+    ) -> StoredUpload:
+        """
+        Stream an uploaded file to ``upload_dir/filename``.
+
+        Raises UploadTooLargeError as soon as more than ``max_bytes`` have been
+        received; the partial file is removed.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._ensure_dirs, Path(upload_dir))
+
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        digest = hashlib.sha256()
+        size = 0
+        handle = await loop.run_in_executor(None, open, tmp_path, "wb")
+        try:
+            while True:
+                chunk = await file.read(self.chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                await loop.run_in_executor(None, self._write_chunk, handle, digest, chunk)
+        except BaseException:
+            await loop.run_in_executor(None, self._discard, handle, tmp_path)
+            raise
+        await loop.run_in_executor(None, handle.close)
+
+        return await loop.run_in_executor(
+            None, self._commit, tmp_path, digest.hexdigest(), size, Path(upload_dir) / filename
+        )
+
+    async def save_bytes(self, content: bytes, upload_dir: Union[str, Path], filename: str) -> StoredUpload:
+        """Store content that is already in memory through the same deduplicating store"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._save_bytes_sync, content, Path(upload_dir), filename)
+
+    async def read_upload(self, file: Any, max_bytes: int) -> bytes:
+        """
+        Read an upload into memory for providers that need the raw bytes
+        (Cloudinary, AI analysis), stopping as soon as the limit is exceeded.
+        """
+        chunks = []
+        size = 0
+        while True:
+            chunk = await file.read(self.chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _ensure_dirs(self, upload_dir: Path):
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _write_chunk(handle, digest, chunk: bytes):
+        digest.update(chunk)
+        handle.write(chunk)
+
+    @staticmethod
+    def _discard(handle, tmp_path: Path):
+        handle.close()
+        try:
+            tmp_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _save_bytes_sync(self, content: bytes, upload_dir: Path, filename: str) -> StoredUpload:
+        self._ensure_dirs(upload_dir)
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        return self._commit(tmp_path, hashlib.sha256(content).hexdigest(), len(content), upload_dir / filename)
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self.store_dir / sha256[:2] / sha256
+
+    def _commit(self, tmp_path: Path, sha256: str, size: int, target: Path) -> StoredUpload:
+        """Move the temp file into the content store and link it to its public path"""
+        blob = self._blob_path(sha256)
+        deduplicated = blob.exists()
+        if deduplicated:
+            tmp_path.unlink()
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, blob)
+
+        try:
+            os.link(blob, target)
+        except OSError:
+            # Different filesystem (or links unsupported) - fall back to a plain copy
+            shutil.copyfile(blob, target)
+
+        if deduplicated:
+            logger.info(f"Deduplicated upload {target.name} ({size} bytes, sha256={sha256[:12]})")
+
+        return StoredUpload(path=str(target), size_bytes=size, sha256=sha256, deduplicated=deduplicated)
+
+
+# Global upload storage service instance
+upload_storage_service = UploadStorageService()